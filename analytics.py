@@ -0,0 +1,216 @@
+"""
+Task reports computed with NumPy over a column snapshot of every task.
+"""
+import threading
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+try:
+    import numpy as np
+except ImportError:  # Optional: only the reports need it
+    np = None
+
+# Julian day number of 1970-01-01; snapshot times are days since then
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+# Rows converted to arrays at a time while loading a snapshot
+LOAD_BATCH_SIZE = 65536
+# Bucket widths in days accepted by burndown()
+BUCKET_DAYS = {'day': 1, 'week': 7}
+MAX_BUCKETS = 3660
+# Inner edges of the lateness histogram, in days late (completion day minus
+# due day; 0 is "completed on the due date", negative is early)
+LATENESS_EDGES = (-30, -7, -1, 0, 1, 2, 4, 8, 15, 31)
+
+# Live and archived tasks, one row each. julianday() of NULL is NULL,
+# which becomes NaN in the float arrays.
+SNAPSHOT_SQL = """
+    SELECT priority, completed,
+           julianday(created_at) - {epoch},
+           julianday(due_date) - {epoch},
+           julianday(completed_at) - {epoch}
+    FROM {table}
+"""
+
+
+class TaskSnapshot:
+    """
+    Every task as column arrays, at one table version.
+
+    ``created``, ``due`` and ``completed_at`` are days since 1970-01-01 as
+    float64, NaN where the task has no value.
+    """
+
+    __slots__ = ('version', 'priority', 'completed', 'created', 'due',
+                 'completed_at')
+
+    def __init__(self, version: int, columns):
+        self.version = version
+        self.priority = columns[:, 0].astype(np.int8)
+        self.completed = columns[:, 1].astype(bool)
+        self.created = columns[:, 2]
+        self.due = columns[:, 3]
+        self.completed_at = columns[:, 4]
+
+    def __len__(self) -> int:
+        return len(self.priority)
+
+    def select(self, priority: Optional[int] = None) -> 'TaskSnapshot':
+        """The tasks of one priority, or all of them for None."""
+        if priority is None:
+            return self
+        subset = object.__new__(TaskSnapshot)
+        subset.version = self.version
+        mask = self.priority == priority
+        for name in ('priority', 'completed', 'created', 'due', 'completed_at'):
+            setattr(subset, name, getattr(self, name)[mask])
+        return subset
+
+
+class ReportEngine:
+    """
+    Loads TaskSnapshots from the database and caches the latest one.
+
+    The cached snapshot is reused until the table version (bumped by every
+    write, archiving included) moves on, so reports between writes cost
+    only the version check and the array arithmetic.
+    """
+
+    def __init__(self, db_connection):
+        if np is None:
+            raise RuntimeError("Reports need NumPy (pip install numpy)")
+        self.db = db_connection
+        self.loads = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> TaskSnapshot:
+        """The current snapshot, reloaded if the tasks changed."""
+        # One loader at a time; requests that queue behind it reuse its load
+        with self._lock, self.db() as conn:
+            # One read transaction, so the rows match the version
+            conn.execute("BEGIN")
+            try:
+                version = conn.execute(
+                    "SELECT version FROM task_version WHERE id = 1").fetchone()[0]
+                if self._snapshot is None or self._snapshot.version != version:
+                    self._snapshot = TaskSnapshot(version, self._load(conn))
+                    self.loads += 1
+                return self._snapshot
+            finally:
+                conn.rollback()
+
+    @staticmethod
+    def _load(conn):
+        count = conn.execute("SELECT (SELECT COUNT(*) FROM tasks) + "
+                             "(SELECT COUNT(*) FROM tasks_archive)").fetchone()[0]
+        columns = np.empty((count, 5))
+        filled = 0
+        for table in ('tasks', 'tasks_archive'):
+            cursor = conn.execute(SNAPSHOT_SQL.format(
+                epoch=UNIX_EPOCH_JULIAN_DAY, table=table))
+            while True:
+                rows = cursor.fetchmany(LOAD_BATCH_SIZE)
+                if not rows:
+                    break
+                columns[filled:filled + len(rows)] = np.array(rows, dtype=float)
+                filled += len(rows)
+        return columns[:filled]
+
+    def metrics(self) -> Dict[str, int]:
+        snapshot = self._snapshot
+        return {'loads': self.loads,
+                'tasks': len(snapshot) if snapshot is not None else 0}
+
+
+def _day(value: date) -> int:
+    return (value - date(1970, 1, 1)).days
+
+
+def _summary(values) -> Dict[str, Optional[float]]:
+    if not len(values):
+        return {'mean': None, 'p50': None, 'p90': None, 'p99': None}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'mean': round(float(values.mean()), 2), 'p50': round(float(p50), 2),
+            'p90': round(float(p90), 2), 'p99': round(float(p99), 2)}
+
+
+def burndown(snapshot: TaskSnapshot, start: date, end: date,
+             bucket: str = 'day', priority: Optional[int] = None
+             ) -> Dict[str, Any]:
+    """
+    Tasks created, completed and still open per bucket from start to end.
+
+    ``open`` is the number of tasks created but not completed by the end
+    of each bucket. Tasks reopened since count as open; deleted tasks are
+    not counted at all.
+    """
+    if bucket not in BUCKET_DAYS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKET_DAYS)}")
+    if end < start:
+        raise ValueError("end must not be before start")
+    width = BUCKET_DAYS[bucket]
+    buckets = (end - start).days // width + 1
+    if buckets > MAX_BUCKETS:
+        raise ValueError(f"At most {MAX_BUCKETS} buckets per report")
+
+    tasks = snapshot.select(priority)
+    # Bucket i covers [edges[i], edges[i + 1])
+    edges = _day(start) + width * np.arange(buckets + 1, dtype=float)
+    created = np.sort(tasks.created[~np.isnan(tasks.created)])
+    completed = np.sort(tasks.completed_at[~np.isnan(tasks.completed_at)])
+    created_by = np.searchsorted(created, edges)
+    completed_by = np.searchsorted(completed, edges)
+    return {
+        'bucket': bucket,
+        'dates': [(start + timedelta(days=width * i)).isoformat()
+                  for i in range(buckets)],
+        'created': np.diff(created_by).tolist(),
+        'completed': np.diff(completed_by).tolist(),
+        'open': (created_by[1:] - completed_by[1:]).tolist(),
+    }
+
+
+def completion_by_priority(snapshot: TaskSnapshot) -> Dict[int, Dict[str, Any]]:
+    """Per priority: task counts, completion rate and days to complete."""
+    total = np.bincount(snapshot.priority, minlength=6)
+    completed = np.bincount(snapshot.priority, weights=snapshot.completed,
+                            minlength=6).astype(int)
+    finished = snapshot.completed & ~np.isnan(snapshot.completed_at)
+    durations = (snapshot.completed_at - snapshot.created)[finished]
+    finished_priority = snapshot.priority[finished]
+    report = {}
+    for priority in range(1, 6):
+        report[priority] = {
+            'total': int(total[priority]),
+            'completed': int(completed[priority]),
+            'completion_rate': (round(completed[priority] / total[priority], 4)
+                                if total[priority] else None),
+            'days_to_complete': _summary(
+                durations[finished_priority == priority]),
+        }
+    return report
+
+
+def lateness(snapshot: TaskSnapshot, priority: Optional[int] = None
+             ) -> Dict[str, Any]:
+    """
+    How late completed tasks with a due date were, in whole days.
+
+    A task completed on its due date is 0 days late and counts as on time.
+    The histogram bins are [min, max) with None for an open end.
+    """
+    tasks = snapshot.select(priority)
+    done = tasks.completed & ~np.isnan(tasks.due) & ~np.isnan(tasks.completed_at)
+    days_late = np.floor(tasks.completed_at[done]) - tasks.due[done]
+    counts = np.bincount(np.searchsorted(LATENESS_EDGES, days_late, side='right'),
+                         minlength=len(LATENESS_EDGES) + 1)
+    bounds = (None,) + LATENESS_EDGES + (None,)
+    on_time = int(np.count_nonzero(days_late <= 0))
+    return {
+        'completed_with_due_date': int(done.sum()),
+        'on_time': on_time,
+        'on_time_rate': round(on_time / len(days_late), 4) if len(days_late) else None,
+        'days_late': _summary(days_late),
+        'histogram': [{'min': bounds[i], 'max': bounds[i + 1],
+                       'count': int(counts[i])} for i in range(len(counts))],
+    }
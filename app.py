@@ -1,11 +1,35 @@
 """
 Main Flask application for Task Manager.
 """
-from flask import Flask, render_template, request, redirect, url_for, jsonify
-from datetime import datetime
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify
+from markupsafe import Markup
+from datetime import date, datetime, timezone
+import atexit
+import gzip
+import json
 import logging
-from database import init_database, get_db
-from models import SQLiteTaskRepository, Task
+import os
+import sqlite3
+import threading
+import zlib
+from urllib.parse import urlencode
+import analytics
+from archive import TaskArchiver
+from cache import CachedTaskRepository, LRUCache
+from coherence import ChangeFollower
+from database import close_pools, init_database, get_db
+from events import EventHub, HubFullError, SubscriptionClosed
+from instrumentation import Instrumentation
+from models import SQLiteTaskRepository, SyncExpiredError, Task
+from next_up import NextUpRepository
+from reminders import (DueDateScheduler, EventHubNotifier, WebhookNotifier,
+                       log_notifier)
+from write_behind import WriteBehindRepository
+
+try:
+    import brotli
+except ImportError:  # Optional: fall back to gzip only
+    brotli = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -13,17 +37,382 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
+# Static URLs carry a version (see static_url()), so browsers may keep the
+# files for a year; a changed file gets a new URL
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 365 * 24 * 3600
+
+# Create the schema and apply pending migrations before serving requests
+init_database()
+
+# Committed writes are published here and streamed to /api/events
+event_hub = EventHub()
+
+# Queue single-task writes for a writer thread that group-commits them.
+# Raises write throughput under concurrent load at the cost of a thread
+# handoff per write; see benchmarks/bench_write_behind.py
+WRITE_BEHIND = False
+
+# Completed tasks are moved to the tasks_archive table this many days after
+# they were completed, by a background thread that checks every
+# ARCHIVE_INTERVAL seconds. None, the default, keeps every task in the
+# tasks table. The thread is started by the entry points through
+# start_archiver(), never on import.
+ARCHIVE_AFTER_DAYS = None
+ARCHIVE_INTERVAL = 3600.0
+
+# Due-soon reminders fire REMINDER_LEAD_DAYS before a task's due date and
+# overdue ones the day after it. They are logged, sent to /api/events
+# subscribers and, with REMINDER_WEBHOOK_URL set, POSTed there as JSON.
+REMINDER_LEAD_DAYS = 1
+REMINDER_WEBHOOK_URL = None
+
+# Request, repository and query metrics, served at /metrics. Set
+# SLOW_QUERY_MS to log repository calls slower than that with the plans of
+# the queries they ran.
+SLOW_QUERY_MS = None
+instrumentation = Instrumentation(slow_query_ms=SLOW_QUERY_MS)
+
+# Initialize repository; reads are served from an in-process cache that
+# every write through task_repo invalidates
+sqlite_repo = SQLiteTaskRepository(instrumentation.instrument_db(get_db),
+                                   events=event_hub)
+write_repo = sqlite_repo
+if WRITE_BEHIND:
+    write_repo = WriteBehindRepository(sqlite_repo)
+    # Commit whatever is still queued before the pools close at exit
+    atexit.register(write_repo.close)
+cached_repo = CachedTaskRepository(
+    instrumentation.instrument_repository(write_repo, explain_db=get_db))
+# Open tasks are also kept in memory in "next up" order, loaded once here
+task_repo = NextUpRepository(cached_repo, sqlite_repo)
+
+instrumentation.init_app(app)
+instrumentation.add_collector('task_cache', cached_repo.metrics)
+instrumentation.add_collector('next_up', task_repo.metrics)
+
+archiver = None
+
+
+def start_archiver():
+    """
+    Start the archiving thread when ARCHIVE_AFTER_DAYS is set.
+
+    Called by the entry points: ``python app.py``, each serve.py worker and
+    the ASGI lifespan startup. Returns the running archiver, or None when
+    archiving is off.
+    """
+    global archiver
+    if ARCHIVE_AFTER_DAYS is None or archiver is not None:
+        return archiver
+    # Archived tasks leave the tasks table behind the read cache's back
+    archiver = TaskArchiver(sqlite_repo, ARCHIVE_AFTER_DAYS,
+                            interval=ARCHIVE_INTERVAL,
+                            on_archive=cached_repo.invalidate)
+    archiver.start()
+    atexit.register(archiver.close)
+    instrumentation.add_collector('archive', archiver.metrics)
+    return archiver
+
+
+reminder_notifiers = [log_notifier, EventHubNotifier(event_hub)]
+if REMINDER_WEBHOOK_URL:
+    reminder_notifiers.append(WebhookNotifier(REMINDER_WEBHOOK_URL))
+# Loads upcoming due dates once started, then follows writes through
+# event_hub. Like the archiver, it is started by the entry points through
+# start_reminders(), never on import.
+reminders = DueDateScheduler(sqlite_repo, reminder_notifiers, hub=event_hub,
+                             lead_days=REMINDER_LEAD_DAYS)
+instrumentation.add_collector('reminders', reminders.metrics)
+instrumentation.add_collector('event_hub', event_hub.metrics)
+
+
+def start_reminders():
+    """
+    Start the reminder scheduler's thread.
+
+    Called by the same entry points as start_archiver(); the ASGI lifespan
+    shutdown stops it, and an atexit hook stops it everywhere else.
+    """
+    if not reminders.running:
+        reminders.start()
+        atexit.register(reminders.close)
+    return reminders
+
+
+def shutdown():
+    """
+    Stop the background threads, commit queued writes and close the pools.
+
+    What the atexit hooks do, for entry points that leave through
+    os._exit() and so skip them (serve.py's workers). Safe to call more
+    than once.
+    """
+    reminders.close()
+    if archiver is not None:
+        archiver.close()
+    if write_repo is not sqlite_repo:
+        write_repo.close()
+    close_pools()
+
+
+def apply_changes(task_ids):
+    cached_repo.invalidate(task_ids)
+    task_repo.sync(task_ids)
+    if reminders.running:
+        reminders.sync(task_ids)
+
+
+def reset_views():
+    cached_repo.invalidate()
+    task_repo.rebuild()
+    if reminders.running:
+        reminders.load()
+
+
+# Other worker processes (see serve.py) write to the same database; every
+# request first catches this process's caches up with their writes
+change_follower = ChangeFollower(sqlite_repo, apply_changes, reset_views)
+instrumentation.add_collector('coherence', change_follower.metrics)
+
+
+@app.before_request
+def follow_changes():
+    change_follower.check()
+
+
+# Reports work on a NumPy column snapshot of every task, reloaded only
+# when the table version changes. Without NumPy they answer 503.
+report_engine = None
+if analytics.np is not None:
+    report_engine = analytics.ReportEngine(sqlite_repo.db)
+    instrumentation.add_collector('reports', report_engine.metrics)
+
+# Pagination sizes for the home page and the list API
+PAGE_SIZE = 50
+API_DEFAULT_LIMIT = 100
+API_MAX_LIMIT = 1000
+SEARCH_DEFAULT_LIMIT = 20
+NEXT_DEFAULT_COUNT = 10
+# Days covered by a burndown report without from/to
+REPORT_DEFAULT_DAYS = 30
+EXPORT_BATCH_SIZE = 500
+BULK_MAX_ITEMS = 10000
+
+# Seconds between keep-alive comments on an idle event stream, and how long
+# browsers wait before reconnecting a dropped one
+SSE_KEEPALIVE = 15.0
+SSE_RETRY_MS = 3000
+
+# Rendered task cards kept for the list page; entries for old dates or old
+# versions of a task simply age out
+CARD_CACHE_SIZE = 10000
+CARD_CACHE_TTL = 3600.0
+
+# Response compression for text bodies at least this large
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_MIMETYPES = {'text/html', 'text/css', 'text/plain',
+                      'application/json', 'application/javascript'}
+
+
+def parse_flag(args, name, default=False):
+    """Read a true/false query parameter; ValueError if malformed."""
+    value = args.get(name)
+    if value is None:
+        return default
+    if value.lower() not in ('1', '0', 'true', 'false'):
+        raise ValueError(f"{name} must be true or false")
+    return value.lower() in ('1', 'true')
+
+
+def parse_task_filters(args):
+    """
+    Read list filters from query parameters.
+
+    Raises ValueError for malformed values so callers can answer 400.
+    """
+    filters = {}
+    if args.get('completed') is not None:
+        filters['completed'] = parse_flag(args, 'completed')
+    for name in ('priority', 'priority_min', 'priority_max'):
+        if args.get(name):
+            filters[name] = int(args[name])
+    for name in ('due_from', 'due_to'):
+        if args.get(name):
+            filters[name] = datetime.strptime(
+                args[name], '%Y-%m-%d').strftime('%Y-%m-%d')
+    return filters
+
+
+# Request parsing and response bodies shared by the Flask routes and the
+# native ASGI handlers (asgi.py), so both answer alike. The parse_*()
+# helpers raise ValueError for malformed values, answered with a 400.
+
+def parse_list_args(args):
+    """/api/tasks parameters: (cursor, limit, filters, include_archived)."""
+    limit = min(int(args.get('limit', API_DEFAULT_LIMIT)), API_MAX_LIMIT)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return (args.get('cursor'), limit, parse_task_filters(args),
+            parse_flag(args, 'include_archived'))
+
+
+def parse_search_args(args):
+    """/api/tasks/search parameters: (query, filters, limit)."""
+    query = args.get('q', '').strip()
+    if not query:
+        raise ValueError("q is required")
+    limit = min(int(args.get('limit', SEARCH_DEFAULT_LIMIT)), API_MAX_LIMIT)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return query, parse_task_filters(args), limit
+
+
+def parse_changes_args(args):
+    """/api/tasks/changes parameters: (since, limit)."""
+    since = int(args.get('since', 0))
+    limit = min(int(args.get('limit', API_DEFAULT_LIMIT)), API_MAX_LIMIT)
+    if since < 0 or limit < 1:
+        raise ValueError("since must be >= 0 and limit positive")
+    return since, limit
+
+
+def next_page_headers(path, args, next_cursor):
+    """X-Next-Cursor and Link headers for the page after this one."""
+    args = {name: args[name] for name in args}
+    args['cursor'] = next_cursor
+    return [('X-Next-Cursor', next_cursor),
+            ('Link', f'<{path}?{urlencode(args)}>; rel="next"')]
+
+
+def search_headers(tasks):
+    """X-Search-Ranked header for a repository search() result."""
+    return [('X-Search-Ranked', 'true' if tasks.ranked else 'false')]
+
+
+def changes_body(changes):
+    """JSON body for a repository changes() result."""
+    return dict(changes, updated=[task.to_dict() for task in changes['updated']])
+
+
+def toggle_result(task):
+    """(JSON body, status) for toggle_completed() returning ``task``."""
+    if not task:
+        return {'success': False, 'message': 'Task not found'}, 404
+    return {
+        'success': True,
+        'completed': task.completed,
+        'message': f'Task marked as {"completed" if task.completed else "pending"}'
+    }, 200
+
+
+def delete_result(deleted):
+    """(JSON body, status) for delete() returning ``deleted``."""
+    if not deleted:
+        return {'success': False, 'message': 'Task not found'}, 404
+    return {'success': True, 'message': 'Task deleted'}, 200
+
+
+def version_validators(prefix, version):
+    """ETag and Last-Modified from a repository version() pair."""
+    number, modified_at = version
+    last_modified = datetime.strptime(
+        modified_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return f"{prefix}-{number}", last_modified
+
+
+def table_validators(prefix):
+    """
+    ETag and Last-Modified for a view of the task table.
+
+    Both come from the trigger-maintained table version, so computing them
+    costs one single-row query and no Task objects.
+    """
+    return version_validators(prefix, task_repo.version())
+
+
+def is_not_modified(etag, last_modified=None):
+    """Whether the request's conditional headers match the validators."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified and request.if_modified_since:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def with_validators(response, etag, last_modified=None):
+    """Attach validators and ask clients to revalidate on every poll."""
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+card_cache = LRUCache(CARD_CACHE_SIZE, CARD_CACHE_TTL)
+card_cache_lock = threading.Lock()
+
+
+def card_cache_metrics():
+    with card_cache_lock:
+        return card_cache.metrics()
+
+
+instrumentation.add_collector('card_cache', card_cache_metrics)
+
+
+def render_task_card(template, task, today):
+    """
+    HTML for one task card, from the fragment cache when possible.
+
+    A card depends only on the task row and on today's date (the overdue
+    badge). Every write to the row stamps updated_at to the microsecond,
+    so it identifies the row's contents.
+    """
+    key = (task.id, task.updated_at, today)
+    with card_cache_lock:
+        html = card_cache.get(key, None)
+    if html is None:
+        html = Markup(template.render(task=task, today=today))
+        with card_cache_lock:
+            card_cache.put(key, html)
+    return html
+
 
-# Initialize repository
-task_repo = SQLiteTaskRepository(get_db)
+@app.template_global()
+def static_url(filename):
+    """URL of a static file, versioned by its modification time."""
+    path = os.path.join(app.static_folder, filename)
+    return url_for('static', filename=filename,
+                   v=int(os.path.getmtime(path)))
+
+
+def index_context(cursor=None):
+    """Template variables for one page of the task list."""
+    tasks, next_cursor = task_repo.list_page(cursor, PAGE_SIZE)
+    # Looked up and dated once per page, not once per card
+    template = app.jinja_env.get_template('_task_card.html')
+    today = date.today().isoformat()
+    return {
+        'tasks': tasks,
+        'cards': [render_task_card(template, task, today) for task in tasks],
+        'next_cursor': next_cursor,
+        'stats': task_repo.stats(),
+    }
 
 
 @app.route('/')
 def index():
-    """Home page - lists all tasks."""
+    """Home page - lists one page of tasks."""
     try:
-        tasks = task_repo.get_all()
-        return render_template('index.html', tasks=tasks, now=datetime.now)
+        # The page also depends on today's date (overdue badges)
+        etag, _ = table_validators(f"index-{date.today().isoformat()}")
+        if is_not_modified(etag):
+            return with_validators(Response(status=304), etag)
+
+        context = index_context(request.args.get('cursor'))
+        return with_validators(
+            app.make_response(render_template('index.html', now=datetime.now, **context)),
+            etag)
     except Exception as e:
         logger.error(f"Error loading tasks: {e}")
         return render_template('index.html', tasks=[], error=str(e), now=datetime.now)
@@ -127,9 +516,8 @@ def delete_task(task_id):
         success = task_repo.delete(task_id)
         if success:
             logger.info(f"Deleted task ID {task_id}")
-            return jsonify({'success': True, 'message': 'Task deleted'})
-        else:
-            return jsonify({'success': False, 'message': 'Task not found'}), 404
+        body, status = delete_result(success)
+        return jsonify(body), status
     except Exception as e:
         logger.error(f"Error deleting task {task_id}: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -139,21 +527,12 @@ def delete_task(task_id):
 def toggle_task(task_id):
     """Toggle task completion status."""
     try:
-        task = task_repo.get_by_id(task_id)
-        if not task:
-            return jsonify({'success': False, 'message': 'Task not found'}), 404
-
-        updated_task = task_repo.mark_completed(task_id, not task.completed)
+        updated_task = task_repo.toggle_completed(task_id)
         if updated_task:
             logger.info(
                 f"Toggled task ID {task_id} to {updated_task.completed}")
-            return jsonify({
-                'success': True,
-                'completed': updated_task.completed,
-                'message': f'Task marked as {"completed" if updated_task.completed else "pending"}'
-            })
-        else:
-            return jsonify({'success': False, 'message': 'Failed to update task'})
+        body, status = toggle_result(updated_task)
+        return jsonify(body), status
     except Exception as e:
         logger.error(f"Error toggling task {task_id}: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -161,22 +540,464 @@ def toggle_task(task_id):
 
 @app.route('/api/tasks', methods=['GET'])
 def api_get_tasks():
-    """API endpoint to get all tasks."""
+    """
+    API endpoint to list tasks, one page at a time.
+
+    Query parameters: ``limit``, ``cursor``, the filters read by
+    parse_task_filters() and ``include_archived`` to list archived tasks
+    too. The next page's cursor is returned in the ``X-Next-Cursor``
+    header and as a ``Link: rel="next"`` URL.
+    """
     try:
-        tasks = task_repo.get_all()
-        return jsonify([task.to_dict() for task in tasks])
+        etag, last_modified = table_validators('tasks')
+        if is_not_modified(etag, last_modified):
+            return with_validators(Response(status=304), etag, last_modified)
+
+        tasks, next_cursor = task_repo.list_page(
+            *parse_list_args(request.args))
+
+        response = jsonify([task.to_dict() for task in tasks])
+        if next_cursor:
+            response.headers.extend(next_page_headers(
+                url_for('api_get_tasks'), request.args, next_cursor))
+        return with_validators(response, etag, last_modified)
+    except ValueError as e:
+        # Bad limit, filter value or cursor (InvalidCursorError)
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"API error getting tasks: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/tasks/search', methods=['GET'])
+def api_search_tasks():
+    """
+    Full-text search over task titles and descriptions.
+
+    Query parameters: ``q`` (every word is matched as a prefix), ``limit``
+    and the filters read by parse_task_filters(). Results are best match
+    first, ranked by BM25, unless the query matches so many tasks that
+    ranking them would be slow: then they are the newest matches and the
+    ``X-Search-Ranked`` header is ``false`` (it is ``true`` otherwise).
+    """
+    try:
+        tasks = task_repo.search(*parse_search_args(request.args))
+        response = jsonify([task.to_dict() for task in tasks])
+        response.headers.extend(search_headers(tasks))
+        return response
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"API error searching tasks: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/tasks/changes', methods=['GET'])
+def api_task_changes():
+    """
+    Delta sync: tasks changed or deleted after version ``since``.
+
+    Clients start from the ``version`` of a full fetch (or 0) and keep
+    passing back ``next_since``. While ``has_more`` is true there are
+    further changes to fetch straight away. A 410 means the server no
+    longer has every deletion since ``since`` and the client must resync.
+    """
+    try:
+        since, limit = parse_changes_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        changes = task_repo.changes(since, limit)
+    except SyncExpiredError as e:
+        return jsonify({'error': str(e),
+                        'version': task_repo.version()[0]}), 410
+    except Exception as e:
+        logger.error(f"API error getting changes: {e}")
+        return jsonify({'error': str(e)}), 500
+    return jsonify(changes_body(changes))
+
+
+@app.route('/api/tasks/next', methods=['GET'])
+def api_next_tasks():
+    """
+    The ``n`` most urgent open tasks that no worker has claimed.
+
+    Ordered by priority, then due date (tasks without one last). Served
+    from an in-memory index, so the table is never sorted for it.
+    """
+    try:
+        n = min(int(request.args.get('n', NEXT_DEFAULT_COUNT)), API_MAX_LIMIT)
+        if n < 1:
+            raise ValueError("n must be positive")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        tasks = task_repo.next_up(n)
+    except Exception as e:
+        logger.error(f"API error getting next tasks: {e}")
+        return jsonify({'error': str(e)}), 500
+    return jsonify([task.to_dict() for task in tasks])
+
+
+@app.route('/api/tasks/claim', methods=['POST'])
+def api_claim_tasks():
+    """
+    Claim the most urgent open tasks for a worker.
+
+    The JSON body is ``{"worker": "<name>", "n": 1}``. Returns up to ``n``
+    tasks, none when the queue is empty; no two workers are ever given the
+    same task. A claim lasts until the task is completed or deleted, or
+    released with POST /api/tasks/<id>/release.
+    """
+    payload = request.get_json(silent=True)
+    worker = payload.get('worker') if isinstance(payload, dict) else None
+    if not isinstance(worker, str) or not worker.strip():
+        return jsonify({'error': 'Expected {"worker": "<name>", "n": <count>}'}), 400
+    n = payload.get('n', 1)
+    if isinstance(n, bool) or not isinstance(n, int) or not 1 <= n <= API_MAX_LIMIT:
+        return jsonify({'error': f'n must be between 1 and {API_MAX_LIMIT}'}), 400
+
+    try:
+        tasks = task_repo.claim(worker.strip(), n)
+    except Exception as e:
+        logger.error(f"API error claiming tasks: {e}")
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'worker': worker.strip(),
+                    'tasks': [task.to_dict() for task in tasks]})
+
+
+@app.route('/api/tasks/<int:task_id>/release', methods=['POST'])
+def api_release_task(task_id):
+    """Drop a worker's claim on a task and put it back in the queue."""
+    try:
+        released = task_repo.release(task_id)
+    except Exception as e:
+        logger.error(f"API error releasing task {task_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+    if not released:
+        return jsonify({'error': 'Task is not claimed'}), 404
+    return jsonify({'id': task_id, 'released': True})
+
+
+@app.route('/api/stats', methods=['GET'])
+def api_get_stats():
+    """API endpoint for dashboard counters."""
+    try:
+        return jsonify(task_repo.stats())
+    except Exception as e:
+        logger.error(f"API error getting stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+def report_response(name, build):
+    """
+    Serve a report, revalidated against the table version.
+
+    ``build`` gets the current TaskSnapshot and may raise ValueError for
+    bad parameters. The ETag includes the query string and today's date,
+    which reports default their ranges to.
+    """
+    if report_engine is None:
+        return jsonify({'error': 'Reports need NumPy installed'}), 503
+    try:
+        etag, last_modified = table_validators(
+            f"report-{name}-{date.today().isoformat()}-"
+            f"{zlib.crc32(request.query_string):x}")
+        if is_not_modified(etag, last_modified):
+            return with_validators(Response(status=304), etag, last_modified)
+        report = build(report_engine.snapshot())
+        return with_validators(jsonify(report), etag, last_modified)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"API error building {name} report: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+def parse_report_priority(args):
+    if not args.get('priority'):
+        return None
+    priority = int(args['priority'])
+    if not 1 <= priority <= 5:
+        raise ValueError("priority must be between 1 and 5")
+    return priority
+
+
+@app.route('/api/reports/burndown', methods=['GET'])
+def api_report_burndown():
+    """
+    Tasks created, completed and open per day or week.
+
+    Query parameters: ``from`` and ``to`` (YYYY-MM-DD, default the last
+    REPORT_DEFAULT_DAYS days), ``bucket`` (day or week) and ``priority``.
+    """
+    def build(snapshot):
+        args = request.args
+        end = (datetime.strptime(args['to'], '%Y-%m-%d').date()
+               if args.get('to') else date.today())
+        start = (datetime.strptime(args['from'], '%Y-%m-%d').date()
+                 if args.get('from')
+                 else date.fromordinal(end.toordinal() - REPORT_DEFAULT_DAYS + 1))
+        return analytics.burndown(snapshot, start, end,
+                                  args.get('bucket', 'day'),
+                                  parse_report_priority(args))
+    return report_response('burndown', build)
+
+
+@app.route('/api/reports/completion', methods=['GET'])
+def api_report_completion():
+    """Task counts, completion rate and days to complete per priority."""
+    return report_response('completion', analytics.completion_by_priority)
+
+
+@app.route('/api/reports/lateness', methods=['GET'])
+def api_report_lateness():
+    """How many days after their due date tasks were completed."""
+    return report_response('lateness', lambda snapshot: analytics.lateness(
+        snapshot, parse_report_priority(request.args)))
+
+
+def task_fields_from_json(item, partial=False):
+    """
+    Validate a bulk create or update item; returns the task fields it sets.
+
+    Raises ValueError naming the first invalid field. With ``partial``
+    (updates), only the fields present are checked and none is required.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Each task must be an object")
+    fields = {}
+    for name in ('title', 'description'):
+        if item.get(name) is not None:
+            if not isinstance(item[name], str):
+                raise ValueError(f"{name} must be a string")
+            fields[name] = item[name].strip()
+    if not fields.get('title') and (not partial or 'title' in fields):
+        raise ValueError("Title is required")
+
+    priority = item.get('priority')
+    if priority is not None:
+        if (not isinstance(priority, int) or isinstance(priority, bool)
+                or not 1 <= priority <= 5):
+            raise ValueError("priority must be an integer from 1 to 5")
+        fields['priority'] = priority
+
+    due_date = item.get('due_date')
+    if due_date not in (None, ''):  # Both mean no due date
+        try:
+            valid = date.fromisoformat(due_date).isoformat() == due_date
+        except (TypeError, ValueError):
+            valid = False
+        if not valid:
+            raise ValueError("due_date must be a YYYY-MM-DD date")
+        fields['due_date'] = due_date
+
+    completed = item.get('completed')
+    if completed is not None:
+        if not isinstance(completed, bool):
+            raise ValueError("completed must be true or false")
+        fields['completed'] = completed
+    return fields
+
+
+def task_from_json(item):
+    """Build a Task from a bulk-create item; raises ValueError if invalid."""
+    return Task(**task_fields_from_json(item))
+
+
+def id_list(items):
+    """Validate a list of task ids."""
+    if not isinstance(items, list) or not all(
+            isinstance(i, int) and not isinstance(i, bool) for i in items):
+        raise ValueError("Expected a list of integer task ids")
+    return items
+
+
+@app.route('/api/tasks/bulk', methods=['POST'])
+def api_bulk_tasks():
+    """
+    Create, update, delete and complete many tasks in one request.
+
+    The JSON body may contain any of::
+
+        {"create": [{"title": ...}, ...],
+         "update": [{"id": 1, "title": ...}, ...],
+         "delete": [1, 2],
+         "complete": [3], "reopen": [4]}
+
+    Create and update items are validated like the task forms; an invalid
+    item is skipped and its result carries the error. Each section runs as
+    a single transaction. The response reports one result per item, in
+    request order.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    sections = ('create', 'update', 'delete', 'complete', 'reopen')
+    for name in sections:
+        if name in payload and not isinstance(payload[name], list):
+            return jsonify({'error': f'{name} must be a list'}), 400
+    total = sum(len(payload.get(name, ())) for name in sections)
+    if total > BULK_MAX_ITEMS:
+        return jsonify({'error': f'At most {BULK_MAX_ITEMS} items per request'}), 413
+
+    results = {}
+    try:
+        if payload.get('create'):
+            outcome, tasks = [], []
+            for item in payload['create']:
+                try:
+                    tasks.append(task_from_json(item))
+                    outcome.append(None)
+                except ValueError as e:
+                    outcome.append({'success': False, 'error': str(e)})
+            created = iter(task_repo.bulk_create(tasks))
+            results['create'] = [
+                result or {'success': True, 'task': next(created).to_dict()}
+                for result in outcome]
+
+        if payload.get('update'):
+            items = payload['update']
+            if not all(isinstance(item, dict) and isinstance(item.get('id'), int)
+                       for item in items):
+                raise ValueError("Each update needs an integer id")
+            outcome, updates = [], []
+            for item in items:
+                try:
+                    updates.append((item['id'],
+                                    task_fields_from_json(item, partial=True)))
+                    outcome.append(None)
+                except ValueError as e:
+                    outcome.append({'id': item['id'], 'success': False,
+                                    'error': str(e)})
+            updated = iter(task_repo.bulk_update(updates))
+            results['update'] = [
+                result or {'id': item['id'], 'success': next(updated)}
+                for item, result in zip(items, outcome)]
+
+        if payload.get('delete'):
+            ids = id_list(payload['delete'])
+            results['delete'] = [{'id': task_id, 'success': ok} for task_id, ok
+                                 in zip(ids, task_repo.bulk_delete(ids))]
+
+        for name, completed in (('complete', True), ('reopen', False)):
+            if payload.get(name):
+                ids = id_list(payload[name])
+                marked = task_repo.bulk_mark_completed(ids, completed)
+                results[name] = [{'id': task_id, 'success': ok}
+                                 for task_id, ok in zip(ids, marked)]
+    except (TypeError, ValueError, sqlite3.IntegrityError) as e:
+        # Malformed items, or values the schema rejects (rolled back)
+        return jsonify({'error': str(e), 'results': results}), 400
+    except Exception as e:
+        logger.error(f"Bulk API error: {e}")
+        return jsonify({'error': str(e), 'results': results}), 500
+
+    logger.info(f"Bulk request applied {total} items")
+    return jsonify(results)
+
+
+def encode_export(batches, export_format):
+    """Encode task batches as chunks of a JSON array or NDJSON stream."""
+    if export_format == 'ndjson':
+        for batch in batches:
+            yield ''.join(json.dumps(task.to_dict()) + '\n' for task in batch)
+        return
+
+    yield '['
+    first = True
+    for batch in batches:
+        chunk = ','.join(json.dumps(task.to_dict()) for task in batch)
+        yield chunk if first else ',' + chunk
+        first = False
+    yield ']'
+
+
+@app.route('/api/tasks/export', methods=['GET'])
+def api_export_tasks():
+    """
+    Stream every task as a JSON array (default) or NDJSON.
+
+    Rows are read and encoded one batch at a time, so memory use does not
+    grow with the size of the table.
+    """
+    export_format = request.args.get('format', 'json')
+    if export_format not in ('json', 'ndjson'):
+        return jsonify({'error': 'format must be json or ndjson'}), 400
+
+    mimetype = ('application/x-ndjson' if export_format == 'ndjson'
+                else 'application/json')
+    batches = task_repo.iter_all(EXPORT_BATCH_SIZE)
+    return Response(encode_export(batches, export_format), mimetype=mimetype)
+
+
+def stream_events(subscription):
+    """Yield SSE messages for a subscription until it is closed or evicted."""
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        while True:
+            try:
+                event = subscription.get(timeout=SSE_KEEPALIVE)
+            except SubscriptionClosed:
+                if subscription.evicted:
+                    # Tell the page it missed events and should resync
+                    yield "event: evicted\ndata: {}\n\n"
+                return
+            yield event.encoded if event else ": keep-alive\n\n"
+    finally:
+        subscription.close()
+
+
+@app.route('/api/events', methods=['GET'])
+def api_events():
+    """
+    Server-Sent Events stream of task writes.
+
+    Each message's ``event`` is the write (``created``, ``updated``,
+    ``toggled``, ``deleted`` or a ``bulk_*`` variant) and its ``data`` the
+    JSON payload published by the repository.
+    """
+    try:
+        subscription = event_hub.subscribe()
+    except HubFullError as e:
+        return jsonify({'error': str(e)}), 503
+    return Response(stream_events(subscription), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache',
+                             'X-Accel-Buffering': 'no'})
+
+
+@app.after_request
+def compress_response(response):
+    """Compress large text responses with brotli or gzip."""
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.is_streamed or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(body, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors."""
     return render_template('index.html',
                            error="Page not found",
-                           tasks=task_repo.get_all(),
-                           now=datetime.now), 404
+                           now=datetime.now,
+                           **index_context()), 404
 
 
 @app.errorhandler(500)
@@ -185,13 +1006,12 @@ def server_error(error):
     logger.error(f"Server error: {error}")
     return render_template('index.html',
                            error="Internal server error",
-                           tasks=task_repo.get_all(),
-                           now=datetime.now), 500
+                           now=datetime.now,
+                           **index_context()), 500
 
 
 if __name__ == '__main__':
-    # Initialize database
-    init_database()
-
     # Run the application
+    start_archiver()
+    start_reminders()
     app.run(debug=True, host='0.0.0.0', port=5000)
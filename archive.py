@@ -0,0 +1,91 @@
+"""
+Background archiving of old completed tasks.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from models import SQLiteTaskRepository
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OLDER_THAN_DAYS = 30
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_INTERVAL = 3600.0
+# Seconds between batches of one run, so other writers get the lock
+DEFAULT_PAUSE = 0.05
+
+
+class TaskArchiver:
+    """
+    Thread that moves completed tasks into the archive table in batches.
+
+    Every ``interval`` seconds (and once on start) it archives the tasks
+    completed more than ``older_than_days`` ago, ``batch_size`` per
+    transaction, pausing between batches so request writes are never
+    queued behind one long transaction. ``on_archive`` is called with the
+    ids of each batch, e.g. to invalidate a read cache that sits in front
+    of ``repo``.
+    """
+
+    def __init__(self, repo: SQLiteTaskRepository,
+                 older_than_days: int = DEFAULT_OLDER_THAN_DAYS,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 interval: float = DEFAULT_INTERVAL,
+                 pause: float = DEFAULT_PAUSE,
+                 on_archive: Optional[Callable[[List[int]], None]] = None):
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+        self.repo = repo
+        self.older_than_days = older_than_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pause = pause
+        self.on_archive = on_archive
+        self.runs = 0
+        self.archived = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the archiving thread."""
+        self._thread = threading.Thread(target=self._run, name='task-archiver',
+                                        daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop the thread, letting the batch in progress commit."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run_once(self) -> int:
+        """Archive every task old enough; returns how many were moved."""
+        moved = 0
+        while not self._stop.is_set():
+            task_ids = self.repo.archive_completed(self.older_than_days,
+                                                   self.batch_size)
+            if task_ids and self.on_archive is not None:
+                self.on_archive(task_ids)
+            moved += len(task_ids)
+            self.archived += len(task_ids)
+            if len(task_ids) < self.batch_size:
+                break
+            time.sleep(self.pause)
+        self.runs += 1
+        if moved:
+            logger.info(f"Archived {moved} completed tasks")
+        return moved
+
+    def metrics(self) -> Dict[str, int]:
+        return {'runs': self.runs, 'archived': self.archived}
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Archiving completed tasks failed: {e}")
+            if self._stop.wait(self.interval):
+                return
@@ -0,0 +1,284 @@
+"""
+ASGI entry point for Task Manager.
+
+Run with any ASGI server, e.g. ``uvicorn asgi:application``.
+
+The JSON API and the /api/events stream are served natively from the event
+loop: handlers await the database on AsyncTaskRepository's executor, and an
+idle event stream is a suspended coroutine rather than a blocked thread.
+Every other route (HTML pages, forms, bulk writes, export) is passed to the
+Flask app through asgiref's WSGI adapter when asgiref is installed.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import re
+from urllib.parse import parse_qsl
+
+from werkzeug.http import (http_date, parse_accept_header, parse_date,
+                           parse_etags, quote_etag)
+
+import app as app_module
+from app import (COMPRESS_MIN_SIZE, SSE_RETRY_MS, changes_body,
+                 delete_result, next_page_headers, parse_changes_args,
+                 parse_list_args, parse_search_args, search_headers,
+                 toggle_result, version_validators)
+from async_repository import AsyncTaskRepository
+from events import HubFullError, SubscriptionClosed
+from models import SyncExpiredError
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:  # Optional: without it only the native routes are served
+    WsgiToAsgi = None
+
+logger = logging.getLogger(__name__)
+
+# Shares the WSGI app's cache and event hub, so writes made through either
+# side invalidate the same cache and reach the same subscribers
+task_repo = AsyncTaskRepository(app_module.task_repo)
+wsgi_application = WsgiToAsgi(app_module.app) if WsgiToAsgi else None
+
+
+class Request:
+    """The parts of an HTTP scope the native handlers read."""
+
+    __slots__ = ('method', 'path', 'args', 'headers')
+
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        # Like Flask's request.args.get(), a repeated parameter keeps its
+        # first value
+        self.args = {}
+        for name, value in parse_qsl(scope['query_string'].decode('latin-1')):
+            self.args.setdefault(name, value)
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope['headers']}
+
+    def not_modified(self, etag, last_modified=None):
+        """Same rules as app.is_not_modified(), for raw headers."""
+        if 'if-none-match' in self.headers:
+            return parse_etags(self.headers['if-none-match']).contains_weak(etag)
+        since = parse_date(self.headers.get('if-modified-since'))
+        return bool(last_modified and since and last_modified <= since)
+
+
+async def send_response(send, status, body=b'', content_type=None, headers=()):
+    headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+               for name, value in headers]
+    if content_type:
+        headers.append((b'content-type', content_type.encode('latin-1')))
+    headers.append((b'content-length', str(len(body)).encode()))
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class TrackedSend:
+    """Wraps an ASGI ``send``, noting how far the response has got."""
+
+    __slots__ = ('send', 'started', 'finished', 'status')
+
+    def __init__(self, send):
+        self.send = send
+        self.started = False
+        self.finished = False
+        self.status = 500  # Until a response starts
+
+    async def __call__(self, message):
+        if message['type'] == 'http.response.start':
+            self.started = True
+            self.status = message['status']
+        elif message['type'] == 'http.response.body':
+            self.finished = not message.get('more_body', False)
+        await self.send(message)
+
+
+async def send_json(request, send, data, status=200, headers=()):
+    """Send a JSON body, gzip-compressed when large and accepted."""
+    body = json.dumps(data).encode()
+    headers = list(headers)
+    if len(body) >= COMPRESS_MIN_SIZE:
+        headers.append(('Vary', 'Accept-Encoding'))
+        accepted = parse_accept_header(request.headers.get('accept-encoding'))
+        if accepted['gzip']:
+            body = gzip.compress(body, compresslevel=6)
+            headers.append(('Content-Encoding', 'gzip'))
+    await send_response(send, status, body, 'application/json', headers)
+
+
+async def send_error(request, send, error, status):
+    """Answer with an error, or end a response already under way."""
+    if not send.started:
+        return await send_json(request, send, {'error': str(error)}, status)
+    # The status line is out (e.g. an event stream): all that is left is
+    # to end the body, if it is still open
+    logger.error(f"Ending {request.method} {request.path} early after "
+                 f"an error: {error}")
+    if not send.finished:
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+async def table_validators(prefix):
+    """Async counterpart of app.table_validators()."""
+    return version_validators(prefix, await task_repo.version())
+
+
+def validator_headers(etag, last_modified):
+    return [('ETag', quote_etag(etag, weak=True)),
+            ('Last-Modified', http_date(last_modified)),
+            ('Cache-Control', 'no-cache')]
+
+
+async def api_get_tasks(request, receive, send):
+    etag, last_modified = await table_validators('tasks')
+    headers = validator_headers(etag, last_modified)
+    if request.not_modified(etag, last_modified):
+        return await send_response(send, 304, headers=headers)
+
+    tasks, next_cursor = await task_repo.list_page(
+        *parse_list_args(request.args))
+    if next_cursor:
+        headers += next_page_headers(request.path, request.args, next_cursor)
+    await send_json(request, send, [task.to_dict() for task in tasks],
+                    headers=headers)
+
+
+async def api_search_tasks(request, receive, send):
+    tasks = await task_repo.search(*parse_search_args(request.args))
+    await send_json(request, send, [task.to_dict() for task in tasks],
+                    headers=search_headers(tasks))
+
+
+async def api_task_changes(request, receive, send):
+    since, limit = parse_changes_args(request.args)
+    try:
+        changes = await task_repo.changes(since, limit)
+    except SyncExpiredError as e:
+        version, _ = await task_repo.version()
+        return await send_json(request, send,
+                               {'error': str(e), 'version': version}, 410)
+    await send_json(request, send, changes_body(changes))
+
+
+async def api_get_stats(request, receive, send):
+    await send_json(request, send, await task_repo.stats())
+
+
+async def toggle_task(request, receive, send, task_id):
+    body, status = toggle_result(await task_repo.toggle_completed(task_id))
+    await send_json(request, send, body, status)
+
+
+async def delete_task(request, receive, send, task_id):
+    body, status = delete_result(await task_repo.delete(task_id))
+    await send_json(request, send, body, status)
+
+
+async def api_events(request, receive, send):
+    """The /api/events stream of app.api_events(), without a thread."""
+    try:
+        subscription = app_module.event_hub.subscribe()
+    except HubFullError as e:
+        return await send_json(request, send, {'error': str(e)}, 503)
+
+    async def close_on_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        subscription.close()
+
+    watcher = asyncio.ensure_future(close_on_disconnect())
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no')]})
+        message = f"retry: {SSE_RETRY_MS}\n\n"
+        while True:
+            await send({'type': 'http.response.body',
+                        'body': message.encode(), 'more_body': True})
+            try:
+                event = await subscription.get_async(app_module.SSE_KEEPALIVE)
+            except SubscriptionClosed:
+                if subscription.evicted:
+                    await send({'type': 'http.response.body', 'more_body': True,
+                                'body': b"event: evicted\ndata: {}\n\n"})
+                break
+            message = event.encoded if event else ": keep-alive\n\n"
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        watcher.cancel()
+        subscription.close()
+
+
+# (method, path) -> handler for the native routes
+ROUTES = {
+    ('GET', '/api/tasks'): api_get_tasks,
+    ('GET', '/api/tasks/search'): api_search_tasks,
+    ('GET', '/api/tasks/changes'): api_task_changes,
+    ('GET', '/api/stats'): api_get_stats,
+    ('GET', '/api/events'): api_events,
+}
+TASK_ROUTES = {
+    'toggle': toggle_task,
+    'delete': delete_task,
+}
+TASK_ROUTE_PATTERN = re.compile(r'^/task/(toggle|delete)/(\d+)$')
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            app_module.start_archiver()
+            app_module.start_reminders()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            app_module.reminders.close()
+            app_module.event_hub.close()
+            task_repo.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """The ASGI application."""
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    request = Request(scope)
+    handler, args = ROUTES.get((request.method, request.path)), ()
+    match = TASK_ROUTE_PATTERN.match(request.path)
+    if match and request.method == 'POST':
+        handler, args = TASK_ROUTES[match.group(1)], (int(match.group(2)),)
+
+    if handler is None:
+        if wsgi_application is not None:
+            return await wsgi_application(scope, receive, send)
+        return await send_json(request, send, {
+            'error': 'Not found (install asgiref to serve the HTML pages '
+                     'under ASGI)'}, 404)
+
+    # Request metrics, as the Flask app's hooks record them; the repository
+    # calls awaited below run in this request's context
+    instrumentation = app_module.instrumentation
+    request_stats = instrumentation.begin_request()
+    send = TrackedSend(send)
+    try:
+        # Same catch-up as the WSGI app's before_request hook, off the loop
+        await asyncio.get_running_loop().run_in_executor(
+            task_repo.executor, app_module.change_follower.check)
+        await handler(request, receive, send, *args)
+    except ValueError as e:
+        # Bad limit, filter value, cursor or sync position
+        await send_error(request, send, e, 400)
+    except Exception as e:
+        logger.error(f"ASGI error on {request.method} {request.path}: {e}")
+        await send_error(request, send, e, 500)
+    finally:
+        if request_stats is not None:
+            request_stats.status = send.status
+        instrumentation.end_request(handler.__name__, request.method)
+
@@ -0,0 +1,115 @@
+"""
+Asyncio access to a task repository.
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from functools import partial
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from database import DEFAULT_POOL_SIZE
+from models import Task, TaskRepository
+
+
+class AsyncTaskRepository:
+    """
+    Awaitable wrapper around a (blocking) TaskRepository.
+
+    Every call runs on a dedicated DB executor, never on the event loop, so
+    a slow query delays only the coroutines waiting for it. The executor has
+    one thread per pooled connection by default; more threads would only
+    queue on the pool. Because it wraps an existing repository, the async
+    and WSGI sides share its cache and event hub.
+    """
+
+    def __init__(self, repo: TaskRepository, max_workers: int = DEFAULT_POOL_SIZE):
+        self.repo = repo
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='task-db')
+
+    async def _run(self, method, *args):
+        # In the caller's context, as asyncio.to_thread() does, so context
+        # variables such as the instrumentation's request stats carry over
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self.executor, partial(context.run, method, *args))
+
+    def close(self):
+        """Wait for queued calls and stop the executor threads."""
+        self.executor.shutdown(wait=True)
+
+    # Reads
+
+    async def get_all(self) -> List[Task]:
+        return await self._run(self.repo.get_all)
+
+    async def iter_all(self, batch_size: int = 500) -> AsyncIterator[List[Task]]:
+        # Each batch checks a connection out and back in, so the generator
+        # can be advanced from whichever executor thread is free.
+        batches = self.repo.iter_all(batch_size)
+        try:
+            while True:
+                batch = await self._run(next, batches, None)
+                if batch is None:
+                    return
+                yield batch
+        finally:
+            await self._run(batches.close)
+
+    async def list_page(self, cursor: Optional[str] = None, limit: int = 50,
+                        filters: Optional[Dict[str, Any]] = None,
+                        include_archived: bool = False
+                        ) -> Tuple[List[Task], Optional[str]]:
+        return await self._run(self.repo.list_page, cursor, limit, filters,
+                               include_archived)
+
+    async def count(self, filters: Optional[Dict[str, Any]] = None,
+                    include_archived: bool = False) -> int:
+        return await self._run(self.repo.count, filters, include_archived)
+
+    async def stats(self, today: Optional[date] = None) -> Dict[str, Any]:
+        return await self._run(self.repo.stats, today)
+
+    async def search(self, query: str, filters: Optional[Dict[str, Any]] = None,
+                     limit: int = 20) -> List[Task]:
+        return await self._run(self.repo.search, query, filters, limit)
+
+    async def version(self) -> Tuple[int, str]:
+        return await self._run(self.repo.version)
+
+    async def changes(self, since: int, limit: int = 500) -> Dict[str, Any]:
+        return await self._run(self.repo.changes, since, limit)
+
+    async def get_by_id(self, task_id: int) -> Optional[Task]:
+        return await self._run(self.repo.get_by_id, task_id)
+
+    # Writes
+
+    async def create(self, task: Task) -> Task:
+        return await self._run(self.repo.create, task)
+
+    async def update(self, task_id: int, task_data: Dict[str, Any]) -> Optional[Task]:
+        return await self._run(self.repo.update, task_id, task_data)
+
+    async def delete(self, task_id: int) -> bool:
+        return await self._run(self.repo.delete, task_id)
+
+    async def mark_completed(self, task_id: int, completed: bool) -> Optional[Task]:
+        return await self._run(self.repo.mark_completed, task_id, completed)
+
+    async def toggle_completed(self, task_id: int) -> Optional[Task]:
+        return await self._run(self.repo.toggle_completed, task_id)
+
+    async def bulk_create(self, tasks: List[Task]) -> List[Task]:
+        return await self._run(self.repo.bulk_create, tasks)
+
+    async def bulk_update(self, updates: List[Tuple[int, Dict[str, Any]]]) -> List[bool]:
+        return await self._run(self.repo.bulk_update, updates)
+
+    async def bulk_delete(self, task_ids: List[int]) -> List[bool]:
+        return await self._run(self.repo.bulk_delete, task_ids)
+
+    async def bulk_mark_completed(self, task_ids: List[int], completed: bool) -> List[bool]:
+        return await self._run(self.repo.bulk_mark_completed, task_ids, completed)
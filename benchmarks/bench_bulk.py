@@ -0,0 +1,71 @@
+"""
+Single-task calls versus one bulk call, over HTTP and at the repository.
+
+Usage: python benchmarks/bench_bulk.py [--count 10000]
+"""
+import argparse
+import logging
+import time
+from functools import partial
+
+from common import temp_db_path
+
+import app as app_module
+from database import DatabaseConnection
+from models import SQLiteTaskRepository, Task
+
+
+def timed(label, fn):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:>34}: {elapsed:8.3f}s")
+    return elapsed
+
+
+def fresh_repo():
+    return SQLiteTaskRepository(partial(DatabaseConnection, temp_db_path()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=10000)
+    args = parser.parse_args()
+    n = args.count
+    logging.disable(logging.INFO)
+    client = app_module.app.test_client()
+
+    def http_single():
+        for i in range(n):
+            client.post('/task/create', data={'title': f'Task {i}'})
+        for task_id in range(1, n + 1):
+            client.post(f'/task/toggle/{task_id}')
+
+    def http_bulk():
+        client.post('/api/tasks/bulk', json={
+            'create': [{'title': f'Task {i}'} for i in range(n)]})
+        client.post('/api/tasks/bulk', json={'complete': list(range(1, n + 1))})
+
+    print(f"Create then complete {n} tasks")
+    for label, fn in ((f'HTTP, {n} x 2 single requests', http_single),
+                      ('HTTP, 2 bulk requests', http_bulk)):
+        app_module.task_repo = fresh_repo()
+        timed(label, fn)
+
+    repo = fresh_repo()
+
+    def repo_single():
+        for i in range(n):
+            task = repo.create(Task(title=f'Task {i}'))
+            repo.mark_completed(task.id, True)
+
+    single = timed(f'repository, {n} x 2 single calls', repo_single)
+    repo = fresh_repo()
+    bulk = timed('repository, 2 bulk calls', lambda: repo.bulk_mark_completed(
+        [t.id for t in repo.bulk_create([Task(title=f'Task {i}')
+                                         for i in range(n)])], True))
+    print(f"{'repository speedup':>34}: {single / bulk:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Peak Python memory for exporting the whole task table.
+
+Compares building the full response the old way (Task list, dict list,
+one JSON string) with the streaming /api/tasks/export encoder, for a
+growing number of rows. Streaming peak memory should stay flat.
+
+Usage: python benchmarks/bench_export.py [--sizes 10000,50000,100000]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from functools import partial
+
+from common import seed_tasks, temp_db_path
+
+import app as app_module
+from database import DatabaseConnection
+from models import SQLiteTaskRepository
+
+
+def measure(fn):
+    """Return (peak MiB, seconds) for calling fn()."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024, elapsed
+
+
+def materialized(repo):
+    tasks = repo.get_all()
+    json.dumps([task.to_dict() for task in tasks])
+
+
+def streamed(repo, export_format):
+    batches = repo.iter_all(app_module.EXPORT_BATCH_SIZE)
+    for _ in app_module.encode_export(batches, export_format):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10000,50000,100000')
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'materialized':>20} {'json stream':>20} "
+          f"{'ndjson stream':>20}")
+    for size in (int(n) for n in args.sizes.split(',')):
+        db_path = temp_db_path()
+        seed_tasks(db_path, size)
+        repo = SQLiteTaskRepository(partial(DatabaseConnection, db_path))
+        cells = []
+        for fn in (partial(materialized, repo), partial(streamed, repo, 'json'),
+                   partial(streamed, repo, 'ndjson')):
+            peak, elapsed = measure(fn)
+            cells.append(f"{peak:7.1f} MiB {elapsed:6.2f}s")
+        print(f"{size:>8} " + " ".join(f"{cell:>20}" for cell in cells))
+
+
+if __name__ == '__main__':
+    main()
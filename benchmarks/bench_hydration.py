@@ -0,0 +1,81 @@
+"""
+Task hydration speed and size for reading a large table.
+
+Compares the previous mapping (sqlite3.Row, per-column name lookups and
+Task.__init__ on a __dict__-based class) with the slotted Task hydrated
+by task_row_factory. Reports objects/sec and bytes per task.
+
+Usage: python benchmarks/bench_hydration.py [--rows 100000]
+"""
+import argparse
+import sqlite3
+import time
+import tracemalloc
+from datetime import datetime
+
+from common import seed_tasks, temp_db_path
+
+from models import TASK_COLUMNS, task_row_factory
+
+
+class DictTask:
+    """The Task class as it was before __slots__ and from_row()."""
+
+    def __init__(self, title, description="", priority=3, due_date=None,
+                 completed=False, task_id=None, created_at=None,
+                 updated_at=None):
+        self.id = task_id
+        self.title = title
+        self.description = description
+        self.priority = max(1, min(5, priority))
+        self.due_date = due_date
+        self.completed = completed
+        self.created_at = created_at or datetime.now().isoformat()
+        self.updated_at = updated_at or datetime.now().isoformat()
+
+
+def legacy_load(conn):
+    conn.row_factory = sqlite3.Row
+    return [DictTask(task_id=row['id'], title=row['title'],
+                     description=row['description'], priority=row['priority'],
+                     due_date=row['due_date'], completed=bool(row['completed']),
+                     created_at=row['created_at'], updated_at=row['updated_at'])
+            for row in conn.execute("SELECT * FROM tasks")]
+
+
+def slotted_load(conn):
+    cursor = conn.cursor()
+    cursor.row_factory = task_row_factory
+    return cursor.execute(f"SELECT {TASK_COLUMNS} FROM tasks").fetchall()
+
+
+def measure(load, conn, rows):
+    started = time.perf_counter()
+    load(conn)
+    rate = rows / (time.perf_counter() - started)
+
+    tracemalloc.start()
+    tasks = load(conn)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tasks
+    return rate, size / rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    seed_tasks(db_path, args.rows)
+    conn = sqlite3.connect(db_path)
+    for label, load in (('legacy Row + __init__', legacy_load),
+                        ('slotted from_row', slotted_load)):
+        rate, per_task = measure(load, conn, args.rows)
+        print(f"{label:>22}: {rate:10.0f} objects/sec "
+              f"{per_task:6.0f} bytes/task")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Overhead of the /metrics instrumentation on request handling.
+
+Drives the Flask app in-process (no network, so the overhead is not
+diluted by socket time) with a mix of cached list reads, stats, a search
+and a toggle, alternating rounds with the instrumentation on and off:
+"off" swaps in the same repository stack as the app's (next-up index,
+read cache, change follower) built without the instrumentation wrappers,
+and disables the request hooks. The target is under 2% overhead; timings
+on a busy machine vary by more than that between runs, so rounds are
+short and paired and measure process CPU time rather than wall-clock
+time. It prints PASS or FAIL against the target.
+
+Usage: python benchmarks/bench_instrumentation.py [--rounds N]
+       [--requests N] [--tasks N]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+from common import seed_tasks, temp_db_path
+
+REQUESTS = [
+    ('GET', '/api/tasks?limit=50'),
+    ('GET', '/api/tasks?limit=50&priority=2'),
+    ('GET', '/api/stats'),
+    ('GET', '/api/tasks/search?q=task'),
+    ('POST', '/task/toggle/{id}'),
+]
+
+# Percent; main() exits with status 1 when the median overhead is above it
+TARGET_OVERHEAD = 2.0
+
+
+def run_round(client, count):
+    """CPU seconds per request over ``count`` requests of the mix."""
+    started = time.process_time()
+    for i in range(count):
+        method, path = REQUESTS[i % len(REQUESTS)]
+        response = client.open(path.format(id=i % 1000 + 1), method=method)
+        response.close()
+    return (time.process_time() - started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--tasks', type=int, default=10000)
+    args = parser.parse_args()
+
+    # The app opens tasks.db in the working directory
+    db_path = temp_db_path('tasks.db')
+    seed_tasks(db_path, args.tasks)
+    os.chdir(os.path.dirname(db_path))
+    import app as app_module
+    from cache import CachedTaskRepository
+    from coherence import ChangeFollower
+    from database import get_db
+    from models import SQLiteTaskRepository
+    from next_up import NextUpRepository
+    logging.disable(logging.CRITICAL)
+
+    stacks = {True: (app_module.task_repo, app_module.change_follower)}
+    plain_sqlite = SQLiteTaskRepository(get_db, events=app_module.event_hub)
+    plain_cached = CachedTaskRepository(plain_sqlite)
+    plain = NextUpRepository(plain_cached, plain_sqlite)
+    stacks[False] = (plain, ChangeFollower(
+        plain_sqlite,
+        lambda task_ids: (plain_cached.invalidate(task_ids),
+                          plain.sync(task_ids)),
+        lambda: (plain_cached.invalidate(), plain.rebuild())))
+    client = app_module.app.test_client()
+
+    def use(enabled):
+        app_module.task_repo, app_module.change_follower = stacks[enabled]
+        app_module.instrumentation.enabled = enabled
+
+    for enabled in (False, True):  # warm up both stacks
+        use(enabled)
+        run_round(client, args.requests // 10)
+
+    # Short rounds in on/off pairs, alternating which goes first; the
+    # median of the per-pair ratios is robust to machine noise that spans
+    # many pairs
+    timings = {False: [], True: []}
+    ratios = []
+    for pair in range(args.rounds):
+        for enabled in ((False, True) if pair % 2 else (True, False)):
+            use(enabled)
+            timings[enabled].append(run_round(client, args.requests))
+        ratios.append(timings[True][-1] / timings[False][-1])
+
+    off = statistics.median(timings[False]) * 1e6
+    on = statistics.median(timings[True]) * 1e6
+    overhead = (statistics.median(ratios) - 1) * 100
+    low, _, high = ((q - 1) * 100 for q in statistics.quantiles(ratios))
+    print(f"{args.rounds} round pairs x {args.requests} requests, "
+          f"{args.tasks} tasks")
+    print(f"instrumentation off: {off:8.1f} us/request (median)")
+    print(f"instrumentation on:  {on:8.1f} us/request (median)")
+    print(f"overhead:            {overhead:+8.2f} % (median of paired rounds; "
+          f"quartiles {low:+.2f} / {high:+.2f} %)")
+    passed = overhead < TARGET_OVERHEAD
+    print(f"{'PASS' if passed else 'FAIL'}: target is under "
+          f"{TARGET_OVERHEAD:g} %")
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
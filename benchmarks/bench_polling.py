@@ -0,0 +1,59 @@
+"""
+Bytes transferred and server CPU per dashboard poll.
+
+Polls /api/tasks and / the way a dashboard does: plain, gzip-compressed,
+and conditional (If-None-Match with the previous ETag, nothing changed).
+
+Usage: python benchmarks/bench_polling.py [--tasks N] [--polls N]
+"""
+import argparse
+import logging
+import time
+from functools import partial
+
+from common import seed_tasks, temp_db_path
+
+import app as app_module
+from cache import CachedTaskRepository
+from database import DatabaseConnection
+from models import SQLiteTaskRepository
+
+
+def poll(client, url, polls, headers):
+    """Return (bytes per poll, CPU ms per poll)."""
+    transferred = 0
+    started = time.process_time()
+    for _ in range(polls):
+        transferred += len(client.get(url, headers=headers).get_data())
+    cpu = time.process_time() - started
+    return transferred / polls, cpu * 1000 / polls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument('--polls', type=int, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    db_path = temp_db_path()
+    seed_tasks(db_path, args.tasks)
+    client = app_module.app.test_client()
+
+    for cached in (False, True):
+        repo = SQLiteTaskRepository(partial(DatabaseConnection, db_path))
+        app_module.task_repo = CachedTaskRepository(repo) if cached else repo
+        print(f"\n{'with' if cached else 'without'} the read cache")
+        for url in ('/api/tasks?limit=1000', '/'):
+            etag = client.get(url).headers['ETag']
+            modes = (('plain', {}),
+                     ('gzip', {'Accept-Encoding': 'gzip'}),
+                     ('conditional 304', {'If-None-Match': etag}))
+            for label, headers in modes:
+                size, cpu = poll(client, url, args.polls, headers)
+                print(f"{url:>22} {label:>16}: {size:9.0f} bytes/poll "
+                      f"{cpu:7.2f} ms CPU/poll")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Requests/sec for the toggle and list endpoints with and without pooling.
+
+Usage: python benchmarks/bench_pool.py [--requests N] [--tasks N]
+"""
+import argparse
+import time
+from functools import partial
+
+from common import seed_tasks, temp_db_path
+
+import app as app_module
+from database import DatabaseConnection
+from models import SQLiteTaskRepository
+
+
+def run(client, requests, task_count):
+    """Alternate toggles and single-task reads; return requests/sec."""
+    started = time.perf_counter()
+    for i in range(requests):
+        task_id = i % task_count + 1
+        client.post(f'/task/toggle/{task_id}')
+        client.get(f'/task/edit/{task_id}')
+    return (requests * 2) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--tasks', type=int, default=100)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    seed_tasks(db_path, args.tasks)
+    client = app_module.app.test_client()
+
+    results = {}
+    for label, pooled in (('unpooled', False), ('pooled', True)):
+        app_module.task_repo = SQLiteTaskRepository(
+            partial(DatabaseConnection, db_path, pooled=pooled))
+        results[label] = run(client, args.requests, args.tasks)
+        print(f"{label:>9}: {results[label]:8.0f} requests/sec")
+
+    print(f"  speedup: {results['pooled'] / results['unpooled']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
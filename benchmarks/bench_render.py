@@ -0,0 +1,55 @@
+"""
+Rendering the task list page from the card fragment cache.
+
+Renders / with every seeded task on one page: once with an empty card
+cache (cold), then repeatedly with every card cached (warm).
+
+Usage: python benchmarks/bench_render.py [--tasks N] [--repeat N]
+"""
+import argparse
+import logging
+import statistics
+import time
+from functools import partial
+
+from common import seed_tasks, temp_db_path
+
+import app as app_module
+from database import DatabaseConnection
+from models import SQLiteTaskRepository
+
+
+def render(client):
+    """Return (milliseconds, task cards) for one render of the list page."""
+    started = time.perf_counter()
+    page = client.get('/').get_data(as_text=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    return elapsed, page.count('class="task-card')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    db_path = temp_db_path()
+    seed_tasks(db_path, args.tasks)
+    app_module.task_repo = SQLiteTaskRepository(
+        partial(DatabaseConnection, db_path))
+    app_module.PAGE_SIZE = args.tasks
+    app_module.card_cache.clear()
+    client = app_module.app.test_client()
+
+    cold, cards = render(client)
+    warm = [render(client)[0] for _ in range(args.repeat)]
+    print(f"{cards} task cards")
+    print(f"{'cold cache':>12}: {cold:8.1f} ms")
+    print(f"{'warm cache':>12}: {statistics.median(warm):8.1f} ms median "
+          f"({min(warm):.1f} ms best of {args.repeat})")
+    print(f"card cache: {app_module.card_cache_metrics()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Report computation over a large task table.
+
+Seeds tasks created over the past two years, two thirds of them completed
+some days after creation, then times loading the NumPy column snapshot
+(cold, after every write) and computing each report from the cached
+snapshot (warm, between writes). For comparison it also times the same
+completion report done the pre-NumPy way: every Task from get_all() in a
+Python loop.
+
+Usage: python benchmarks/bench_reports.py [--tasks N] [--repeat N]
+"""
+import argparse
+import logging
+import random
+import sqlite3
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from functools import partial
+
+from common import temp_db_path
+
+import analytics
+from database import DatabaseConnection
+from models import SQLiteTaskRepository
+
+
+def seed_dated_tasks(db_path, count, seed=11):
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+
+    def rows():
+        for i in range(count):
+            created = now - timedelta(days=rng.randint(0, 730),
+                                        seconds=rng.randint(0, 86399))
+            due = (created + timedelta(days=rng.randint(1, 45))
+                   if rng.random() < 0.8 else None)
+            completed = (created + timedelta(days=rng.expovariate(1 / 10))
+                         if rng.random() < 0.66 else None)
+            yield (f"Task {i}", rng.randint(1, 5),
+                   due.date().isoformat() if due else None,
+                   completed is not None,
+                   created.strftime('%Y-%m-%d %H:%M:%S'),
+                   completed.strftime('%Y-%m-%d %H:%M:%S') if completed else None)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany("""
+            INSERT INTO tasks (title, priority, due_date, completed,
+                               created_at, completed_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows())
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def timed(operation, repeat):
+    """Median milliseconds of ``repeat`` calls."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        operation()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def python_completion(repo):
+    """Task counts per priority without NumPy, for comparison."""
+    totals, completed = {}, {}
+    for task in repo.get_all():
+        totals[task.priority] = totals.get(task.priority, 0) + 1
+        if task.completed:
+            completed[task.priority] = completed.get(task.priority, 0) + 1
+    return totals, completed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    db_path = temp_db_path()
+    print(f"Seeding {args.tasks} tasks...")
+    seed_dated_tasks(db_path, args.tasks)
+    db = partial(DatabaseConnection, db_path)
+    engine = analytics.ReportEngine(db)
+    today = date.today()
+    start = today - timedelta(days=365)
+
+    def cold_load():
+        engine._snapshot = None
+        engine.snapshot()
+
+    cases = [
+        ('snapshot load (cold)', cold_load),
+        ('snapshot check (warm)', engine.snapshot),
+        ('burndown, 365 days',
+         lambda: analytics.burndown(engine.snapshot(), start, today)),
+        ('burndown, 52 weeks, priority 1',
+         lambda: analytics.burndown(engine.snapshot(), start, today, 'week', 1)),
+        ('completion by priority',
+         lambda: analytics.completion_by_priority(engine.snapshot())),
+        ('lateness', lambda: analytics.lateness(engine.snapshot())),
+    ]
+    print(f"{'case':34} {'median ms':>10}")
+    for name, operation in cases:
+        print(f"{name:34} {timed(operation, args.repeat):10.1f}")
+
+    repo = SQLiteTaskRepository(db)
+    print(f"{'counts via get_all() loop':34} "
+          f"{timed(lambda: python_completion(repo), 1):10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Full-text search latency on a large task table.
+
+Seeds tasks whose titles and descriptions are drawn from a vocabulary with
+a Zipf-like word frequency (a few words are very common, most are rare),
+then times SQLiteTaskRepository.search() for rare, common, prefix,
+multi-word and filtered queries. The target is under 10 ms per query at
+1M tasks. "partial word" is a fragment longer than the prefix index
+(3 characters) of a word found in most tasks, which search() expands
+into whole words through tasks_fts_terms.
+
+Usage: python benchmarks/bench_search.py [--tasks N] [--repeat N]
+"""
+import argparse
+import itertools
+import logging
+import random
+import sqlite3
+import statistics
+import time
+from functools import partial
+
+from common import temp_db_path
+
+from database import DatabaseConnection
+from models import SQLiteTaskRepository
+
+SYLLABLES = ['ka', 'lo', 'mi', 're', 'pa', 'ton', 'vi', 'sen', 'dor', 'ul',
+             'qua', 'ber', 'nix', 'fa', 'gle', 'mon', 'tri', 'zu', 'ho', 'cel']
+
+QUERIES = [
+    ('rare word', 'kalomi', None),
+    ('common word', 'report', None),
+    ('2-letter prefix', 're', None),
+    ('3-letter prefix', 'rep', None),
+    ('partial word', 'repor', None),
+    ('two words', 'report budget', None),
+    ('filtered', 'rep', {'completed': False, 'priority': 1}),
+]
+
+COMMON_WORDS = ['report', 'review', 'update', 'budget', 'meeting', 'client',
+                'deploy', 'invoice', 'design', 'email']
+
+
+def vocabulary(size, rng):
+    """Common English-looking words first, then generated rare ones."""
+    words = list(COMMON_WORDS)
+    while len(words) < size:
+        words.append(''.join(rng.choice(SYLLABLES)
+                             for _ in range(rng.randint(2, 4))))
+    return words
+
+
+def seed_text_tasks(db_path, count, seed=7):
+    rng = random.Random(seed)
+    words = vocabulary(50000, rng)
+    # Zipf-ish weights: word i is drawn with probability ~ 1 / (i + 1)
+    cum_weights = list(itertools.accumulate(1.0 / (i + 1)
+                                            for i in range(len(words))))
+
+    def draw(low, high):
+        return rng.choices(words, cum_weights=cum_weights,
+                           k=rng.randint(low, high))
+
+    def rows():
+        for _ in range(count):
+            title = ' '.join(draw(2, 5))
+            description = ' '.join(draw(5, 20))
+            yield (title.capitalize(), description, rng.randint(1, 5),
+                   None, rng.random() < 0.33)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany("""
+            INSERT INTO tasks (title, description, priority, due_date, completed)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows())
+        conn.execute("INSERT INTO tasks_fts(tasks_fts) VALUES ('optimize')")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    db_path = temp_db_path()
+    started = time.perf_counter()
+    seed_text_tasks(db_path, args.tasks)
+    print(f"seeded {args.tasks} tasks in {time.perf_counter() - started:.0f}s")
+
+    repo = SQLiteTaskRepository(partial(DatabaseConnection, db_path))
+    with DatabaseConnection(db_path) as conn:
+        def matches(query):
+            return conn.execute("SELECT COUNT(*) FROM tasks_fts WHERE tasks_fts "
+                                "MATCH ?", (f'"{query}"*',)).fetchone()[0]
+
+        print(f"{'query':>16} {'matches':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for label, query, filters in QUERIES:
+            repo.search(query, filters)  # warm the page cache
+            timings = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                repo.search(query, filters)
+                timings.append((time.perf_counter() - t0) * 1000)
+            timings.sort()
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            print(f"{label:>16} {matches(query.split()[0]):>9} "
+                  f"{statistics.median(timings):8.2f} {p99:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
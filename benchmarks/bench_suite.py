@@ -0,0 +1,402 @@
+"""
+Benchmark suite: every route and repository method on seeded datasets.
+
+For each dataset size a fresh worker process seeds tasks.db in a
+temporary directory with synthetic tasks (see common.synthetic_rows for
+the priority and due-date distributions), imports the app against it and
+runs each case repeatedly for a fixed time. HTTP cases go through the
+Flask test client and the full app stack, read cache included; repository
+cases call a bare SQLiteTaskRepository, so they measure the queries
+themselves. Cases that delete rows only delete rows the suite created.
+
+Each case reports iterations, throughput (operations/s) and p50/p95/p99
+latency; the peak RSS of the worker is recorded after every case and for
+the dataset as a whole. The results are printed (or written) as JSON.
+
+With --baseline the results are compared against a stored run: a case
+whose p50 or p95 latency, or a dataset whose peak RSS, grew by more than
+--threshold is reported as a regression and the exit status is 1. Store a
+baseline with --save-baseline on the machine that will run the
+comparisons; numbers from different machines are not comparable.
+
+Usage: python benchmarks/bench_suite.py [--sizes 1k,100k,1M] [--seconds S]
+       [--output results.json] [--baseline benchmarks/baseline.json]
+       [--save-baseline] [--threshold 0.25]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+from common import seed_tasks, temp_db_path
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'baseline.json')
+SIZE_SUFFIXES = {'k': 1_000, 'm': 1_000_000}
+# Cases stop after this many iterations even if time is left
+MAX_ITERATIONS = 10_000
+# Metrics compared against the baseline, all "lower is better"
+COMPARED_METRICS = ('p50_ms', 'p95_ms')
+
+
+def parse_size(text):
+    """'1k' -> 1000, '1M' -> 1000000, '2500' -> 2500."""
+    text = text.strip().lower()
+    if text[-1:] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def percentile(latencies, p):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def measure(operation, seconds, setup=None):
+    """
+    Call ``operation`` repeatedly for ``seconds``; latency summary.
+
+    Each call gets the result of ``setup()`` when given (run untimed), or
+    else the iteration number.
+    """
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while not latencies or (time.perf_counter() < deadline
+                            and len(latencies) < MAX_ITERATIONS):
+        argument = setup() if setup is not None else len(latencies)
+        t0 = time.perf_counter()
+        operation(argument)
+        latencies.append(time.perf_counter() - t0)
+    # Throughput over the timed calls only, without the setup
+    elapsed = sum(latencies)
+    latencies.sort()
+    return {
+        'iterations': len(latencies),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+class FreshIds:
+    """Tasks created for the delete cases to delete; used as a case setup."""
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.ids = []
+
+    def take(self, count):
+        from models import Task
+        if len(self.ids) < count:
+            created = self.repo.bulk_create(
+                [Task(title=f"Bench scratch {i}") for i in range(max(count, 500))])
+            self.ids.extend(task.id for task in created)
+        taken, self.ids = self.ids[:count], self.ids[count:]
+        return taken
+
+
+def http_cases(client, task_count, fresh, since):
+    """(name, operation, setup) for every route in app.py."""
+    rng = random.Random(1)
+
+    def task_id():
+        return rng.randint(1, task_count)
+
+    def send(method, path, **kwargs):
+        response = client.open(path, method=method, **kwargs)
+        for _ in response.response:  # Streams exports without keeping them
+            pass
+        response.close()
+        # Timing an error page would make a broken route look fast
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path}: {response.status}")
+
+    def request(method, path):
+        return lambda i: send(method, path() if callable(path) else path)
+
+    def form(i):
+        due = (date.today() + timedelta(days=rng.randint(-30, 60))).isoformat()
+        return {'title': f"Bench task {i}", 'description': 'Created by the suite',
+                'priority': str(rng.randint(1, 5)), 'due_date': due}
+
+    def create(i):
+        send('POST', '/task/create', data=form(i))
+
+    def edit(i):
+        send('POST', f'/task/edit/{task_id()}', data=form(i))
+
+    def delete(ids):
+        send('POST', f'/task/delete/{ids[0]}')
+
+    def bulk(i):
+        ids = [task_id() for _ in range(60)]
+        payload = {'update': [{'id': n, 'priority': rng.randint(1, 5)}
+                              for n in ids[:20]],
+                   'complete': ids[20:40], 'reopen': ids[40:]}
+        send('POST', '/api/tasks/bulk', json=payload)
+
+    claimed = []
+
+    def claim(i):
+        response = client.post('/api/tasks/claim', json={'worker': 'bench'})
+        if response.status_code >= 400:
+            raise RuntimeError(f"POST /api/tasks/claim: {response.status}")
+        claimed.extend(task['id'] for task in response.get_json()['tasks'])
+
+    def release_claimed():
+        # Keeps the queue from draining as the claim case runs
+        while claimed:
+            send('POST', f'/api/tasks/{claimed.pop()}/release')
+
+    def events(i):
+        # Subscribe, read the opening message and disconnect
+        response = client.get('/api/events', buffered=False)
+        next(iter(response.response))
+        response.close()
+
+    return [
+        ('GET /', request('GET', '/'), None),
+        ('GET /task/create', request('GET', '/task/create'), None),
+        ('POST /task/create', create, None),
+        ('GET /task/edit/<id>',
+         request('GET', lambda: f'/task/edit/{task_id()}'), None),
+        ('POST /task/edit/<id>', edit, None),
+        ('POST /task/toggle/<id>',
+         request('POST', lambda: f'/task/toggle/{task_id()}'), None),
+        ('POST /task/delete/<id>', delete, lambda: fresh.take(1)),
+        ('GET /api/tasks', request('GET', '/api/tasks?limit=50'), None),
+        ('GET /api/tasks filtered',
+         request('GET', '/api/tasks?limit=50&priority=2&completed=false'), None),
+        ('GET /api/tasks include_archived',
+         request('GET', '/api/tasks?limit=50&include_archived=true'), None),
+        ('GET /api/tasks/search',
+         request('GET', lambda: f'/api/tasks/search?q=task {rng.randint(1, 999)}'),
+         None),
+        ('GET /api/tasks/changes',
+         request('GET', f'/api/tasks/changes?since={since}'), None),
+        ('GET /api/tasks/next', request('GET', '/api/tasks/next?n=10'), None),
+        ('POST /api/tasks/claim', claim, release_claimed),
+        ('GET /api/stats', request('GET', '/api/stats'), None),
+        ('GET /api/reports/burndown',
+         request('GET', '/api/reports/burndown?bucket=week'), None),
+        ('GET /api/reports/completion',
+         request('GET', '/api/reports/completion'), None),
+        ('GET /api/reports/lateness',
+         request('GET', '/api/reports/lateness'), None),
+        ('POST /api/tasks/bulk', bulk, None),
+        ('GET /api/tasks/export', request('GET', '/api/tasks/export'), None),
+        ('GET /api/tasks/export ndjson',
+         request('GET', '/api/tasks/export?format=ndjson'), None),
+        ('GET /api/events', events, None),
+        ('GET /metrics', request('GET', '/metrics'), None),
+    ]
+
+
+def repository_cases(repo, task_count, fresh, since):
+    """(name, operation, setup) for every TaskRepository method."""
+    from models import Task
+
+    rng = random.Random(2)
+    filters = {'completed': False, 'priority': 2}
+    pages = {'cursor': None}
+
+    def task_id():
+        return rng.randint(1, task_count)
+
+    def next_page(i):
+        # Walks the whole listing, starting over at the end
+        _, pages['cursor'] = repo.list_page(pages['cursor'], 50)
+
+    def drain(i):
+        for _ in repo.iter_all():
+            pass
+
+    def ids(count):
+        return [task_id() for _ in range(count)]
+
+    return [
+        ('get_by_id', lambda i: repo.get_by_id(task_id()), None),
+        ('list_page', lambda i: repo.list_page(None, 50), None),
+        ('list_page filtered', lambda i: repo.list_page(None, 50, filters), None),
+        ('list_page include_archived',
+         lambda i: repo.list_page(None, 50, include_archived=True), None),
+        ('list_page walk', next_page, None),
+        ('count', lambda i: repo.count(), None),
+        ('count filtered', lambda i: repo.count(filters), None),
+        ('stats', lambda i: repo.stats(), None),
+        ('search', lambda i: repo.search(f"task {rng.randint(1, 999)}"), None),
+        ('version', lambda i: repo.version(), None),
+        ('changes', lambda i: repo.changes(since), None),
+        ('create', lambda i: repo.create(Task(title=f"Bench task {i}")), None),
+        ('update', lambda i: repo.update(task_id(), {'priority': rng.randint(1, 5)}),
+         None),
+        ('mark_completed',
+         lambda i: repo.mark_completed(task_id(), rng.random() < 0.5), None),
+        ('toggle_completed', lambda i: repo.toggle_completed(task_id()), None),
+        ('delete', lambda ids: repo.delete(ids[0]), lambda: fresh.take(1)),
+        ('bulk_create 100',
+         lambda i: repo.bulk_create([Task(title=f"Bench bulk {n}")
+                                     for n in range(100)]), None),
+        ('bulk_update 100',
+         lambda i: repo.bulk_update([(n, {'priority': rng.randint(1, 5)})
+                                     for n in ids(100)]), None),
+        ('bulk_mark_completed 100',
+         lambda i: repo.bulk_mark_completed(ids(100), rng.random() < 0.5), None),
+        ('bulk_delete 100', repo.bulk_delete, lambda: fresh.take(100)),
+        ('iter_all', drain, None),
+        # Last: it holds every task in memory at once, which sets the peak RSS
+        ('get_all', lambda i: repo.get_all(), None),
+    ]
+
+
+def run_cases(cases, seconds):
+    results = {}
+    for name, operation, setup in cases:
+        results[name] = measure(operation, seconds, setup)
+        print(f"  {name}: {results[name]['p50_ms']} ms p50", file=sys.stderr)
+    return results
+
+
+def worker(task_count, seconds):
+    """Benchmark one dataset in this process; return its results."""
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    db_path = temp_db_path('tasks.db')
+    started = time.perf_counter()
+    seed_tasks(db_path, task_count)
+    seed_seconds = time.perf_counter() - started
+    # The app opens tasks.db in the working directory
+    os.chdir(os.path.dirname(db_path))
+    import app as app_module
+    from database import get_db
+    from models import SQLiteTaskRepository
+
+    repo = SQLiteTaskRepository(get_db)
+    # Scratch tasks for the delete cases are created behind the app's read
+    # cache, which is fine: it has never seen their ids
+    fresh = FreshIds(repo)
+    client = app_module.app.test_client()
+    # Delta sync cases ask for the last hundred or so changes
+    since = max(0, repo.version()[0] - 100)
+    print(f"{task_count} tasks (seeded in {seed_seconds:.1f}s)", file=sys.stderr)
+    http = run_cases(http_cases(client, task_count, fresh, since), seconds)
+    repository = run_cases(repository_cases(repo, task_count, fresh, since),
+                           seconds)
+    return {
+        'tasks': task_count,
+        'seed_seconds': round(seed_seconds, 2),
+        'peak_rss_mb': peak_rss_mb(),
+        'http': http,
+        'repository': repository,
+    }
+
+
+def run_suite(sizes, seconds):
+    """Run a worker process per dataset size and collect their results."""
+    datasets = {}
+    for size in sizes:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', str(size),
+             '--seconds', str(seconds)],
+            check=True, stdout=subprocess.PIPE, text=True).stdout
+        datasets[str(size)] = json.loads(output)
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'seconds_per_case': seconds,
+        'datasets': datasets,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Regressions of ``results`` against ``baseline`` as readable lines."""
+    regressions = []
+
+    def check(label, current, previous):
+        if previous and current > previous * (1 + threshold):
+            regressions.append(f"{label}: {previous} -> {current} "
+                               f"(+{(current / previous - 1) * 100:.0f}%)")
+
+    for size, dataset in results['datasets'].items():
+        old = baseline.get('datasets', {}).get(size)
+        if old is None:
+            continue
+        check(f"{size} tasks peak_rss_mb", dataset['peak_rss_mb'],
+              old['peak_rss_mb'])
+        for group in ('http', 'repository'):
+            for name, case in dataset[group].items():
+                old_case = old.get(group, {}).get(name)
+                if old_case is None:
+                    continue
+                for metric in COMPARED_METRICS:
+                    check(f"{size} tasks {group} {name} {metric}",
+                          case[metric], old_case[metric])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1k,100k,1M')
+    parser.add_argument('--seconds', type=float, default=1.0,
+                        help='time spent on each case')
+    parser.add_argument('--output', help='write the JSON results here')
+    parser.add_argument('--baseline', help='compare against this results file')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help=f'store the results as the baseline '
+                             f'(--baseline, default {DEFAULT_BASELINE})')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed relative slowdown before a case '
+                             'counts as a regression')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        json.dump(worker(args.worker, args.seconds), sys.stdout)
+        return 0
+
+    results = run_suite([parse_size(s) for s in args.sizes.split(',')],
+                        args.seconds)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    baseline_path = args.baseline or DEFAULT_BASELINE
+    if args.save_baseline:
+        with open(baseline_path, 'w') as f:
+            f.write(text + '\n')
+        print(f"saved baseline to {baseline_path}", file=sys.stderr)
+        return 0
+    if args.baseline:
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        print(f"{len(regressions)} regressions beyond "
+              f"{args.threshold * 100:.0f}%", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Sustained single-task write throughput with and without write-behind.
+
+N writer threads issue create/update/mark_completed calls back to back for
+a fixed time, first straight against SQLiteTaskRepository (one commit per
+write) and then through WriteBehindRepository (one commit per batch).
+Runs under the default profile (WAL, synchronous=NORMAL) and with
+synchronous=FULL, where every commit is an fsync and group commit matters
+most. Reports writes/sec, per-write p50/p99 latency and the average batch.
+
+Usage: python benchmarks/bench_write_behind.py [--writers 1,8,32]
+       [--seconds S] [--max-batch N] [--max-latency SECONDS]
+"""
+import argparse
+import logging
+import random
+import threading
+import time
+from functools import partial
+
+from common import seed_tasks, temp_db_path
+
+from database import DEFAULT_PROFILE, DatabaseConnection, StorageProfile
+from models import SQLiteTaskRepository, Task
+from write_behind import (DEFAULT_MAX_BATCH, DEFAULT_MAX_LATENCY,
+                          WriteBehindRepository)
+
+TASK_COUNT = 10000
+
+PROFILES = {
+    'synchronous=NORMAL': DEFAULT_PROFILE,
+    'synchronous=FULL': StorageProfile(synchronous="FULL"),
+}
+
+
+def run(repo, writers, seconds):
+    """Drive ``repo`` with ``writers`` threads; return (count, latencies)."""
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def writer(seed):
+        rng = random.Random(seed)
+        own = []
+        while time.monotonic() < deadline:
+            task_id = rng.randint(1, TASK_COUNT)
+            choice = rng.random()
+            started = time.perf_counter()
+            if choice < 0.4:
+                repo.create(Task(title=f"bench {seed}"))
+            elif choice < 0.7:
+                repo.update(task_id, {'priority': rng.randint(1, 5)})
+            else:
+                repo.mark_completed(task_id, rng.random() < 0.5)
+            own.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=writer, args=(i,))
+               for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return len(latencies), latencies
+
+
+def percentile(latencies, p):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--writers', default='1,8,32')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument('--max-latency', type=float,
+                        default=DEFAULT_MAX_LATENCY)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    writer_counts = [int(n) for n in args.writers.split(',')]
+
+    for profile_name, profile in PROFILES.items():
+        print(f"\n{profile_name}")
+        print(f"{'writers':>8} {'mode':>13} {'writes/s':>9} "
+              f"{'p50 ms':>8} {'p99 ms':>8} {'batch':>6}")
+        for writers in writer_counts:
+            for mode in ('per-write', 'write-behind'):
+                db_path = temp_db_path()
+                seed_tasks(db_path, TASK_COUNT)
+                repo = SQLiteTaskRepository(partial(
+                    DatabaseConnection, db_path, profile=profile,
+                    pool_size=writers + 1))
+                if mode == 'write-behind':
+                    repo = WriteBehindRepository(repo, args.max_batch,
+                                                 args.max_latency)
+                count, latencies = run(repo, writers, args.seconds)
+                batch = '-'
+                if mode == 'write-behind':
+                    repo.close()
+                    metrics = repo.metrics()
+                    batch = f"{metrics['writes'] / max(1, metrics['batches']):.1f}"
+                print(f"{writers:>8} {mode:>13} {count / args.seconds:9.0f} "
+                      f"{percentile(latencies, 0.50):8.2f} "
+                      f"{percentile(latencies, 0.99):8.2f} {batch:>6}")
+
+
+if __name__ == '__main__':
+    main()
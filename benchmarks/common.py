@@ -0,0 +1,57 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Run the scripts from the project root, e.g. ``python benchmarks/bench_pool.py``.
+"""
+import os
+import random
+import sys
+import tempfile
+from datetime import date, timedelta
+
+# Make the project modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import init_database  # noqa: E402
+
+
+def temp_db_path(name="bench.db"):
+    """Return a path to a fresh database file in a temporary directory."""
+    directory = tempfile.mkdtemp(prefix="task-bench-")
+    path = os.path.join(directory, name)
+    init_database(path)
+    return path
+
+
+def synthetic_rows(count, seed=42):
+    """
+    Yield (title, description, priority, due_date, completed) tuples.
+
+    Priorities lean towards the middle of the range, roughly a fifth of the
+    tasks have no due date and about a third are completed.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    for i in range(count):
+        priority = min(5, max(1, int(rng.gauss(3, 1.1) + 0.5)))
+        if rng.random() < 0.2:
+            due_date = None
+        else:
+            due_date = (today + timedelta(days=rng.randint(-60, 120))).isoformat()
+        yield (f"Task {i}", f"Synthetic task number {i}", priority,
+               due_date, rng.random() < 0.33)
+
+
+def seed_tasks(db_path, count, seed=42):
+    """Insert ``count`` synthetic tasks into ``db_path`` in one transaction."""
+    import sqlite3
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany("""
+            INSERT INTO tasks (title, description, priority, due_date, completed)
+            VALUES (?, ?, ?, ?, ?)
+        """, synthetic_rows(count, seed))
+        conn.commit()
+    finally:
+        conn.close()
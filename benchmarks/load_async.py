@@ -0,0 +1,147 @@
+"""
+HTTP load test: threaded WSGI server vs the ASGI application.
+
+Starts each server in a subprocess against a seeded temporary database,
+then drives it with N concurrent keep-alive clients (asyncio, one socket
+per client) and reports throughput and p50/p99 latency per client count.
+The ASGI run needs uvicorn (``pip install uvicorn asgiref``) and is skipped
+without it.
+
+Usage: python benchmarks/load_async.py [--clients 1,64,512] [--seconds S]
+       [--tasks N] [--path /api/tasks?limit=50]
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from common import seed_tasks, temp_db_path
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    'wsgi (werkzeug, threaded)': [
+        sys.executable, '-c',
+        "import sys, logging; logging.disable(logging.INFO);"
+        "from werkzeug.serving import run_simple; import app;"
+        "run_simple('127.0.0.1', int(sys.argv[1]), app.app, threaded=True)"],
+    'asgi (uvicorn)': [
+        sys.executable, '-m', 'uvicorn', 'asgi:application',
+        '--host', '127.0.0.1', '--log-level', 'warning', '--port'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(command, port, db_dir):
+    """Run a server with the benchmark database as its tasks.db."""
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT)
+    process = subprocess.Popen(command + [str(port)], cwd=db_dir, env=env,
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+async def client(port, path, deadline, latencies, errors):
+    """One keep-alive connection issuing GETs back to back."""
+    request = (f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+               f"Accept-Encoding: gzip\r\n\r\n").encode()
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            started = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b'\r\n\r\n')
+            length, close = 0, False
+            for line in head.split(b'\r\n')[1:]:
+                name, _, value = line.partition(b':')
+                if name.lower() == b'content-length':
+                    length = int(value)
+                elif name.lower() == b'connection' and b'close' in value.lower():
+                    close = True
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            if close:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            errors[0] += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, path, clients, seconds):
+    latencies, errors = [], [0]
+    deadline = time.monotonic() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(*(client(port, path, deadline, latencies, errors)
+                           for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def percentile(p):
+        if not latencies:
+            return float('nan')
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {'requests': len(latencies), 'rps': len(latencies) / elapsed,
+            'p50_ms': percentile(0.50), 'p99_ms': percentile(0.99),
+            'errors': errors[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', default='1,64,512')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--path', default='/api/tasks?limit=50')
+    args = parser.parse_args()
+    client_counts = [int(n) for n in args.clients.split(',')]
+
+    db_path = temp_db_path('tasks.db')
+    seed_tasks(db_path, args.tasks)
+
+    print(f"{args.tasks} tasks, GET {args.path}, {args.seconds:.0f}s per run")
+    for name, command in SERVERS.items():
+        if 'uvicorn' in command and importlib.util.find_spec('uvicorn') is None:
+            print(f"\n{name}: skipped, uvicorn is not installed")
+            continue
+        port = free_port()
+        process = start_server(command, port, os.path.dirname(db_path))
+        try:
+            print(f"\n{name}")
+            for clients in client_counts:
+                result = asyncio.run(load(port, args.path, clients, args.seconds))
+                print(f"{clients:>5} clients: {result['rps']:8.0f} req/s  "
+                      f"p50 {result['p50_ms']:7.2f} ms  "
+                      f"p99 {result['p99_ms']:8.2f} ms  "
+                      f"errors {result['errors']}")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Multi-threaded read/write stress test for the task repository.
+
+Runs writer threads (create, update, toggle, delete) alongside reader
+threads (get_all, get_by_id) against one database file and reports
+throughput and the number of "database is locked" failures, once with
+stock SQLite settings and once with the default storage profile.
+
+Usage: python benchmarks/stress_concurrency.py [--writers N] [--readers N]
+       [--seconds S]
+"""
+import argparse
+import logging
+import random
+import sqlite3
+import threading
+import time
+from functools import partial
+
+from common import seed_tasks, temp_db_path
+
+from database import DEFAULT_PROFILE, DatabaseConnection, StorageProfile
+from models import SQLiteTaskRepository, Task
+
+
+def stress(repo, writers, readers, seconds, task_count):
+    """Run the workload and return a dict of counters."""
+    stats = {'reads': 0, 'writes': 0, 'lock_errors': 0, 'other_errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def record(key):
+        with lock:
+            stats[key] += 1
+
+    def guarded(operation, key):
+        try:
+            operation()
+            record(key)
+        except sqlite3.OperationalError as e:
+            record('lock_errors' if 'locked' in str(e) else 'other_errors')
+        except Exception:
+            record('other_errors')
+
+    def writer(seed):
+        rng = random.Random(seed)
+        while time.monotonic() < deadline:
+            task_id = rng.randint(1, task_count)
+            choice = rng.random()
+            if choice < 0.4:
+                op = partial(repo.create, Task(title=f"stress {seed}"))
+            elif choice < 0.7:
+                op = partial(repo.update, task_id,
+                             {'priority': rng.randint(1, 5)})
+            elif choice < 0.95:
+                op = partial(repo.mark_completed, task_id, rng.random() < 0.5)
+            else:
+                op = partial(repo.delete, task_id)
+            guarded(op, 'writes')
+
+    def reader(seed):
+        rng = random.Random(seed)
+        while time.monotonic() < deadline:
+            if rng.random() < 0.01:
+                guarded(repo.get_all, 'reads')
+            else:
+                guarded(partial(repo.get_by_id, rng.randint(1, task_count)),
+                        'reads')
+
+    threads = ([threading.Thread(target=writer, args=(i,))
+                for i in range(writers)] +
+               [threading.Thread(target=reader, args=(1000 + i,))
+                for i in range(readers)])
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats['reads_per_sec'] = stats['reads'] / seconds
+    stats['writes_per_sec'] = stats['writes'] / seconds
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--tasks', type=int, default=1000)
+    args = parser.parse_args()
+    # Failed writes are counted below; keep the per-error log lines quiet
+    logging.disable(logging.CRITICAL)
+
+    profiles = (('sqlite defaults', StorageProfile.sqlite_defaults(), 0),
+                ('tuned profile', DEFAULT_PROFILE, 5))
+    for label, profile, retries in profiles:
+        db_path = temp_db_path()
+        seed_tasks(db_path, args.tasks)
+        repo = SQLiteTaskRepository(
+            partial(DatabaseConnection, db_path, profile=profile,
+                    pool_size=args.writers + args.readers),
+            write_retries=retries)
+        stats = stress(repo, args.writers, args.readers, args.seconds,
+                       args.tasks)
+        print(f"{label:>16}: {stats['reads_per_sec']:8.0f} reads/sec "
+              f"{stats['writes_per_sec']:7.0f} writes/sec "
+              f"{stats['lock_errors']:5d} lock errors "
+              f"{stats['other_errors']:5d} other errors")
+
+
+if __name__ == '__main__':
+    main()
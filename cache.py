@@ -0,0 +1,255 @@
+"""
+Read-through caching for task repositories.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from models import Task, TaskRepository
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Size-bounded LRU cache whose entries also expire after ``ttl`` seconds.
+
+    Not thread-safe on its own; CachedTaskRepository guards it with a lock.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=_MISSING):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def metrics(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'size': len(self._entries),
+        }
+
+
+class CachedTaskRepository(TaskRepository):
+    """
+    TaskRepository decorator that caches reads from another repository.
+
+    Single tasks are cached by id in an LRU with a TTL. List, count and
+    stats results are cached under a generation counter that every write
+    bumps, so a write makes all of them unreachable at once while only the
+    task ids it touched are evicted from the by-id cache. Writes evict even
+    when they return the stored row: two writers to one task can finish in
+    the opposite order to their commits, and caching the returned rows
+    could leave the older one cached.
+
+    Cached Task objects are shared between callers and must be treated as
+    read-only.
+    """
+
+    def __init__(self, repo: TaskRepository, maxsize: int = 1024,
+                 ttl: float = 30.0, clock=time.monotonic):
+        self.repo = repo
+        self.by_id = LRUCache(maxsize, ttl, clock)
+        self.results = LRUCache(maxsize, ttl, clock)
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self, task_ids=None):
+        """
+        Drop cached results after a write.
+
+        Evicts the given task ids (all cached tasks when None) and bumps the
+        generation so cached lists, counts and stats are no longer used.
+        """
+        with self._lock:
+            self.generation += 1
+            if task_ids is None:
+                self.by_id.clear()
+            else:
+                for task_id in task_ids:
+                    self.by_id.discard(task_id)
+
+    def metrics(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss/eviction counters for both caches."""
+        with self._lock:
+            return {'by_id': self.by_id.metrics(),
+                    'results': self.results.metrics(),
+                    'generation': self.generation}
+
+    def _cached_result(self, key, load):
+        with self._lock:
+            generation = self.generation
+            value = self.results.get((generation,) + key)
+        if value is not _MISSING:
+            return value
+        value = load()
+        with self._lock:
+            # A write that raced with the load bumps the generation; storing
+            # the result under the old one keeps it from being served.
+            self.results.put((generation,) + key, value)
+        return value
+
+    def _store(self, task_id: int, task: Optional[Task], generation: int):
+        with self._lock:
+            if self.generation == generation:
+                self.by_id.put(task_id, task)
+
+    # Reads
+
+    def get_all(self) -> List[Task]:
+        return self._cached_result(('get_all',), self.repo.get_all)
+
+    def iter_all(self, batch_size: int = 500) -> Iterator[List[Task]]:
+        # Streaming exports read straight through; caching them would hold
+        # the whole table in memory.
+        return self.repo.iter_all(batch_size)
+
+    def list_page(self, cursor: Optional[str] = None, limit: int = 50,
+                  filters: Optional[Dict[str, Any]] = None,
+                  include_archived: bool = False
+                  ) -> Tuple[List[Task], Optional[str]]:
+        key = ('list_page', cursor, limit,
+               tuple(sorted((filters or {}).items())), include_archived)
+        return self._cached_result(
+            key, lambda: self.repo.list_page(cursor, limit, filters,
+                                             include_archived))
+
+    def count(self, filters: Optional[Dict[str, Any]] = None,
+              include_archived: bool = False) -> int:
+        key = ('count', tuple(sorted((filters or {}).items())), include_archived)
+        return self._cached_result(
+            key, lambda: self.repo.count(filters, include_archived))
+
+    def stats(self, today: Optional[date] = None) -> Dict[str, Any]:
+        today = today or date.today()
+        return self._cached_result(('stats', today),
+                                   lambda: self.repo.stats(today))
+
+    def search(self, query: str, filters: Optional[Dict[str, Any]] = None,
+               limit: int = 20) -> List[Task]:
+        key = ('search', query, limit, tuple(sorted((filters or {}).items())))
+        return self._cached_result(
+            key, lambda: self.repo.search(query, filters, limit))
+
+    def version(self) -> Tuple[int, str]:
+        # Never cached: callers use it to detect changes made elsewhere
+        return self.repo.version()
+
+    def changes(self, since: int, limit: int = 500) -> Dict[str, Any]:
+        # Not cached either: a sync client asking for changes after a
+        # version has to see writes made by any process.
+        return self.repo.changes(since, limit)
+
+    def get_by_id(self, task_id: int) -> Optional[Task]:
+        with self._lock:
+            generation = self.generation
+            task = self.by_id.get(task_id)
+        if task is _MISSING:
+            task = self.repo.get_by_id(task_id)
+            self._store(task_id, task, generation)
+        return task
+
+    # Writes
+
+    def create(self, task: Task) -> Task:
+        created = None
+        try:
+            created = self.repo.create(task)
+            return created
+        finally:
+            # Evict rather than cache: a cached "not found" for this id must
+            # go, and the returned object carries client-side timestamps. A
+            # create that raised has no id to evict (it may still have
+            # committed, e.g. if reading the row back failed), so only the
+            # cached lists are dropped.
+            self.invalidate([created.id] if created else [])
+
+    def update(self, task_id: int, task_data: Dict[str, Any]) -> Optional[Task]:
+        try:
+            return self.repo.update(task_id, task_data)
+        finally:
+            self.invalidate([task_id])
+
+    def delete(self, task_id: int) -> bool:
+        try:
+            return self.repo.delete(task_id)
+        finally:
+            self.invalidate([task_id])
+
+    def mark_completed(self, task_id: int, completed: bool) -> Optional[Task]:
+        try:
+            return self.repo.mark_completed(task_id, completed)
+        finally:
+            self.invalidate([task_id])
+
+    def toggle_completed(self, task_id: int) -> Optional[Task]:
+        try:
+            return self.repo.toggle_completed(task_id)
+        finally:
+            self.invalidate([task_id])
+
+    def bulk_create(self, tasks: List[Task]) -> List[Task]:
+        created = []
+        try:
+            created = self.repo.bulk_create(tasks)
+            return created
+        finally:
+            # As in create(), a failed call leaves no ids to evict
+            self.invalidate([task.id for task in created])
+
+    def bulk_update(self, updates: List[Tuple[int, Dict[str, Any]]]) -> List[bool]:
+        try:
+            return self.repo.bulk_update(updates)
+        finally:
+            self.invalidate([task_id for task_id, _ in updates])
+
+    def bulk_delete(self, task_ids: List[int]) -> List[bool]:
+        try:
+            return self.repo.bulk_delete(task_ids)
+        finally:
+            self.invalidate(task_ids)
+
+    def bulk_mark_completed(self, task_ids: List[int], completed: bool) -> List[bool]:
+        try:
+            return self.repo.bulk_mark_completed(task_ids, completed)
+        finally:
+            self.invalidate(task_ids)
@@ -0,0 +1,82 @@
+"""
+Cache coherence between processes that share one tasks.db.
+"""
+import logging
+import threading
+from typing import Callable, Dict, List
+
+from models import SQLiteTaskRepository, SyncExpiredError
+
+logger = logging.getLogger(__name__)
+
+# Beyond this many changed tasks, listeners drop everything instead
+DEFAULT_MAX_CHANGES = 1000
+
+
+class ChangeFollower:
+    """
+    Tells a process's caches about writes made by other processes.
+
+    Each worker process keeps its own read cache and in-memory views,
+    which only see writes made through that process. check() is meant to
+    run at the start of every request: it reads the trigger-maintained
+    table version (one single-row query) and, when the version moved,
+    passes the ids changed or deleted since to ``on_change``. When more
+    than ``max_changes`` tasks changed, or the tombstones needed were
+    pruned, ``on_reset`` is called instead to drop everything.
+
+    The version row rather than PRAGMA data_version, because data_version
+    is per connection (each pooled connection would need its own baseline)
+    and the version doubles as the position in the change feed. Writes
+    made by this process come back through the feed too, so listeners have
+    to be idempotent; re-invalidating a task this process just wrote is
+    cheap.
+    """
+
+    def __init__(self, store: SQLiteTaskRepository,
+                 on_change: Callable[[List[int]], None],
+                 on_reset: Callable[[], None],
+                 max_changes: int = DEFAULT_MAX_CHANGES):
+        self.store = store
+        self.on_change = on_change
+        self.on_reset = on_reset
+        self.max_changes = max_changes
+        self.version = store.version()[0]
+        self.checks = 0
+        self.syncs = 0
+        self.resets = 0
+        self._lock = threading.Lock()
+
+    def check(self) -> bool:
+        """Catch up with the change feed; False if nothing changed."""
+        with self._lock:
+            self.checks += 1
+            version = self.version
+        if self.store.version()[0] == version:
+            return False
+        # One thread catches up; the others wait for it, so no request
+        # goes on to read a cache that is known to be stale
+        with self._lock:
+            since = self.version
+            try:
+                version, task_ids = self.store.changed_ids(since,
+                                                           self.max_changes)
+            except SyncExpiredError:
+                version, task_ids = self.store.version()[0], None
+            if version == since:
+                return False
+            if task_ids is None:
+                logger.info(f"Resetting caches after changes since "
+                            f"version {since}")
+                self.on_reset()
+                self.resets += 1
+            else:
+                self.on_change(task_ids)
+                self.syncs += 1
+            self.version = version
+            return True
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return {'version': self.version, 'checks': self.checks,
+                    'syncs': self.syncs, 'resets': self.resets}
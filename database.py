@@ -1,7 +1,11 @@
 """
 Database connection and initialization module.
 """
+import atexit
+import collections
 import sqlite3
+import threading
+import time
 from datetime import datetime
 import logging
 
@@ -9,27 +13,566 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DEFAULT_DB_PATH = "tasks.db"
+DEFAULT_POOL_SIZE = 5
+DEFAULT_POOL_TIMEOUT = 10.0
+HEALTH_CHECK_INTERVAL = 30.0
+
+
+class StorageProfile:
+    """
+    Per-connection SQLite tuning applied every time a connection is opened.
+
+    The defaults favour concurrent access: WAL journaling lets readers keep
+    going while a write commits, ``synchronous=NORMAL`` is durable in WAL
+    mode except for power loss, and ``busy_timeout`` makes a writer wait
+    for the lock instead of failing straight away.
+    """
+
+    def __init__(self, journal_mode="WAL", synchronous="NORMAL",
+                 cache_size=-16000, mmap_size=128 * 1024 * 1024,
+                 busy_timeout=5000, temp_store="MEMORY"):
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = cache_size  # Negative values are KiB
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout  # Milliseconds
+        self.temp_store = temp_store
+
+    def pragmas(self) -> list:
+        """PRAGMA statements in the order they are applied."""
+        return [
+            f"PRAGMA busy_timeout = {int(self.busy_timeout)}",
+            f"PRAGMA journal_mode = {self.journal_mode}",
+            f"PRAGMA synchronous = {self.synchronous}",
+            f"PRAGMA cache_size = {int(self.cache_size)}",
+            f"PRAGMA mmap_size = {int(self.mmap_size)}",
+            f"PRAGMA temp_store = {self.temp_store}",
+        ]
+
+    def apply(self, conn):
+        """Apply the profile to an open connection."""
+        for pragma in self.pragmas():
+            conn.execute(pragma)
+
+    @classmethod
+    def sqlite_defaults(cls):
+        """Stock SQLite behaviour: rollback journal and synchronous=FULL."""
+        return cls(journal_mode="DELETE", synchronous="FULL",
+                   cache_size=-2000, mmap_size=0, busy_timeout=0,
+                   temp_store="DEFAULT")
+
+
+DEFAULT_PROFILE = StorageProfile()
+
+
+def connect(db_path=DEFAULT_DB_PATH, profile=None, check_same_thread=True):
+    """Open a connection with the storage profile applied."""
+    conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
+    conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+    (profile or DEFAULT_PROFILE).apply(conn)
+    return conn
+
+
+class PoolExhaustedError(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes free within the timeout."""
+
+
+class _Waiter:
+    """A thread queued for a connection; releases hand over in FIFO order."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.item = None
+
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections.
+
+    Connections are handed out one per thread: nested ``with`` blocks on the
+    same thread share the connection that the outermost block checked out,
+    so a repository method that calls another repository method does not
+    need a second connection. When the pool is exhausted, released
+    connections go straight to the longest-waiting thread so a busy thread
+    cannot starve the others by checking its connection back out.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, size=DEFAULT_POOL_SIZE,
+                 timeout=DEFAULT_POOL_TIMEOUT,
+                 health_check_interval=HEALTH_CHECK_INTERVAL, profile=None):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.profile = profile
+        self._idle = []  # (connection, released_at), most recent last
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._opened = 0
+        self._closed = False
+
+    def _connect(self):
+        """Open a new connection configured like the unpooled ones."""
+        return connect(self.db_path, self.profile, check_same_thread=False)
+
+    def _is_healthy(self, conn):
+        """Cheap liveness probe for a connection that sat idle."""
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._opened -= 1
+
+    def _wait(self, waiter):
+        """Block until a connection is handed to ``waiter``."""
+        if not waiter.event.wait(self.timeout):
+            with self._lock:
+                if waiter.item is None:
+                    self._waiters.remove(waiter)
+                    raise PoolExhaustedError(
+                        f"No database connection available after "
+                        f"{self.timeout}s (pool size {self.size})")
+        return waiter.item
+
+    def _checkout(self):
+        """Take an idle connection, open a new one, or wait for a release."""
+        while True:
+            item = waiter = None
+            with self._lock:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Connection pool is closed")
+                if self._idle and not self._waiters:
+                    item = self._idle.pop()
+                elif self._opened < self.size:
+                    self._opened += 1
+                else:
+                    waiter = _Waiter()
+                    self._waiters.append(waiter)
+
+            if waiter is not None:
+                item = self._wait(waiter)
+            if item is None:
+                try:
+                    return self._connect()
+                except sqlite3.Error:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+
+            conn, released_at = item
+            idle_for = time.monotonic() - released_at
+            if idle_for < self.health_check_interval or self._is_healthy(conn):
+                return conn
+            logger.warning("Discarding unhealthy pooled connection")
+            self._discard(conn)
+
+    def _checkin(self, conn):
+        """Return a connection to the pool, rolling back stray transactions."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        item = (conn, time.monotonic())
+        with self._lock:
+            if not self._closed:
+                if self._waiters:
+                    waiter = self._waiters.popleft()
+                    waiter.item = item
+                    waiter.event.set()
+                else:
+                    self._idle.append(item)
+                return
+        self._discard(conn)
+
+    def acquire(self):
+        """Check out the calling thread's connection."""
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            holder = self._local.holder = [self._checkout(), 0]
+        holder[1] += 1
+        return holder[0]
+
+    def release(self):
+        """Release one level of the calling thread's checkout."""
+        holder = self._local.holder
+        holder[1] -= 1
+        if holder[1] == 0:
+            self._local.holder = None
+            self._checkin(holder[0])
+
+    def close(self):
+        """Close every idle connection and refuse further checkouts."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    @property
+    def opened(self):
+        """Number of connections currently open (idle or in use)."""
+        return self._opened
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path=DEFAULT_DB_PATH, size=None, profile=None):
+    """Return the shared pool for ``db_path``, creating it on first use."""
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(db_path, size or DEFAULT_POOL_SIZE,
+                                  profile=profile)
+            _pools[db_path] = pool
+        return pool
+
+
+def close_pools():
+    """Close all shared pools. Registered to run at interpreter exit."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+atexit.register(close_pools)
+
 
 class DatabaseConnection:
     """Manages database connections with context manager support."""
 
-    def __init__(self, db_path="tasks.db"):
+    def __init__(self, db_path=DEFAULT_DB_PATH, pooled=True, profile=None,
+                 pool_size=None):
         self.db_path = db_path
+        self.pooled = pooled
+        self.profile = profile
+        self.pool_size = pool_size
 
     def __enter__(self):
         """Open database connection."""
-        self.conn = sqlite3.connect(self.db_path)
-        self.conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+        if self.pooled:
+            self.pool = get_pool(self.db_path, self.pool_size, self.profile)
+            self.conn = self.pool.acquire()
+            return self.conn
+        self.conn = connect(self.db_path, self.profile)
         return self.conn
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Close database connection."""
         if exc_type:
             logger.error(f"Database error: {exc_val}")
-        self.conn.close()
+        if self.pooled:
+            self.pool.release()
+        else:
+            self.conn.close()
+
+
+# Schema changes applied on top of the base schema, in order. The database
+# records how many have run in PRAGMA user_version, so each runs once.
+MIGRATIONS = [
+    # 1: composite index matching the listing order, so task lists are read
+    # in index order with no sort step. It also covers lookups on
+    # completed alone, which makes idx_tasks_completed redundant.
+    """
+    CREATE INDEX IF NOT EXISTS idx_tasks_listing
+        ON tasks(completed, priority, IFNULL(due_date, ''));
+    DROP INDEX IF EXISTS idx_tasks_completed;
+    """,
+    # 2: table-level change version, bumped by triggers on every row
+    # change so readers can tell cheaply whether anything changed
+    """
+    CREATE TABLE IF NOT EXISTS task_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL,
+        modified_at TIMESTAMP NOT NULL
+    );
+    INSERT OR IGNORE INTO task_version (id, version, modified_at)
+        VALUES (1, 0, CURRENT_TIMESTAMP);
+
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_version_insert
+    AFTER INSERT ON tasks
+    BEGIN
+        UPDATE task_version
+        SET version = version + 1, modified_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_version_update
+    AFTER UPDATE ON tasks
+    BEGIN
+        UPDATE task_version
+        SET version = version + 1, modified_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_version_delete
+    AFTER DELETE ON tasks
+    BEGIN
+        UPDATE task_version
+        SET version = version + 1, modified_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+    END;
+    """,
+    # 3: change tracking for delta sync. Every row records the table
+    # version of its last change in change_seq, and deletes leave a
+    # tombstone, so "what changed since version N" is an index range scan.
+    """
+    ALTER TABLE tasks ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE task_version ADD COLUMN pruned_seq INTEGER NOT NULL DEFAULT 0;
+
+    CREATE TABLE IF NOT EXISTS task_tombstones (
+        id INTEGER PRIMARY KEY,
+        change_seq INTEGER NOT NULL,
+        deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_task_tombstones_change_seq
+        ON task_tombstones(change_seq);
+
+    DROP TRIGGER IF EXISTS trg_tasks_version_insert;
+    DROP TRIGGER IF EXISTS trg_tasks_version_update;
+    DROP TRIGGER IF EXISTS trg_tasks_version_delete;
+
+    -- Give existing rows distinct sequence numbers above the current version
+    UPDATE tasks SET change_seq = (SELECT version FROM task_version) + id;
+    UPDATE task_version
+    SET version = version + (SELECT IFNULL(MAX(id), 0) FROM tasks)
+    WHERE id = 1;
+
+    CREATE INDEX IF NOT EXISTS idx_tasks_change_seq ON tasks(change_seq);
+
+    CREATE TRIGGER trg_tasks_version_insert
+    AFTER INSERT ON tasks
+    BEGIN
+        UPDATE task_version
+        SET version = version + 1, modified_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+        UPDATE tasks SET change_seq = (SELECT version FROM task_version)
+        WHERE id = NEW.id;
+    END;
+
+    -- change_seq is left out of the column list so the trigger's own
+    -- stamping update does not count as a change
+    CREATE TRIGGER trg_tasks_version_update
+    AFTER UPDATE OF title, description, priority, due_date, completed,
+                    created_at, updated_at ON tasks
+    BEGIN
+        UPDATE task_version
+        SET version = version + 1, modified_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+        UPDATE tasks SET change_seq = (SELECT version FROM task_version)
+        WHERE id = NEW.id;
+    END;
+
+    CREATE TRIGGER trg_tasks_version_delete
+    AFTER DELETE ON tasks
+    BEGIN
+        UPDATE task_version
+        SET version = version + 1, modified_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+        INSERT OR REPLACE INTO task_tombstones (id, change_seq)
+        VALUES (OLD.id, (SELECT version FROM task_version));
+    END;
+    """,
+    # 4: full-text index over titles and descriptions. The FTS5 table keeps
+    # no copy of the text (content='tasks'); triggers feed it the old and
+    # new values, and prefix='2 3' indexes short prefixes for
+    # search-as-you-type. Ranking is BM25 with titles weighted up.
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        title, description,
+        content='tasks', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    INSERT INTO tasks_fts(tasks_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)');
+    INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild');
+
+    CREATE TRIGGER trg_tasks_fts_insert
+    AFTER INSERT ON tasks
+    BEGIN
+        INSERT INTO tasks_fts (rowid, title, description)
+        VALUES (NEW.id, NEW.title, NEW.description);
+    END;
+
+    CREATE TRIGGER trg_tasks_fts_update
+    AFTER UPDATE OF title, description ON tasks
+    BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, description)
+        VALUES ('delete', OLD.id, OLD.title, OLD.description);
+        INSERT INTO tasks_fts (rowid, title, description)
+        VALUES (NEW.id, NEW.title, NEW.description);
+    END;
+
+    CREATE TRIGGER trg_tasks_fts_delete
+    AFTER DELETE ON tasks
+    BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, description)
+        VALUES ('delete', OLD.id, OLD.title, OLD.description);
+    END;
+    """,
+    # 5: claims on open tasks for the "next up" work queue. A task has at
+    # most one claim (the primary key is what makes claiming atomic), and
+    # completing or deleting the task ends it.
+    """
+    CREATE TABLE IF NOT EXISTS task_claims (
+        task_id INTEGER PRIMARY KEY,
+        worker TEXT NOT NULL,
+        claimed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TRIGGER trg_tasks_claims_complete
+    AFTER UPDATE OF completed ON tasks
+    WHEN NEW.completed
+    BEGIN
+        DELETE FROM task_claims WHERE task_id = NEW.id;
+    END;
+
+    CREATE TRIGGER trg_tasks_claims_delete
+    AFTER DELETE ON tasks
+    BEGIN
+        DELETE FROM task_claims WHERE task_id = OLD.id;
+    END;
+    """,
+    # 6: cold storage for completed tasks (see SQLiteTaskRepository.
+    # archive_completed). Same columns as tasks, with the listing index, so
+    # archived tasks can be listed alongside live ones in the same order.
+    """
+    CREATE TABLE IF NOT EXISTS tasks_archive (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        description TEXT,
+        priority INTEGER NOT NULL,
+        due_date DATE,
+        completed BOOLEAN NOT NULL,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP,
+        archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_tasks_archive_listing
+        ON tasks_archive(completed, priority, IFNULL(due_date, ''));
+    """,
+    # 7: when each task was completed, for reports (see analytics.py) and
+    # archiving. Triggers stamp it on every change of completed, so no
+    # write path has to; existing completed tasks get their updated_at.
+    """
+    ALTER TABLE tasks ADD COLUMN completed_at TIMESTAMP;
+    ALTER TABLE tasks_archive ADD COLUMN completed_at TIMESTAMP;
+    UPDATE tasks SET completed_at = updated_at WHERE completed;
+    UPDATE tasks_archive SET completed_at = updated_at;
+
+    -- completed_at is not in the version trigger's column list, so
+    -- stamping it does not count as a second change
+    CREATE TRIGGER trg_tasks_completed_at_insert
+    AFTER INSERT ON tasks
+    WHEN NEW.completed AND NEW.completed_at IS NULL
+    BEGIN
+        UPDATE tasks SET completed_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+    END;
+
+    CREATE TRIGGER trg_tasks_completed_at_update
+    AFTER UPDATE OF completed ON tasks
+    WHEN NEW.completed IS NOT OLD.completed
+    BEGIN
+        UPDATE tasks
+        SET completed_at = CASE WHEN NEW.completed THEN CURRENT_TIMESTAMP END
+        WHERE id = NEW.id;
+    END;
+    """,
+    # 8: claims count as changes to their task, so processes following the
+    # change feed (see coherence.py) see claims and releases made by other
+    # processes. The claim gets the task's change_seq stamped like any
+    # other change; a task deleted along with its claim is already gone.
+    """
+    CREATE TRIGGER trg_task_claims_version_insert
+    AFTER INSERT ON task_claims
+    BEGIN
+        UPDATE task_version
+        SET version = version + 1, modified_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+        UPDATE tasks SET change_seq = (SELECT version FROM task_version)
+        WHERE id = NEW.task_id;
+    END;
+
+    CREATE TRIGGER trg_task_claims_version_delete
+    AFTER DELETE ON task_claims
+    BEGIN
+        UPDATE task_version
+        SET version = version + 1, modified_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+        UPDATE tasks SET change_seq = (SELECT version FROM task_version)
+        WHERE id = OLD.task_id;
+    END;
+    """,
+    # 9: due-date reminders already delivered (see reminders.py), so each
+    # is sent once across processes and restarts. Keyed by due date too:
+    # moving a task's due date makes its reminders due again.
+    """
+    CREATE TABLE IF NOT EXISTS task_reminders (
+        task_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        due_date DATE NOT NULL,
+        sent_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (task_id, kind, due_date)
+    );
+
+    CREATE TRIGGER trg_tasks_reminders_delete
+    AFTER DELETE ON tasks
+    BEGIN
+        DELETE FROM task_reminders WHERE task_id = OLD.id;
+    END;
+    """,
+    # 10: the full-text index's terms in order, so search() can expand a
+    # prefix into the words it stands for with a few index seeks
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts_terms
+    USING fts5vocab(tasks_fts, instance);
+    """,
+]
+
+
+def migrate(conn):
+    """
+    Apply pending MIGRATIONS and return the resulting schema version.
+
+    Each migration commits in one transaction with its user_version bump,
+    so one that fails (or a process that dies) part way leaves neither
+    behind, and the migration runs again whole on the next start.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+        try:
+            conn.executescript(f"BEGIN;\n{script}\n"
+                               f"PRAGMA user_version = {number};\nCOMMIT;")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        logger.info(f"Applied database migration {number}")
+    return len(MIGRATIONS)
+
+
+def explain_query_plan(conn, sql, params=()):
+    """Return the detail column of EXPLAIN QUERY PLAN for a statement."""
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [row[3] for row in rows]
 
 
-def init_database():
+def init_database(db_path=DEFAULT_DB_PATH):
     """
     Initialize the database with required tables.
     """
@@ -47,18 +590,18 @@ def init_database():
     
     CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks(priority);
     CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks(due_date);
-    CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks(completed);
     """
 
     try:
-        with DatabaseConnection() as conn:
+        with DatabaseConnection(db_path, pooled=False) as conn:
             conn.executescript(schema)
+            migrate(conn)
             logger.info("Database initialized successfully")
     except sqlite3.Error as e:
         logger.error(f"Database initialization failed: {e}")
         raise
 
 
-def get_db():
+def get_db(db_path=DEFAULT_DB_PATH):
     """Factory function to get database connection."""
-    return DatabaseConnection()
+    return DatabaseConnection(db_path)
@@ -0,0 +1,195 @@
+"""
+In-process publish/subscribe hub for live task updates.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_MAX_SUBSCRIBERS = 10000
+
+
+class HubFullError(RuntimeError):
+    """Raised when the hub already has its maximum number of subscribers."""
+
+
+class SubscriptionClosed(Exception):
+    """Raised when reading from a closed or evicted subscription."""
+
+
+class Event:
+    """
+    One published event, encoded once as a Server-Sent Events message.
+
+    The same Event object is queued for every subscriber, so publishing to
+    N subscribers costs one JSON encoding, not N.
+    """
+
+    __slots__ = ('id', 'type', 'data', 'encoded')
+
+    def __init__(self, event_id: int, event_type: str, data: Dict[str, Any]):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+        self.encoded = (f"id: {event_id}\nevent: {event_type}\n"
+                        f"data: {json.dumps(data, separators=(',', ':'))}\n\n")
+
+
+class Subscription:
+    """
+    A subscriber's bounded queue of events.
+
+    An idle subscription is a deque and a few attributes; nothing waits on
+    it until a reader calls get() (blocking, for WSGI workers) or
+    get_async() (for an asyncio server, where thousands of idle
+    subscriptions share one event loop thread).
+    """
+
+    __slots__ = ('hub', 'maxsize', 'events', 'closed', 'evicted', '_wakeup')
+
+    def __init__(self, hub: 'EventHub', maxsize: int):
+        self.hub = hub
+        self.maxsize = maxsize
+        self.events = deque()
+        self.closed = False
+        self.evicted = False
+        self._wakeup = None
+
+    # Called by the hub with its lock held
+
+    def _offer(self, event: Event) -> bool:
+        if len(self.events) >= self.maxsize:
+            return False
+        self.events.append(event)
+        self._notify()
+        return True
+
+    def _notify(self):
+        if self._wakeup is not None:
+            self._wakeup()
+            self._wakeup = None
+
+    def _poll(self) -> Optional[Event]:
+        if self.events:
+            return self.events.popleft()
+        if self.closed:
+            raise SubscriptionClosed("evicted" if self.evicted else "closed")
+        return None
+
+    # Readers
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """
+        Next event, waiting up to ``timeout`` seconds; None on timeout.
+
+        Raises SubscriptionClosed once the subscription is closed or evicted.
+        """
+        with self.hub.lock:
+            event = self._poll()
+            if event is not None:
+                return event
+            ready = threading.Event()
+            self._wakeup = ready.set
+        ready.wait(timeout)
+        with self.hub.lock:
+            self._wakeup = None
+            return self._poll()
+
+    async def get_async(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """Like get(), but waits on the running event loop, not a thread."""
+        loop = asyncio.get_running_loop()
+        with self.hub.lock:
+            event = self._poll()
+            if event is not None:
+                return event
+            ready = asyncio.Event()
+            self._wakeup = lambda: loop.call_soon_threadsafe(ready.set)
+        try:
+            await asyncio.wait_for(ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self.hub.lock:
+            self._wakeup = None
+            return self._poll()
+
+    def close(self):
+        """Stop receiving events; safe to call more than once."""
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """
+    Fan out events to subscribers through bounded per-subscriber queues.
+
+    publish() never blocks on a subscriber: a subscriber whose queue is full
+    is evicted (its queue dropped and the subscription closed) so one slow
+    client cannot hold events in memory for everyone. Evicted clients
+    reconnect and resynchronise instead.
+    """
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 max_subscribers: int = DEFAULT_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.lock = threading.Lock()
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.evictions = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscription:
+        """Register a new subscriber; raises HubFullError at the limit."""
+        with self.lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise HubFullError(
+                    f"Event hub is full ({self.max_subscribers} subscribers)")
+            subscription = Subscription(self, self.queue_size)
+            self._subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self.lock:
+            self._subscribers.discard(subscription)
+            subscription.closed = True
+            subscription._notify()
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> Event:
+        """Queue an event for every subscriber, evicting any that are full."""
+        with self.lock:
+            event = Event(next(self._ids), event_type, data)
+            self.published += 1
+            slow = [subscription for subscription in self._subscribers
+                    if not subscription._offer(event)]
+            for subscription in slow:
+                self._subscribers.discard(subscription)
+                subscription.events.clear()
+                subscription.closed = subscription.evicted = True
+                subscription._notify()
+            self.evictions += len(slow)
+        if slow:
+            logger.warning(f"Evicted {len(slow)} slow event subscribers")
+        return event
+
+    def close(self):
+        """Close every subscription, e.g. at shutdown."""
+        with self.lock:
+            subscriptions, self._subscribers = self._subscribers, set()
+            for subscription in subscriptions:
+                subscription.closed = True
+                subscription._notify()
+
+    def metrics(self) -> Dict[str, int]:
+        with self.lock:
+            return {'subscribers': len(self._subscribers),
+                    'published': self.published,
+                    'evictions': self.evictions}
@@ -0,0 +1,640 @@
+"""
+Request, repository and query metrics, exported in Prometheus text format.
+"""
+import contextvars
+import logging
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from datetime import date
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from models import Task, TaskRepository
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds. Repository calls and most requests finish
+# in well under a millisecond when cached, so latency buckets start there.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500, 1000, 5000)
+
+# Metric updates queued before they are folded into the totals
+PENDING_LIMIT = 1000
+
+# Statements worth an EXPLAIN QUERY PLAN in the slow-query log
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+
+def _escape(value) -> str:
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[Any, ...]) -> str:
+    if not names:
+        return ''
+    pairs = ",".join(f'{name}="{_escape(value)}"'
+                     for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _apply(pending: deque):
+    """Fold queued (metric, labels, value) updates in; hold their lock."""
+    while pending:
+        metric, labels, value = pending.popleft()
+        metric._add(labels, value)
+
+
+class _Metric:
+    """
+    Base of Counter and Histogram: updates are queued, then folded in.
+
+    An update is a (metric, labels, value) triple appended to a deque,
+    which is thread-safe on its own, so recording one takes no lock and
+    does no bookkeeping. The queue is folded into the totals under the
+    lock once it holds PENDING_LIMIT updates and whenever the totals are
+    read. Instrumentation gives all its metrics one queue and one lock,
+    and appends to the queue straight from its hot paths.
+    """
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    def _record(self, labels: tuple, value: float):
+        pending = self._pending
+        pending.append((self, labels, value))
+        if len(pending) >= PENDING_LIMIT:
+            with self._lock:
+                _apply(pending)
+
+    def _add(self, labels: tuple, value: float):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """A monotonically increasing value per label set."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        self._record(labels, amount)
+
+    def _add(self, labels: tuple, amount: float):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    @property
+    def values(self) -> Dict[tuple, float]:
+        with self._lock:
+            _apply(self._pending)
+            return self._values
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            _apply(self._pending)
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+                for labels, value in values]
+
+
+class Histogram(_Metric):
+    """
+    Bucketed observations per label set, Prometheus style.
+
+    Each observation increments one bucket when it is folded in; the
+    cumulative ``le`` counts are only computed when the histogram is
+    rendered.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}  # labels -> [counts, sum, count]
+
+    def observe(self, value: float, labels: tuple = ()):
+        self._record(labels, value)
+
+    def _add(self, labels: tuple, value: float):
+        try:
+            series = self._series[labels]
+        except KeyError:
+            series = self._series[labels] = [
+                [0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @property
+    def series(self) -> Dict[tuple, list]:
+        with self._lock:
+            _apply(self._pending)
+            return self._series
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            _apply(self._pending)
+            series = sorted((labels, (list(counts), total, count))
+                            for labels, (counts, total, count)
+                            in self._series.items())
+        lines = []
+        names = self.label_names + ('le',)
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket
+                le = '+Inf' if bound == float('inf') else _number(float(bound))
+                lines.append(f"{self.name}_bucket"
+                             f"{_labels(names, labels + (le,))} {cumulative}")
+            suffix = _labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{suffix} {_number(total)}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class _ThreadState(threading.local):
+    # Class-level defaults keep reads on a fresh thread from raising
+    # AttributeError, which costs more than the read itself
+    checkout = None  # The outermost connection checkout, while measured
+    statements = None  # Statements captured for the slow-query log
+
+
+class RequestStats:
+    """Work done on behalf of the current request."""
+
+    __slots__ = ('started', 'queries', 'rows', 'status')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.rows = 0
+        self.status = 500  # Until a response is made
+
+
+class Instrumentation:
+    """
+    Collects request, repository, query and connection metrics.
+
+    Wire it in three places: ``instrument_db()`` around the connection
+    factory a SQLiteTaskRepository uses (query counts, connection hold
+    time), ``instrument_repository()`` around the repository (per-method
+    latency, rows hydrated, the slow-query log) and ``init_app()`` on the
+    Flask app (per-endpoint latency, and queries and rows per request,
+    plus the /metrics route); servers that bypass Flask, like asgi.py,
+    call ``begin_request()`` and ``end_request()`` themselves. Anything
+    else with a ``metrics()`` method, such as the read cache, can be
+    exported with ``add_collector()``.
+
+    Per-request figures count work done in the request's context: on its
+    own thread under WSGI, and under ASGI in the executor calls it awaits
+    (AsyncTaskRepository carries the context over). Writes group-committed
+    by a write-behind thread count towards the totals only.
+
+    When ``slow_query_ms`` is set, a repository call slower than that logs
+    a warning with each statement it ran and the statement's EXPLAIN
+    QUERY PLAN.
+    """
+
+    def __init__(self, slow_query_ms: Optional[float] = None):
+        self.enabled = True
+        self.slow_query_ms = slow_query_ms
+        self._local = _ThreadState()
+        # RequestStats of the request being handled
+        self._request = contextvars.ContextVar('request_stats', default=None)
+        self._collectors: List[Tuple[str, Callable[[], Dict[str, Any]]]] = []
+
+        self.request_duration = Histogram(
+            'http_request_duration_seconds', 'Time to handle a request.',
+            ('endpoint', 'method'))
+        self.requests = Counter(
+            'http_requests_total', 'Requests handled, by status code.',
+            ('endpoint', 'method', 'status'))
+        self.request_queries = Histogram(
+            'http_request_queries', 'SQL statements run per request.',
+            ('endpoint',), COUNT_BUCKETS)
+        self.request_rows = Histogram(
+            'http_request_rows_hydrated', 'Task rows hydrated per request.',
+            ('endpoint',), COUNT_BUCKETS)
+        self.repository_duration = Histogram(
+            'repository_call_duration_seconds',
+            'Time spent in each task repository method.', ('method',))
+        self.repository_rows = Counter(
+            'repository_rows_hydrated_total',
+            'Task rows returned by each repository method.', ('method',))
+        self.queries = Counter(
+            'db_queries_total',
+            'SQL statements run by requests and slow-query-logged calls.')
+        self.connection_hold = Histogram(
+            'db_connection_hold_seconds',
+            'How long a database connection stays checked out.')
+        self.slow_calls = Counter(
+            'repository_slow_calls_total',
+            'Repository calls slower than the slow-query threshold.',
+            ('method',))
+        self._metrics = [self.request_duration, self.requests,
+                         self.request_queries, self.request_rows,
+                         self.repository_duration, self.repository_rows,
+                         self.queries, self.connection_hold, self.slow_calls]
+        # One update queue and lock for every metric, so the hot paths
+        # below record an update with a single append
+        self._pending = deque()
+        self._record = self._pending.append
+        self._lock = threading.Lock()
+        for metric in self._metrics:
+            metric._pending, metric._lock = self._pending, self._lock
+
+    # Hooks called by the instrumented pieces
+
+    def count_rows(self, method: str, rows: int):
+        if rows and self.enabled:
+            self._record((self.repository_rows, (method,), rows))
+            request_stats = self._request.get()
+            if request_stats is not None:
+                request_stats.rows += rows
+
+    def apply_pending(self):
+        """Fold the queued metric updates in."""
+        with self._lock:
+            _apply(self._pending)
+
+    # Wiring
+
+    def instrument_db(self, db_connection):
+        """Wrap a repository's connection factory."""
+        # A subclass bound to the factory, so a checkout is made without
+        # running an __init__
+        return type('InstrumentedConnection', (InstrumentedConnection,),
+                    {'__slots__': (), 'instrumentation': self,
+                     'db_connection': staticmethod(db_connection)})
+
+    def instrument_repository(self, repo: TaskRepository, explain_db=None
+                              ) -> 'InstrumentedTaskRepository':
+        """
+        Wrap a repository. ``explain_db`` is the connection factory the
+        slow-query log runs EXPLAIN QUERY PLAN on; without it slow calls
+        are logged without plans.
+        """
+        return InstrumentedTaskRepository(repo, self, explain_db)
+
+    def add_collector(self, prefix: str, collect: Callable[[], Dict[str, Any]]):
+        """Export the numeric values of ``collect()`` as gauges."""
+        self._collectors.append((prefix, collect))
+
+    def begin_request(self) -> Optional[RequestStats]:
+        """Start counting a request's work in the current context."""
+        if not self.enabled:
+            return None
+        request_stats = RequestStats()
+        self._request.set(request_stats)
+        return request_stats
+
+    def end_request(self, endpoint: str, method: str):
+        """Record the request begun in the current context, if any."""
+        request_stats = self._request.get()
+        if request_stats is None:
+            return
+        self._request.set(None)
+        elapsed = time.perf_counter() - request_stats.started
+        record = self._record
+        record((self.request_duration, (endpoint, method), elapsed))
+        record((self.requests, (endpoint, method, request_stats.status), 1))
+        record((self.request_queries, (endpoint,), request_stats.queries))
+        if request_stats.queries:
+            record((self.queries, (), request_stats.queries))
+        record((self.request_rows, (endpoint,), request_stats.rows))
+        if len(self._pending) >= PENDING_LIMIT:
+            self.apply_pending()
+
+    def init_app(self, app, path: str = '/metrics'):
+        """Time every request of a Flask app and serve the metrics."""
+        from flask import Response, request
+
+        @app.before_request
+        def start_request_metrics():
+            self.begin_request()
+
+        @app.after_request
+        def record_status(response):
+            request_stats = self._request.get()
+            if request_stats is not None:
+                request_stats.status = response.status_code
+            return response
+
+        @app.teardown_request
+        def end_request_metrics(error=None):
+            # One lookup through the request proxy, not one per attribute:
+            # each costs more than recording the request
+            current = request._get_current_object()
+            self.end_request(current.endpoint or 'unmatched', current.method)
+
+        @app.route(path, endpoint='metrics')
+        def metrics():
+            return Response(self.render(),
+                            mimetype='text/plain; version=0.0.4')
+
+    # Slow-query log
+
+    def _log_slow_call(self, explain_db, method: str, elapsed: float,
+                       statements: List[str]):
+        self.slow_calls.inc((method,))
+        lines = [f"Slow repository call {method}: {elapsed * 1000:.1f} ms, "
+                 f"{len(statements)} statements"]
+        for statement in statements:
+            lines.append(f"  {' '.join(statement.split())}")
+            if (explain_db is None
+                    or not statement.lstrip().upper().startswith(EXPLAINABLE)):
+                continue
+            try:
+                with explain_db() as conn:
+                    plan = conn.execute(
+                        f"EXPLAIN QUERY PLAN {statement}").fetchall()
+            except Exception as e:
+                lines.append(f"    (no plan: {e})")
+                continue
+            lines.extend(f"    {row[3]}" for row in plan)
+        logger.warning("\n".join(lines))
+
+    # Export
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for prefix, collect in self._collectors:
+            try:
+                values = collect()
+            except Exception as e:
+                logger.error(f"Metrics collector {prefix} failed: {e}")
+                continue
+            lines.extend(self._gauges(prefix, values))
+        return "\n".join(lines) + "\n"
+
+    def _gauges(self, prefix: str, values: Dict[str, Any]) -> List[str]:
+        lines = []
+        for key, value in sorted(values.items()):
+            name = f"{prefix}_{key}"
+            if isinstance(value, dict):
+                lines.extend(self._gauges(name, value))
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_number(value)}")
+        return lines
+
+
+class _CountingCursor(sqlite3.Cursor):
+    """A cursor whose statements count towards its InstrumentedConnection."""
+
+    __slots__ = ('counter',)  # Set by InstrumentedConnection.cursor()
+
+    def execute(self, *args):
+        self.counter.queries += 1
+        return sqlite3.Cursor.execute(self, *args)
+
+    def executemany(self, *args):
+        self.counter.queries += 1
+        return sqlite3.Cursor.executemany(self, *args)
+
+
+class InstrumentedConnection:
+    """
+    Context manager around a DatabaseConnection that counts statements.
+
+    Times how long the connection is checked out. Statements are only
+    counted when something reads the count, a request's stats or the
+    slow-query log: the checkout then hands out itself in place of the
+    sqlite3 connection, counting each statement run through it and passing
+    everything else straight on. Checkouts outside both (background
+    threads, scripts) get the plain connection. Counting this way is
+    cheaper than a trace callback, which SQLite also calls for every
+    trigger program and FTS5 shadow-table statement, so the callback is
+    only installed to capture statement text for the slow-query log. Only
+    the outermost checkout on a thread is measured; nested checkouts share
+    its connection, and its count.
+    """
+
+    __slots__ = ('connection', 'measured', 'conn', 'queries',
+                 'request_stats', 'traced', 'started')
+
+    # Set on the subclass Instrumentation.instrument_db() makes
+    instrumentation: Instrumentation
+    db_connection: Callable
+
+    def __enter__(self):
+        self.connection = self.db_connection()
+        conn = self.connection.__enter__()
+        instrumentation = self.instrumentation
+        local = instrumentation._local
+        outer = local.checkout
+        if outer is not None:
+            self.measured = False
+            return outer.conn if outer.queries is None else outer
+        self.measured = instrumentation.enabled
+        if not self.measured:
+            return conn
+        self.conn = conn
+        self.request_stats = instrumentation._request.get()
+        self.traced = None
+        # Set by InstrumentedTaskRepository when the slow-query log is on
+        if local.statements is not None:
+            self.traced = []
+            conn.set_trace_callback(self.traced.append)
+        elif self.request_stats is None:
+            self.queries = None
+            local.checkout = self
+            self.started = time.perf_counter()
+            return conn
+        self.queries = 0
+        local.checkout = self
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.measured:
+            instrumentation = self.instrumentation
+            instrumentation._record((instrumentation.connection_hold, (),
+                                     time.perf_counter() - self.started))
+            local = instrumentation._local
+            local.checkout = None
+            if self.request_stats is not None:
+                # Added to the total once, by end_request()
+                self.request_stats.queries += self.queries
+            elif self.queries:
+                instrumentation._record(
+                    (instrumentation.queries, (), self.queries))
+            if self.traced is not None:
+                self.conn.set_trace_callback(None)
+                # Skip the FTS5 shadow-table statements, traced as comments
+                local.statements.extend(statement for statement in self.traced
+                                        if not statement.startswith('--'))
+            if len(instrumentation._pending) >= PENDING_LIMIT:
+                instrumentation.apply_pending()
+        return self.connection.__exit__(exc_type, exc_val, exc_tb)
+
+    # Standing in for the sqlite3 connection
+
+    def execute(self, *args):
+        self.queries += 1
+        return self.conn.execute(*args)
+
+    def executemany(self, *args):
+        self.queries += 1
+        return self.conn.executemany(*args)
+
+    def cursor(self, factory=_CountingCursor):
+        cursor = self.conn.cursor(factory)
+        cursor.counter = self
+        return cursor
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+class InstrumentedTaskRepository(TaskRepository):
+    """
+    TaskRepository decorator that times every call to another repository.
+
+    Wrap the SQLite repository (or the write-behind queue in front of it)
+    and put the read cache outside, so the figures describe database work
+    and cache hits are not counted as calls.
+    """
+
+    def __init__(self, repo: TaskRepository, instrumentation: Instrumentation,
+                 explain_db=None):
+        self.repo = repo
+        self.instrumentation = instrumentation
+        self.explain_db = explain_db
+
+    def _call(self, method: str, *args):
+        instrumentation = self.instrumentation
+        if not instrumentation.enabled:
+            return getattr(self.repo, method)(*args)
+        local = instrumentation._local
+        slow_ms = instrumentation.slow_query_ms
+        if slow_ms is not None:
+            outer_statements = local.statements
+            local.statements = []
+        started = time.perf_counter()
+        try:
+            result = getattr(self.repo, method)(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            instrumentation._record(
+                (instrumentation.repository_duration, (method,), elapsed))
+            if slow_ms is not None:
+                statements, local.statements = local.statements, outer_statements
+                if elapsed * 1000 >= slow_ms:
+                    instrumentation._log_slow_call(self.explain_db, method,
+                                                   elapsed, statements)
+        # Task rows the result carries
+        if isinstance(result, Task):
+            instrumentation.count_rows(method, 1)
+            return result
+        rows = result
+        if isinstance(result, tuple):  # list_page(): (tasks, cursor)
+            rows = result[0]
+        elif isinstance(result, dict):  # changes()
+            rows = result.get('updated', ())
+        if isinstance(rows, list) and rows and isinstance(rows[0], Task):
+            instrumentation.count_rows(method, len(rows))
+        return result
+
+    # Reads
+
+    def get_all(self) -> List[Task]:
+        return self._call('get_all')
+
+    def iter_all(self, batch_size: int = 500) -> Iterator[List[Task]]:
+        # Timed batch by batch, so the time a consumer takes between
+        # batches is not counted as repository time
+        batches = self.repo.iter_all(batch_size)
+        instrumentation = self.instrumentation
+        try:
+            while True:
+                started = time.perf_counter()
+                batch = next(batches, None)
+                if instrumentation.enabled:
+                    instrumentation.repository_duration.observe(
+                        time.perf_counter() - started, ('iter_all',))
+                if batch is None:
+                    return
+                instrumentation.count_rows('iter_all', len(batch))
+                yield batch
+        finally:
+            batches.close()
+
+    def list_page(self, cursor: Optional[str] = None, limit: int = 50,
+                  filters: Optional[Dict[str, Any]] = None,
+                  include_archived: bool = False
+                  ) -> Tuple[List[Task], Optional[str]]:
+        return self._call('list_page', cursor, limit, filters,
+                          include_archived)
+
+    def count(self, filters: Optional[Dict[str, Any]] = None,
+              include_archived: bool = False) -> int:
+        return self._call('count', filters, include_archived)
+
+    def stats(self, today: Optional[date] = None) -> Dict[str, Any]:
+        return self._call('stats', today)
+
+    def search(self, query: str, filters: Optional[Dict[str, Any]] = None,
+               limit: int = 20) -> List[Task]:
+        return self._call('search', query, filters, limit)
+
+    def version(self) -> Tuple[int, str]:
+        return self._call('version')
+
+    def changes(self, since: int, limit: int = 500) -> Dict[str, Any]:
+        return self._call('changes', since, limit)
+
+    def get_by_id(self, task_id: int) -> Optional[Task]:
+        return self._call('get_by_id', task_id)
+
+    # Writes
+
+    def create(self, task: Task) -> Task:
+        return self._call('create', task)
+
+    def update(self, task_id: int, task_data: Dict[str, Any]) -> Optional[Task]:
+        return self._call('update', task_id, task_data)
+
+    def delete(self, task_id: int) -> bool:
+        return self._call('delete', task_id)
+
+    def mark_completed(self, task_id: int, completed: bool) -> Optional[Task]:
+        return self._call('mark_completed', task_id, completed)
+
+    def toggle_completed(self, task_id: int) -> Optional[Task]:
+        return self._call('toggle_completed', task_id)
+
+    def bulk_create(self, tasks: List[Task]) -> List[Task]:
+        return self._call('bulk_create', tasks)
+
+    def bulk_update(self, updates: List[Tuple[int, Dict[str, Any]]]) -> List[bool]:
+        return self._call('bulk_update', updates)
+
+    def bulk_delete(self, task_ids: List[int]) -> List[bool]:
+        return self._call('bulk_delete', task_ids)
+
+    def bulk_mark_completed(self, task_ids: List[int], completed: bool) -> List[bool]:
+        return self._call('bulk_mark_completed', task_ids, completed)
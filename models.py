@@ -1,14 +1,177 @@
 """
 Task model and repository.
 """
+import base64
+import binascii
+import functools
+import json
+import logging
+import random
+import re
+import sqlite3
+import time
 from abc import ABC, abstractmethod
-from datetime import datetime
-from typing import List, Optional, Dict, Any
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Dict, Any, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Listing order for every task list: pending first, then by priority, then
+# by due date (tasks without a due date first), with the id as tiebreaker so
+# the order is total and can be used as a pagination key.
+LISTING_ORDER = "completed, priority, IFNULL(due_date, ''), id"
+LISTING_KEY = "(completed, priority, IFNULL(due_date, ''), id)"
+
+# Filters accepted by list_page() and count(), mapped to SQL predicates.
+# They are written against the columns of idx_tasks_listing (note the
+# IFNULL on due_date) so filtered lists are still read in index order.
+TASK_FILTERS = {
+    'completed': "completed = ?",
+    'priority': "priority = ?",
+    'priority_min': "priority >= ?",
+    'priority_max': "priority <= ?",
+    'due_from': "IFNULL(due_date, '') >= ?",
+    'due_to': "IFNULL(due_date, '') > '' AND IFNULL(due_date, '') <= ?",
+}
+
+
+# Columns read into a Task, in Task.from_row() order. Queries name them
+# explicitly so rows can be unpacked by position.
+TASK_COLUMNS = ("id, title, description, priority, due_date, completed, "
+                "created_at, updated_at")
+
+# The same columns qualified with the table name, for joins
+QUALIFIED_TASK_COLUMNS = ", ".join(f"tasks.{column}"
+                                   for column in TASK_COLUMNS.split(", "))
+
+# search() ranks by BM25 only when at most this many tasks match. BM25 needs
+# each word's document count, which FTS5 gets by reading the word's whole
+# posting list, so a word found in most of a large table costs tens of
+# milliseconds to rank -- and ranks nothing usefully, as its weight is ~0.
+# Broader queries return the newest matches, flagged as not ranked.
+SEARCH_RANK_LIMIT = 5000
+
+# A search word longer than the prefix index (prefix='2 3') is expanded into
+# the indexed words it starts, when there are at most this many: FTS5 reads
+# an OR of words lazily, but merges a prefix's posting lists up front.
+SEARCH_PREFIX_TERMS = 50
+
+# UPDATE ... RETURNING needs SQLite 3.35; older libraries re-select the row
+SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Event published for each single-task write method (delete publishes
+# "deleted" with just the id)
+WRITE_EVENTS = {
+    'create': 'created',
+    'update': 'updated',
+    'delete': 'deleted',
+    'mark_completed': 'toggled',
+    'toggle_completed': 'toggled',
+}
+
+# Columns callers may change through update() and bulk_update()
+UPDATABLE_FIELDS = ('title', 'description', 'priority', 'due_date', 'completed')
+
+
+class SyncExpiredError(ValueError):
+    """Raised when tombstones older than a sync position were pruned."""
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(task: 'Task') -> str:
+    """Encode the listing position just after ``task`` as an opaque token."""
+    key = [int(task.completed), task.priority, task.due_date or '', task.id]
+    raw = json.dumps(key, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> list:
+    """Decode a token produced by encode_cursor()."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}")
+    if (not isinstance(key, list) or len(key) != 4
+            or not all(isinstance(v, int) for v in (key[0], key[1], key[3]))
+            or not isinstance(key[2], str)):
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}")
+    return key
+
+
+def task_row_factory(cursor, row) -> 'Task':
+    """sqlite3 row factory that hydrates Task objects straight from tuples."""
+    return Task.from_row(row)
+
+
+def _filter_clause(filters: Optional[Dict[str, Any]]) -> Tuple[List[str], list]:
+    """Build WHERE predicates and parameters from a filters dict."""
+    predicates, params = [], []
+    for name, value in (filters or {}).items():
+        if value is None:
+            continue
+        if name not in TASK_FILTERS:
+            raise ValueError(f"Unknown filter: {name}")
+        predicates.append(TASK_FILTERS[name])
+        params.append(int(value) if name == 'completed' else value)
+    if predicates and 'completed = ?' not in predicates:
+        # Spell out both values of the leading index column; otherwise the
+        # planner may prefer a single-column index and sort the result.
+        predicates.insert(0, "completed IN (0, 1)")
+    return predicates, params
+
+
+class SearchResults(list):
+    """
+    Tasks returned by search(), best match first.
+
+    ``ranked`` is False when the query matched more than SEARCH_RANK_LIMIT
+    tasks: the results are then the newest matches, not ranked by BM25.
+    """
+
+    ranked = True
+
+
+def _is_lock_error(error: sqlite3.OperationalError) -> bool:
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def retry_on_lock(method):
+    """
+    Retry a repository write when SQLite reports the database is locked.
+
+    The connection's busy_timeout already waits for the write lock; this
+    covers what it cannot, such as a lock that outlives the timeout. Waits
+    back off exponentially with jitter so queued writers do not retry in
+    lockstep.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return method(self, *args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not _is_lock_error(e) or attempt >= self.write_retries:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt)
+                attempt += 1
+                logger.warning(f"{method.__name__} hit a locked database, "
+                               f"retry {attempt} in {delay:.3f}s")
+                time.sleep(delay * random.uniform(0.5, 1.5))
+    return wrapper
 
 
 class Task:
     """Task entity class representing a single task."""
 
+    __slots__ = ('id', 'title', 'description', 'priority', 'due_date',
+                 'completed', 'created_at', 'updated_at')
+
     def __init__(self, title: str, description: str = "", priority: int = 3,
                  due_date: Optional[str] = None, completed: bool = False,
                  task_id: Optional[int] = None, created_at: Optional[str] = None,
@@ -22,6 +185,20 @@ class Task:
         self.created_at = created_at or datetime.now().isoformat()
         self.updated_at = updated_at or datetime.now().isoformat()
 
+    @classmethod
+    def from_row(cls, row) -> 'Task':
+        """
+        Build a Task from a stored row selected as TASK_COLUMNS.
+
+        Stored rows are already valid, so this skips __init__: no priority
+        clamping and no default timestamps.
+        """
+        task = object.__new__(cls)
+        (task.id, task.title, task.description, task.priority, task.due_date,
+         completed, task.created_at, task.updated_at) = row
+        task.completed = bool(completed)
+        return task
+
     def to_dict(self) -> Dict[str, Any]:
         """Convert task to dictionary."""
         return {
@@ -43,6 +220,39 @@ class TaskRepository(ABC):
     def get_all(self) -> List[Task]:
         pass
 
+    @abstractmethod
+    def iter_all(self, batch_size: int = 500) -> Iterator[List[Task]]:
+        pass
+
+    @abstractmethod
+    def list_page(self, cursor: Optional[str] = None, limit: int = 50,
+                  filters: Optional[Dict[str, Any]] = None,
+                  include_archived: bool = False
+                  ) -> Tuple[List[Task], Optional[str]]:
+        pass
+
+    @abstractmethod
+    def count(self, filters: Optional[Dict[str, Any]] = None,
+              include_archived: bool = False) -> int:
+        pass
+
+    @abstractmethod
+    def stats(self, today: Optional[date] = None) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    def search(self, query: str, filters: Optional[Dict[str, Any]] = None,
+               limit: int = 20) -> List[Task]:
+        pass
+
+    @abstractmethod
+    def version(self) -> Tuple[int, str]:
+        pass
+
+    @abstractmethod
+    def changes(self, since: int, limit: int = 500) -> Dict[str, Any]:
+        pass
+
     @abstractmethod
     def get_by_id(self, task_id: int) -> Optional[Task]:
         pass
@@ -63,72 +273,609 @@ class TaskRepository(ABC):
     def mark_completed(self, task_id: int, completed: bool) -> Optional[Task]:
         pass
 
+    @abstractmethod
+    def toggle_completed(self, task_id: int) -> Optional[Task]:
+        pass
+
+    @abstractmethod
+    def bulk_create(self, tasks: List[Task]) -> List[Task]:
+        pass
+
+    @abstractmethod
+    def bulk_update(self, updates: List[Tuple[int, Dict[str, Any]]]) -> List[bool]:
+        pass
+
+    @abstractmethod
+    def bulk_delete(self, task_ids: List[int]) -> List[bool]:
+        pass
+
+    @abstractmethod
+    def bulk_mark_completed(self, task_ids: List[int], completed: bool) -> List[bool]:
+        pass
+
 
 class SQLiteTaskRepository(TaskRepository):
-    """SQLite implementation of TaskRepository."""
+    """
+    SQLite implementation of TaskRepository.
+
+    When ``events`` is given (anything with a ``publish(event_type, data)``
+    method, such as events.EventHub), every committed write is published to
+    it: ``created``, ``updated``, ``toggled`` and ``deleted`` for single
+    tasks, and ``bulk_*`` events carrying the affected ids for bulk writes.
+    """
 
-    def __init__(self, db_connection):
+    def __init__(self, db_connection, write_retries: int = 5,
+                 retry_backoff: float = 0.05, events=None):
         self.db = db_connection
+        self.write_retries = write_retries
+        self.retry_backoff = retry_backoff
+        self.events = events
+
+    def _emit(self, event_type: str, data: Dict[str, Any]):
+        """Publish a committed write; a failing listener never fails it."""
+        if self.events is None:
+            return
+        try:
+            self.events.publish(event_type, data)
+        except Exception as e:
+            logger.error(f"Error publishing {event_type} event: {e}")
+
+    @staticmethod
+    def _query_tasks(conn, sql: str, params=()) -> sqlite3.Cursor:
+        """Execute a query whose rows are hydrated as Task objects."""
+        cursor = conn.cursor()
+        cursor.row_factory = task_row_factory
+        return cursor.execute(sql, params)
 
     def get_all(self) -> List[Task]:
         """Get all tasks."""
         with self.db() as conn:
-            cursor = conn.execute("""
-                SELECT * FROM tasks 
-                ORDER BY 
-                    CASE WHEN completed = 1 THEN 1 ELSE 0 END,
-                    priority ASC,
-                    due_date ASC
-            """)
-            tasks = []
-            for row in cursor:
-                tasks.append(Task(
-                    task_id=row['id'],
-                    title=row['title'],
-                    description=row['description'],
-                    priority=row['priority'],
-                    due_date=row['due_date'],
-                    completed=bool(row['completed']),
-                    created_at=row['created_at'],
-                    updated_at=row['updated_at']
-                ))
-            return tasks
+            return self._query_tasks(conn, f"""
+                SELECT {TASK_COLUMNS} FROM tasks 
+                ORDER BY {LISTING_ORDER}
+            """).fetchall()
+
+    def iter_all(self, batch_size: int = 500) -> Iterator[List[Task]]:
+        """
+        Yield every task in listing order, in batches of ``batch_size``.
+
+        Only one batch is held in memory at a time. Each batch is read on
+        its own short connection checkout, keyed on the last task of the
+        previous one like list_page(), so a slow consumer (an export
+        streaming to a slow client) holds no pooled connection between
+        batches. Batches are separate reads: a task that moves in the
+        listing order during the walk may be skipped or seen twice.
+        """
+        after = None
+        while True:
+            where, params = "", [batch_size]
+            if after is not None:
+                where = f"WHERE {LISTING_KEY} > (?, ?, ?, ?)"
+                params = after + params
+            with self.db() as conn:
+                tasks = self._query_tasks(conn, f"""
+                    SELECT {TASK_COLUMNS} FROM tasks
+                    {where}
+                    ORDER BY {LISTING_ORDER}
+                    LIMIT ?
+                """, params).fetchall()
+            if not tasks:
+                return
+            yield tasks
+            if len(tasks) < batch_size:
+                return
+            last = tasks[-1]
+            after = [int(last.completed), last.priority, last.due_date or '',
+                     last.id]
+
+    def list_page(self, cursor: Optional[str] = None, limit: int = 50,
+                  filters: Optional[Dict[str, Any]] = None,
+                  include_archived: bool = False
+                  ) -> Tuple[List[Task], Optional[str]]:
+        """
+        Get one page of tasks in listing order.
+
+        Pages are keyed on the last task of the previous page rather than an
+        offset, so fetching page N costs the same as fetching page 1. Returns
+        the tasks and a cursor for the next page, or None on the last page.
+
+        With ``include_archived`` archived tasks are listed too, in the same
+        order. Each table is read in index order up to the page size and
+        only those rows are merged, so a large archive costs no more.
+        """
+        predicates, params = _filter_clause(filters)
+        if cursor:
+            predicates.append(f"{LISTING_KEY} > (?, ?, ?, ?)")
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(predicates)}" if predicates else ""
+
+        with self.db() as conn:
+            if include_archived:
+                tasks = self._query_tasks(conn, f"""
+                    SELECT {TASK_COLUMNS} FROM (
+                        SELECT * FROM (
+                            SELECT {TASK_COLUMNS} FROM tasks {where}
+                            ORDER BY {LISTING_ORDER} LIMIT ?)
+                        UNION ALL
+                        SELECT * FROM (
+                            SELECT {TASK_COLUMNS} FROM tasks_archive {where}
+                            ORDER BY {LISTING_ORDER} LIMIT ?)
+                    )
+                    ORDER BY {LISTING_ORDER}
+                    LIMIT ?
+                """, params + [limit + 1] + params + [limit + 1, limit + 1]
+                ).fetchall()
+            else:
+                tasks = self._query_tasks(conn, f"""
+                    SELECT {TASK_COLUMNS} FROM tasks
+                    {where}
+                    ORDER BY {LISTING_ORDER}
+                    LIMIT ?
+                """, params + [limit + 1]).fetchall()
+
+        if len(tasks) > limit:
+            del tasks[limit:]
+            return tasks, encode_cursor(tasks[-1])
+        return tasks, None
+
+    def count(self, filters: Optional[Dict[str, Any]] = None,
+              include_archived: bool = False) -> int:
+        """Count tasks matching the filters, archived ones too if asked."""
+        predicates, params = _filter_clause(filters)
+        where = f"WHERE {' AND '.join(predicates)}" if predicates else ""
+        tables = ('tasks', 'tasks_archive') if include_archived else ('tasks',)
+        with self.db() as conn:
+            return sum(conn.execute(f"SELECT COUNT(*) FROM {table} {where}",
+                                    params).fetchone()[0]
+                       for table in tables)
+
+    def stats(self, today: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Dashboard counters from one aggregate query.
+
+        Returns total/completed/pending counts overall and per priority,
+        plus how many pending tasks are overdue or due within the next
+        seven days (counting from ``today``, which defaults to the current
+        date).
+        """
+        today = today or date.today()
+        week_end = today + timedelta(days=7)
+        with self.db() as conn:
+            rows = conn.execute("""
+                SELECT completed, priority, COUNT(*),
+                       SUM(IFNULL(due_date, '') > ''
+                           AND IFNULL(due_date, '') < ?),
+                       SUM(IFNULL(due_date, '') >= ?
+                           AND IFNULL(due_date, '') < ?)
+                FROM tasks
+                GROUP BY completed, priority
+            """, (today.isoformat(), today.isoformat(),
+                  week_end.isoformat())).fetchall()
+
+        stats = {
+            'total': 0, 'completed': 0, 'pending': 0,
+            'overdue': 0, 'due_this_week': 0,
+            'by_priority': {priority: {'total': 0, 'completed': 0, 'pending': 0}
+                            for priority in range(1, 6)},
+        }
+        for completed, priority, count, overdue, due_soon in rows:
+            status = 'completed' if completed else 'pending'
+            stats['total'] += count
+            stats[status] += count
+            stats['by_priority'][priority]['total'] += count
+            stats['by_priority'][priority][status] += count
+            if not completed:
+                stats['overdue'] += overdue
+                stats['due_this_week'] += due_soon
+        return stats
+
+    def search(self, query: str, filters: Optional[Dict[str, Any]] = None,
+               limit: int = 20) -> SearchResults:
+        """
+        Tasks whose title or description match ``query``, best first.
+
+        Every word in the query must match the start of a word in the task
+        (so "rep" finds "report"). Results are ranked by BM25 with title
+        matches weighted above description matches, and can be narrowed
+        with the same filters as list_page(). Queries matching more than
+        SEARCH_RANK_LIMIT tasks return the newest matches first instead,
+        with ``ranked`` False on the returned SearchResults.
+        """
+        words = re.findall(r"\w+", query)
+        if not words:
+            return SearchResults()
+        predicates, params = _filter_clause(filters)
+        where = "".join(f" AND {predicate}" for predicate in predicates)
+        with self.db() as conn:
+            # Explicit ANDs: FTS5 only joins bare phrases implicitly
+            match = " AND ".join(self._prefix_match(conn, word)
+                                 for word in words)
+            results = SearchResults()
+            results.ranked = not self._matches_over(conn, match,
+                                                    SEARCH_RANK_LIMIT)
+            order = "rank" if results.ranked else "tasks_fts.rowid DESC"
+            results.extend(self._query_tasks(conn, f"""
+                SELECT {QUALIFIED_TASK_COLUMNS}
+                FROM tasks_fts JOIN tasks ON tasks.id = tasks_fts.rowid
+                WHERE tasks_fts MATCH ?{where}
+                ORDER BY {order}
+                LIMIT ?
+            """, [match] + params + [limit]))
+        return results
+
+    @staticmethod
+    def _prefix_match(conn, word: str) -> str:
+        """
+        An FTS5 expression for the words that start with ``word``.
+
+        Short words use the prefix index. Longer ones are looked up in
+        tasks_fts_terms, one seek per indexed word, and become an OR of
+        those words; words the lookup cannot fold like the tokenizer does
+        (accents, underscores) and prefixes of too many words stay prefix
+        queries. Either way the same tasks match.
+        """
+        prefix = word.lower()
+        if len(prefix) <= 3 or not (prefix.isascii() and prefix.isalnum()):
+            return f'"{word}"*'
+        end = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        terms = []
+        row = conn.execute("""
+            SELECT term FROM tasks_fts_terms WHERE term >= ? AND term < ?
+            LIMIT 1
+        """, (prefix, end)).fetchone()
+        while row is not None and len(terms) < SEARCH_PREFIX_TERMS:
+            terms.append(row[0])
+            # "term > ?" would step through every instance of the last
+            # word; seeking just past it jumps to the next one
+            row = conn.execute("""
+                SELECT term FROM tasks_fts_terms WHERE term >= ? AND term < ?
+                LIMIT 1
+            """, (row[0] + "\x01", end)).fetchone()
+        if row is not None or not terms:
+            return f'"{word}"*'
+        return "(" + " OR ".join(f'"{term}"' for term in terms) + ")"
+
+    @staticmethod
+    def _matches_over(conn, match: str, limit: int) -> bool:
+        """
+        Whether more than ``limit`` tasks match an FTS5 query.
+
+        Reading stops at the limit, so this costs at most that many posting
+        list entries however common the words are.
+        """
+        return conn.execute("""
+            SELECT 1 FROM tasks_fts WHERE tasks_fts MATCH ?
+            LIMIT 1 OFFSET ?
+        """, (match, limit)).fetchone() is not None
+
+    def version(self) -> Tuple[int, str]:
+        """
+        Table change version and the UTC time it last changed.
+
+        Triggers bump the version on every insert, update and delete, so
+        equal versions mean the task table has not changed.
+        """
+        with self.db() as conn:
+            row = conn.execute(
+                "SELECT version, modified_at FROM task_version WHERE id = 1"
+            ).fetchone()
+            return row[0], row[1]
+
+    def changes(self, since: int, limit: int = 500) -> Dict[str, Any]:
+        """
+        Tasks changed and ids deleted after table version ``since``.
+
+        Returns up to ``limit`` changes in version order as ``updated``
+        (Task objects) and ``deleted`` (ids), plus ``next_since`` to pass on
+        the next call and ``has_more`` when the limit cut the batch short.
+        Raises SyncExpiredError when deletions after ``since`` may have been
+        pruned, meaning the caller has to resync from scratch.
+        """
+        with self.db() as conn:
+            # One read transaction, so both tables come from one snapshot
+            conn.execute("BEGIN")
+            try:
+                version, pruned_seq = conn.execute(
+                    "SELECT version, pruned_seq FROM task_version WHERE id = 1"
+                ).fetchone()
+                if since < pruned_seq:
+                    raise SyncExpiredError(
+                        f"Changes before version {pruned_seq} are no longer "
+                        f"available; fetch the full task list")
+                cursor = conn.cursor()
+                cursor.row_factory = lambda _, row: (Task.from_row(row[:-1]),
+                                                     row[-1])
+                updated = cursor.execute(f"""
+                    SELECT {TASK_COLUMNS}, change_seq FROM tasks
+                    WHERE change_seq > ?
+                    ORDER BY change_seq
+                    LIMIT ?
+                """, (since, limit + 1)).fetchall()
+                deleted = conn.execute("""
+                    SELECT id, change_seq FROM task_tombstones
+                    WHERE change_seq > ?
+                    ORDER BY change_seq
+                    LIMIT ?
+                """, (since, limit + 1)).fetchall()
+            finally:
+                conn.rollback()
+
+        # Merge both streams by sequence number and keep the first `limit`
+        events = sorted([(seq, task) for task, seq in updated] +
+                        [(seq, task_id) for task_id, seq in deleted],
+                        key=lambda event: event[0])
+        has_more = len(events) > limit
+        events = events[:limit]
+        return {
+            'version': version,
+            'next_since': events[-1][0] if has_more else version,
+            'has_more': has_more,
+            'updated': [item for _, item in events if isinstance(item, Task)],
+            'deleted': [item for _, item in events if not isinstance(item, Task)],
+        }
+
+    def changed_ids(self, since: int, limit: int = 1000
+                    ) -> Tuple[int, Optional[List[int]]]:
+        """
+        The table version and the ids changed or deleted after ``since``.
+
+        Like changes() without loading the rows, for callers that only
+        invalidate. The ids are None when more than ``limit`` tasks changed.
+        Raises SyncExpiredError like changes().
+        """
+        with self.db() as conn:
+            conn.execute("BEGIN")
+            try:
+                version, pruned_seq = conn.execute(
+                    "SELECT version, pruned_seq FROM task_version WHERE id = 1"
+                ).fetchone()
+                if since < pruned_seq:
+                    raise SyncExpiredError(
+                        f"Changes before version {pruned_seq} are no longer "
+                        f"available")
+                # Two range reads of the change_seq indexes, merged here: a
+                # UNION in SQL would deduplicate through a temp B-tree. Each
+                # read stops past the limit, which is enough to tell whether
+                # more than ``limit`` ids changed in all.
+                task_ids = {row[0] for row in conn.execute(
+                    "SELECT id FROM tasks WHERE change_seq > ? LIMIT ?",
+                    (since, limit + 1))}
+                task_ids.update(row[0] for row in conn.execute(
+                    "SELECT id FROM task_tombstones WHERE change_seq > ? LIMIT ?",
+                    (since, limit + 1)))
+            finally:
+                conn.rollback()
+        return version, sorted(task_ids) if len(task_ids) <= limit else None
+
+    @retry_on_lock
+    def prune_tombstones(self, older_than_days: int = 30) -> int:
+        """
+        Delete tombstones older than ``older_than_days``.
+
+        Clients whose sync position predates the newest pruned tombstone get
+        SyncExpiredError from changes() and must resync.
+        """
+        with self.db() as conn:
+            cutoff = f"-{int(older_than_days)} days"
+            newest = conn.execute("""
+                SELECT MAX(change_seq) FROM task_tombstones
+                WHERE deleted_at < datetime('now', ?)
+            """, (cutoff,)).fetchone()[0]
+            if newest is None:
+                return 0
+            cursor = conn.execute(
+                "DELETE FROM task_tombstones WHERE change_seq <= ?", (newest,))
+            conn.execute("""
+                UPDATE task_version SET pruned_seq = MAX(pruned_seq, ?)
+                WHERE id = 1
+            """, (newest,))
+            conn.commit()
+            return cursor.rowcount
+
+    @retry_on_lock
+    def archive_completed(self, older_than_days: int = 30,
+                          limit: int = 500) -> List[int]:
+        """
+        Move old completed tasks into tasks_archive; returns their ids.
+
+        Moves up to ``limit`` tasks completed more than ``older_than_days``
+        ago, in one transaction. To the tasks table (and so to delta sync
+        clients) an archived task looks deleted; it is still listed and
+        counted with ``include_archived``.
+        """
+        cutoff = f"-{int(older_than_days)} days"
+        with self.db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            task_ids = [row[0] for row in conn.execute("""
+                SELECT id FROM tasks
+                WHERE completed = 1
+                  AND julianday(completed_at) < julianday('now', ?)
+                LIMIT ?
+            """, (cutoff, limit))]
+            if task_ids:
+                ids = json.dumps(task_ids)
+                conn.execute(f"""
+                    INSERT INTO tasks_archive ({TASK_COLUMNS}, completed_at)
+                    SELECT {TASK_COLUMNS}, completed_at FROM tasks
+                    WHERE id IN (SELECT value FROM json_each(?))
+                """, (ids,))
+                conn.execute(
+                    "DELETE FROM tasks WHERE id IN (SELECT value FROM json_each(?))",
+                    (ids,))
+            conn.commit()
+        if task_ids:
+            self._emit('bulk_archived', {'ids': task_ids})
+        return task_ids
+
+    # Work queue: claims on open tasks (see next_up.NextUpRepository)
+
+    def open_task_keys(self, task_ids: Optional[List[int]] = None
+                       ) -> Iterator[Tuple[int, int, Optional[str], bool]]:
+        """
+        Yield (id, priority, due_date, claimed) for every open task.
+
+        With ``task_ids``, only for the open tasks among those.
+        """
+        where, params = "tasks.completed = 0", ()
+        if task_ids is not None:
+            where += " AND tasks.id IN (SELECT value FROM json_each(?))"
+            params = (json.dumps(task_ids),)
+        with self.db() as conn:
+            yield from conn.execute(f"""
+                SELECT tasks.id, tasks.priority, tasks.due_date,
+                       task_claims.task_id IS NOT NULL
+                FROM tasks LEFT JOIN task_claims
+                    ON task_claims.task_id = tasks.id
+                WHERE {where}
+            """, params)
+
+    def get_many(self, task_ids: List[int]) -> List[Task]:
+        """The tasks among ``task_ids`` that exist, in the order given."""
+        with self.db() as conn:
+            found = {task.id: task for task in self._query_tasks(conn, f"""
+                SELECT {TASK_COLUMNS} FROM tasks
+                WHERE id IN (SELECT value FROM json_each(?))
+            """, (json.dumps(list(task_ids)),))}
+        return [found[task_id] for task_id in task_ids if task_id in found]
+
+    @retry_on_lock
+    def claim(self, task_ids: List[int], worker: str) -> List[Task]:
+        """
+        Claim each of ``task_ids`` for ``worker`` if it is open and unclaimed.
+
+        Returns the claimed tasks in the order given. The claims are made
+        in one transaction, and a task's claim is its task_claims primary
+        key, so two workers, in this process or another, can never both
+        claim the same task.
+        """
+        if not task_ids:
+            return []
+        with self.db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            claimed = [task_id for task_id in task_ids if conn.execute("""
+                INSERT OR IGNORE INTO task_claims (task_id, worker)
+                SELECT id, ? FROM tasks WHERE id = ? AND completed = 0
+            """, (worker, task_id)).rowcount > 0]
+            conn.commit()
+        return self.get_many(claimed)
+
+    @retry_on_lock
+    def release(self, task_id: int) -> bool:
+        """Drop the claim on a task, putting it back in the queue."""
+        with self.db() as conn:
+            cursor = conn.execute(
+                "DELETE FROM task_claims WHERE task_id = ?", (task_id,))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    # Due-date reminders (see reminders.DueDateScheduler)
+
+    def open_due_dates(self, from_date: str) -> Iterator[Tuple[int, str]]:
+        """Yield (id, due_date) for open tasks due on or after ``from_date``."""
+        with self.db() as conn:
+            # A range scan of the due date index; the planner would
+            # otherwise pick the listing index and read every open task
+            yield from conn.execute("""
+                SELECT id, due_date FROM tasks INDEXED BY idx_tasks_due_date
+                WHERE due_date >= ? AND completed = 0
+            """, (from_date,))
+
+    @retry_on_lock
+    def claim_reminders(self, reminders: List[Tuple[int, str, str]]
+                        ) -> List[Tuple[str, Task]]:
+        """
+        Record (task_id, kind, due_date) reminders as sent.
+
+        Returns (kind, task) for the ones to deliver: the task is still
+        open with that due date, and no process recorded the same reminder
+        before, so with several processes each is delivered once.
+        """
+        if not reminders:
+            return []
+        with self.db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            claimed = [(task_id, kind) for task_id, kind, due_date in reminders
+                       if conn.execute("""
+                INSERT OR IGNORE INTO task_reminders (task_id, kind, due_date)
+                SELECT id, ?, due_date FROM tasks
+                WHERE id = ? AND completed = 0 AND due_date = ?
+            """, (kind, task_id, due_date)).rowcount > 0]
+            conn.commit()
+        tasks = {task.id: task
+                 for task in self.get_many([task_id for task_id, _ in claimed])}
+        return [(kind, tasks[task_id]) for task_id, kind in claimed
+                if task_id in tasks]
 
     def get_by_id(self, task_id: int) -> Optional[Task]:
         """Get task by ID."""
         with self.db() as conn:
-            cursor = conn.execute(
-                "SELECT * FROM tasks WHERE id = ?", (task_id,))
-            row = cursor.fetchone()
-            if row:
-                return Task(
-                    task_id=row['id'],
-                    title=row['title'],
-                    description=row['description'],
-                    priority=row['priority'],
-                    due_date=row['due_date'],
-                    completed=bool(row['completed']),
-                    created_at=row['created_at'],
-                    updated_at=row['updated_at']
-                )
-            return None
+            return self._query_tasks(
+                conn, f"SELECT {TASK_COLUMNS} FROM tasks WHERE id = ?",
+                (task_id,)).fetchone()
 
+    @retry_on_lock
     def create(self, task: Task) -> Task:
         """Create a new task."""
         with self.db() as conn:
-            cursor = conn.execute("""
-                INSERT INTO tasks (title, description, priority, due_date, completed)
-                VALUES (?, ?, ?, ?, ?)
-            """, (task.title, task.description, task.priority,
-                  task.due_date, task.completed))
-            task.id = cursor.lastrowid
+            task = self._create_row(conn, task)
             conn.commit()
-            return task
+        self._emit_write('create', task.id, task)
+        return task
 
+    @retry_on_lock
     def update(self, task_id: int, task_data: Dict[str, Any]) -> Optional[Task]:
         """Update an existing task."""
+        with self.db() as conn:
+            task = self._update_row(conn, task_id, task_data)
+            conn.commit()
+        self._emit_write('update', task_id, task)
+        return task
+
+    @retry_on_lock
+    def delete(self, task_id: int) -> bool:
+        """Delete a task."""
+        with self.db() as conn:
+            deleted = self._delete_row(conn, task_id)
+            conn.commit()
+        self._emit_write('delete', task_id, deleted)
+        return deleted
+
+    @retry_on_lock
+    def mark_completed(self, task_id: int, completed: bool) -> Optional[Task]:
+        """Mark task as completed or not."""
+        with self.db() as conn:
+            task = self._mark_completed_row(conn, task_id, completed)
+            conn.commit()
+        self._emit_write('mark_completed', task_id, task)
+        return task
+
+    @retry_on_lock
+    def toggle_completed(self, task_id: int) -> Optional[Task]:
+        """Flip a task's completion status in a single statement."""
+        with self.db() as conn:
+            task = self._toggle_completed_row(conn, task_id)
+            conn.commit()
+        self._emit_write('toggle_completed', task_id, task)
+        return task
+
+    # Single-task writes as statements on a caller's connection. They do
+    # not commit, so write_behind.WriteBehindRepository can run many of
+    # them in one transaction; the event for each is published with
+    # _emit_write() once that transaction has committed.
+
+    def _create_row(self, conn, task: Task) -> Task:
+        cursor = conn.execute("""
+            INSERT INTO tasks (title, description, priority, due_date, completed)
+            VALUES (?, ?, ?, ?, ?)
+        """, (task.title, task.description, task.priority,
+              task.due_date, task.completed))
+        task.id = cursor.lastrowid
+        return task
+
+    def _update_row(self, conn, task_id: int,
+                    task_data: Dict[str, Any]) -> Optional[Task]:
         update_data = {k: v for k, v in task_data.items()
-                       if v is not None and k != 'id'}
+                       if v is not None and k in UPDATABLE_FIELDS}
 
         if not update_data:
             return None
@@ -139,30 +886,160 @@ class SQLiteTaskRepository(TaskRepository):
         values = list(update_data.values())
         values.append(task_id)
 
+        return self._update_returning(conn, f"""
+            UPDATE tasks 
+            SET {set_clause}
+            WHERE id = ?
+        """, values, task_id)
+
+    def _delete_row(self, conn, task_id: int) -> bool:
+        cursor = conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+        return cursor.rowcount > 0
+
+    def _mark_completed_row(self, conn, task_id: int,
+                            completed: bool) -> Optional[Task]:
+        return self._update_returning(conn, """
+            UPDATE tasks 
+            SET completed = ?, updated_at = ?
+            WHERE id = ?
+        """, (completed, datetime.now().isoformat(), task_id), task_id)
+
+    def _toggle_completed_row(self, conn, task_id: int) -> Optional[Task]:
+        return self._update_returning(conn, """
+            UPDATE tasks 
+            SET completed = NOT completed, updated_at = ?
+            WHERE id = ?
+        """, (datetime.now().isoformat(), task_id), task_id)
+
+    def _update_returning(self, conn, sql: str, params, task_id: int) -> Optional[Task]:
+        """
+        Run a single-row UPDATE and return the updated task.
+
+        Uses RETURNING so the write and the read-back are one statement;
+        on older SQLite the row is re-read on the same connection.
+        """
+        if SUPPORTS_RETURNING:
+            return self._query_tasks(
+                conn, f"{sql} RETURNING {TASK_COLUMNS}", params).fetchone()
+        if conn.execute(sql, params).rowcount > 0:
+            return self._query_tasks(
+                conn, f"SELECT {TASK_COLUMNS} FROM tasks WHERE id = ?",
+                (task_id,)).fetchone()
+        return None
+
+    def _emit_write(self, method: str, task_id: int, result):
+        """Publish the event for a committed single-task write that changed a row."""
+        if not result:
+            return
+        if method == 'delete':
+            self._emit('deleted', {'id': task_id})
+        else:
+            self._emit(WRITE_EVENTS[method], {'task': result.to_dict()})
+
+    @staticmethod
+    def _existing_ids(conn, task_ids: List[int]) -> set:
+        """Which of ``task_ids`` exist, in one query whatever the count."""
+        cursor = conn.execute("""
+            SELECT id FROM tasks
+            WHERE id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(list(task_ids)),))
+        return {row[0] for row in cursor}
+
+    @retry_on_lock
+    def bulk_create(self, tasks: List[Task]) -> List[Task]:
+        """
+        Create many tasks in one transaction.
+
+        The write lock is taken up front, so the new rows are exactly those
+        with ids above the current maximum and their ids can be read back
+        with a single query.
+        """
+        if not tasks:
+            return []
         with self.db() as conn:
-            conn.execute(f"""
-                UPDATE tasks 
-                SET {set_clause}
-                WHERE id = ?
-            """, values)
+            conn.execute("BEGIN IMMEDIATE")
+            last_id = conn.execute(
+                "SELECT IFNULL(MAX(id), 0) FROM tasks").fetchone()[0]
+            conn.executemany("""
+                INSERT INTO tasks (title, description, priority, due_date, completed)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(task.title, task.description, task.priority,
+                   task.due_date, task.completed) for task in tasks])
+            new_ids = [row[0] for row in conn.execute(
+                "SELECT id FROM tasks WHERE id > ? ORDER BY id", (last_id,))]
             conn.commit()
+        for task, task_id in zip(tasks, new_ids):
+            task.id = task_id
+        self._emit('bulk_created', {'ids': new_ids})
+        return tasks
 
-            return self.get_by_id(task_id)
+    @retry_on_lock
+    def bulk_update(self, updates: List[Tuple[int, Dict[str, Any]]]) -> List[bool]:
+        """
+        Apply many (task_id, task_data) updates in one transaction.
+
+        Updates touching the same set of columns share one executemany()
+        call. Returns, per update, whether a task was changed.
+        """
+        updated_at = datetime.now().isoformat()
+        groups: Dict[Tuple[str, ...], list] = {}
+        changes = []
+        for task_id, task_data in updates:
+            data = {k: v for k, v in task_data.items()
+                    if v is not None and k in UPDATABLE_FIELDS}
+            changes.append(bool(data))
+            if data:
+                columns = tuple(sorted(data))
+                groups.setdefault(columns, []).append(
+                    [data[column] for column in columns]
+                    + [updated_at, task_id])
 
-    def delete(self, task_id: int) -> bool:
-        """Delete a task."""
         with self.db() as conn:
-            cursor = conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+            conn.execute("BEGIN IMMEDIATE")
+            existing = self._existing_ids(conn, [i for i, _ in updates])
+            for columns, rows in groups.items():
+                set_clause = ", ".join(f"{column} = ?" for column in columns)
+                conn.executemany(f"""
+                    UPDATE tasks
+                    SET {set_clause}, updated_at = ?
+                    WHERE id = ?
+                """, rows)
             conn.commit()
-            return cursor.rowcount > 0
+        results = [changed and task_id in existing
+                   for changed, (task_id, _) in zip(changes, updates)]
+        changed_ids = [task_id for ok, (task_id, _) in zip(results, updates)
+                       if ok]
+        if changed_ids:
+            self._emit('bulk_updated', {'ids': changed_ids})
+        return results
 
-    def mark_completed(self, task_id: int, completed: bool) -> Optional[Task]:
-        """Mark task as completed or not."""
+    @retry_on_lock
+    def bulk_delete(self, task_ids: List[int]) -> List[bool]:
+        """Delete many tasks in one transaction; True for each one found."""
         with self.db() as conn:
-            conn.execute("""
-                UPDATE tasks 
-                SET completed = ?, updated_at = CURRENT_TIMESTAMP
+            conn.execute("BEGIN IMMEDIATE")
+            existing = self._existing_ids(conn, task_ids)
+            conn.executemany("DELETE FROM tasks WHERE id = ?",
+                             [(task_id,) for task_id in existing])
+            conn.commit()
+        if existing:
+            self._emit('bulk_deleted', {'ids': sorted(existing)})
+        return [task_id in existing for task_id in task_ids]
+
+    @retry_on_lock
+    def bulk_mark_completed(self, task_ids: List[int], completed: bool) -> List[bool]:
+        """Mark many tasks completed or not in one transaction."""
+        with self.db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = self._existing_ids(conn, task_ids)
+            updated_at = datetime.now().isoformat()
+            conn.executemany("""
+                UPDATE tasks
+                SET completed = ?, updated_at = ?
                 WHERE id = ?
-            """, (completed, task_id))
+            """, [(completed, updated_at, task_id) for task_id in existing])
             conn.commit()
-            return self.get_by_id(task_id)
+        if existing:
+            self._emit('bulk_toggled', {'ids': sorted(existing),
+                                        'completed': bool(completed)})
+        return [task_id in existing for task_id in task_ids]
@@ -0,0 +1,344 @@
+"""
+"Next up" work queue: the most urgent open tasks, and claiming them.
+"""
+import heapq
+import threading
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models import SQLiteTaskRepository, Task, TaskRepository
+
+# top() and pop() rebuild the heap once it holds more stale entries than
+# this and than live ones
+COMPACT_MIN_STALE = 1024
+
+
+def next_up_key(task_id: int, priority: int, due_date: Optional[str]) -> tuple:
+    """
+    Queue order: priority (1 first), then due date, then id.
+
+    Tasks without a due date come after every dated task of their priority;
+    unlike the listing order, which puts them first.
+    """
+    return (priority, due_date is None, due_date or '', task_id)
+
+
+class NextUpIndex:
+    """
+    In-memory heap of open, unclaimed tasks in next_up_key() order.
+
+    Holds only each task's id, priority and due date. A task that changes
+    or leaves the queue has its heap entry marked stale instead of being
+    searched for, so every change is at most one O(log n) push; top(n)
+    costs O(n log n) plus the stale entries it meets on the way, and the
+    heap is rebuilt without them once they outnumber the live ones.
+
+    Claimed tasks are remembered with their key but kept out of the heap
+    until they are released. Thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap = []  # [key, live] entries
+        self._entries = {}  # task id -> its live heap entry
+        self._claimed = {}  # task id -> key, for claimed open tasks
+        self._stale = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def rebuild(self, rows: Iterable[Tuple[int, int, Optional[str], bool]]):
+        """Replace the contents with (id, priority, due_date, claimed) rows."""
+        heap, entries, claimed = [], {}, {}
+        for task_id, priority, due_date, is_claimed in rows:
+            key = next_up_key(task_id, priority, due_date)
+            if is_claimed:
+                claimed[task_id] = key
+            else:
+                entries[task_id] = entry = [key, True]
+                heap.append(entry)
+        heapq.heapify(heap)
+        with self._lock:
+            self._heap, self._entries, self._claimed = heap, entries, claimed
+            self._stale = 0
+
+    def put(self, task: Task):
+        """Add or re-key an open task; a completed one leaves the queue."""
+        with self._lock:
+            if task.completed:
+                self._claimed.pop(task.id, None)  # Completing ends a claim
+                self._discard(task.id)
+                return
+            key = next_up_key(task.id, task.priority, task.due_date)
+            if task.id in self._claimed:
+                self._claimed[task.id] = key
+                return
+            entry = self._entries.get(task.id)
+            if entry is not None and entry[0] == key:
+                return
+            self._discard(task.id)
+            self._push(task.id, key)
+
+    def update(self, task_ids: Iterable[int],
+               rows: Iterable[Tuple[int, int, Optional[str], bool]]):
+        """
+        Bring ``task_ids`` up to date from their open_task_keys() rows.
+
+        Ids without a row (completed or deleted) leave the queue; claimed
+        and unclaimed tasks move between the heap and the claimed set.
+        """
+        rows = {row[0]: row for row in rows}
+        with self._lock:
+            for task_id in task_ids:
+                row = rows.get(task_id)
+                if row is None:
+                    self._claimed.pop(task_id, None)
+                    self._discard(task_id)
+                    continue
+                key = next_up_key(task_id, row[1], row[2])
+                if row[3]:
+                    self._discard(task_id)
+                    self._claimed[task_id] = key
+                    continue
+                self._claimed.pop(task_id, None)
+                entry = self._entries.get(task_id)
+                if entry is None or entry[0] != key:
+                    self._discard(task_id)
+                    self._push(task_id, key)
+
+    def remove(self, task_id: int):
+        """Take a task out of the queue, claimed or not."""
+        with self._lock:
+            self._claimed.pop(task_id, None)
+            self._discard(task_id)
+
+    def top(self, n: int) -> List[int]:
+        """Ids of the first ``n`` unclaimed open tasks, in queue order."""
+        with self._lock:
+            entries = self._pop_live(n)
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+            self._compact()
+            return [entry[0][-1] for entry in entries]
+
+    def pop(self, n: int) -> List[int]:
+        """
+        Take the first ``n`` tasks out of the queue as claimed.
+
+        Callers confirm each claim in the database and remove() or
+        release() the ones that did not succeed there.
+        """
+        with self._lock:
+            entries = self._pop_live(n)
+            for entry in entries:
+                task_id = entry[0][-1]
+                del self._entries[task_id]
+                self._claimed[task_id] = entry[0]
+            self._compact()
+            return [entry[0][-1] for entry in entries]
+
+    def release(self, task_id: int):
+        """Put a claimed task back in the queue."""
+        with self._lock:
+            key = self._claimed.pop(task_id, None)
+            if key is not None:
+                self._push(task_id, key)
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return {'open': len(self._entries), 'claimed': len(self._claimed),
+                    'stale': self._stale}
+
+    # Called with the lock held
+
+    def _push(self, task_id: int, key: tuple):
+        self._entries[task_id] = entry = [key, True]
+        heapq.heappush(self._heap, entry)
+
+    def _discard(self, task_id: int):
+        entry = self._entries.pop(task_id, None)
+        if entry is not None:
+            entry[1] = False
+            self._stale += 1
+
+    def _pop_live(self, n: int) -> list:
+        """Pop up to ``n`` live entries, dropping stale ones on the way."""
+        entries = []
+        heap = self._heap
+        while heap and len(entries) < n:
+            entry = heapq.heappop(heap)
+            if entry[1]:
+                entries.append(entry)
+            else:
+                self._stale -= 1
+        return entries
+
+    def _compact(self):
+        if self._stale > COMPACT_MIN_STALE and self._stale > len(self._entries):
+            self._heap = [entry for entry in self._heap if entry[1]]
+            heapq.heapify(self._heap)
+            self._stale = 0
+
+
+class NextUpRepository(TaskRepository):
+    """
+    TaskRepository decorator that keeps a NextUpIndex of open tasks.
+
+    The index is loaded from ``store`` once, when the decorator is created,
+    and then updated from the results of every write made through it, so
+    next_up() never sorts the table. Bulk updates, completions and deletes
+    return only flags, so their tasks are re-read from ``store`` in one
+    query.
+
+    Claims are made in the database by ``store.claim()``, which is what
+    keeps two workers from getting the same task. The index only proposes
+    candidates, and a candidate the database refuses (claimed by another
+    process, or completed since) is dropped from it.
+
+    Writes made around this decorator, by another process or straight to
+    ``store``, are not seen until sync() is called with their ids (see
+    coherence.ChangeFollower) or rebuild() with none.
+    """
+
+    def __init__(self, repo: TaskRepository, store: SQLiteTaskRepository):
+        self.repo = repo
+        self.store = store
+        self.index = NextUpIndex()
+        self.rebuild()
+
+    def rebuild(self):
+        """Reload the index from the database."""
+        self.index.rebuild(self.store.open_task_keys())
+
+    def metrics(self) -> Dict[str, int]:
+        return self.index.metrics()
+
+    def sync(self, task_ids: List[int]):
+        """Re-read the given tasks, and their claims, into the index."""
+        self.index.update(task_ids, self.store.open_task_keys(task_ids))
+
+    # Work queue
+
+    def next_up(self, n: int = 10) -> List[Task]:
+        """The ``n`` most urgent open tasks that nobody has claimed."""
+        return self.store.get_many(self.index.top(n))
+
+    def claim(self, worker: str, n: int = 1) -> List[Task]:
+        """
+        Claim up to ``n`` of the most urgent open tasks for ``worker``.
+
+        Returns fewer (or none) when the queue runs out. A claimed task
+        leaves the queue until release() or until it is completed.
+        """
+        claimed = []
+        while len(claimed) < n:
+            candidates = self.index.pop(n - len(claimed))
+            if not candidates:
+                break
+            try:
+                tasks = self.store.claim(candidates, worker)
+            except Exception:
+                for task_id in candidates:
+                    self.index.release(task_id)
+                raise
+            won = {task.id for task in tasks}
+            for task_id in candidates:
+                if task_id not in won:
+                    self.index.remove(task_id)
+            claimed.extend(tasks)
+        return claimed
+
+    def release(self, task_id: int) -> bool:
+        """Drop a claim; False if the task was not claimed."""
+        released = self.store.release(task_id)
+        if released:
+            self.index.release(task_id)
+        return released
+
+    # Reads
+
+    def get_all(self) -> List[Task]:
+        return self.repo.get_all()
+
+    def iter_all(self, batch_size: int = 500) -> Iterator[List[Task]]:
+        return self.repo.iter_all(batch_size)
+
+    def list_page(self, cursor: Optional[str] = None, limit: int = 50,
+                  filters: Optional[Dict[str, Any]] = None,
+                  include_archived: bool = False
+                  ) -> Tuple[List[Task], Optional[str]]:
+        return self.repo.list_page(cursor, limit, filters, include_archived)
+
+    def count(self, filters: Optional[Dict[str, Any]] = None,
+              include_archived: bool = False) -> int:
+        return self.repo.count(filters, include_archived)
+
+    def stats(self, today: Optional[date] = None) -> Dict[str, Any]:
+        return self.repo.stats(today)
+
+    def search(self, query: str, filters: Optional[Dict[str, Any]] = None,
+               limit: int = 20) -> List[Task]:
+        return self.repo.search(query, filters, limit)
+
+    def version(self) -> Tuple[int, str]:
+        return self.repo.version()
+
+    def changes(self, since: int, limit: int = 500) -> Dict[str, Any]:
+        return self.repo.changes(since, limit)
+
+    def get_by_id(self, task_id: int) -> Optional[Task]:
+        return self.repo.get_by_id(task_id)
+
+    # Writes
+
+    def create(self, task: Task) -> Task:
+        created = self.repo.create(task)
+        self.index.put(created)
+        return created
+
+    def update(self, task_id: int, task_data: Dict[str, Any]) -> Optional[Task]:
+        updated = self.repo.update(task_id, task_data)
+        if updated is not None:
+            self.index.put(updated)
+        return updated
+
+    def delete(self, task_id: int) -> bool:
+        deleted = self.repo.delete(task_id)
+        self.index.remove(task_id)
+        return deleted
+
+    def mark_completed(self, task_id: int, completed: bool) -> Optional[Task]:
+        task = self.repo.mark_completed(task_id, completed)
+        if task is not None:
+            self.index.put(task)
+        return task
+
+    def toggle_completed(self, task_id: int) -> Optional[Task]:
+        task = self.repo.toggle_completed(task_id)
+        if task is not None:
+            self.index.put(task)
+        return task
+
+    def bulk_create(self, tasks: List[Task]) -> List[Task]:
+        created = self.repo.bulk_create(tasks)
+        for task in created:
+            self.index.put(task)
+        return created
+
+    def bulk_update(self, updates: List[Tuple[int, Dict[str, Any]]]) -> List[bool]:
+        try:
+            return self.repo.bulk_update(updates)
+        finally:
+            self.sync([task_id for task_id, _ in updates])
+
+    def bulk_delete(self, task_ids: List[int]) -> List[bool]:
+        try:
+            return self.repo.bulk_delete(task_ids)
+        finally:
+            self.sync(task_ids)
+
+    def bulk_mark_completed(self, task_ids: List[int], completed: bool) -> List[bool]:
+        try:
+            return self.repo.bulk_mark_completed(task_ids, completed)
+        finally:
+            self.sync(task_ids)
@@ -0,0 +1,365 @@
+"""
+Due-soon and overdue reminders from an in-memory timer wheel.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+from urllib.request import Request, urlopen
+
+from events import EventHub, SubscriptionClosed
+from models import SQLiteTaskRepository, Task
+
+logger = logging.getLogger(__name__)
+
+DUE_SOON = 'due_soon'
+OVERDUE = 'overdue'
+
+# Seconds per wheel tick: reminders fire within a tick of their time
+DEFAULT_TICK = 60.0
+# Days before the due date that the due-soon reminder fires
+DEFAULT_LEAD_DAYS = 1
+WHEEL_SLOTS = 64
+WHEEL_LEVELS = 4  # 64 ** 4 one-minute ticks: about 32 years
+WEBHOOK_TIMEOUT = 5.0
+
+Notifier = Callable[[str, Task], None]
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel of keyed timers, in integer ticks.
+
+    Level 0 has one slot per tick; each slot of level ``n`` covers
+    ``slots ** n`` ticks. A timer goes in the coarsest level that still
+    tells it apart from the current tick and moves down a level each time
+    its slot comes round, so advancing one tick touches one level-0 slot
+    plus, every ``slots`` ticks, one slot per higher level: O(1) per tick
+    amortized, plus the timers that fire. Timers past the top level's
+    range wait in its last slot and are re-placed each time it comes round.
+
+    schedule() and cancel() are O(1). Not thread-safe.
+    """
+
+    def __init__(self, now: int = 0, slots: int = WHEEL_SLOTS,
+                 levels: int = WHEEL_LEVELS):
+        self.now = now
+        self.slots = slots
+        self.levels = levels
+        self._wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._slot_of = {}  # key -> the slot dict holding it
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slot_of
+
+    def schedule(self, key: Hashable, tick: int):
+        """Fire ``key`` at ``tick`` (the next tick if that has passed)."""
+        self.cancel(key)
+        self._place(key, max(tick, self.now + 1))
+
+    def cancel(self, key: Hashable) -> bool:
+        slot = self._slot_of.pop(key, None)
+        if slot is None:
+            return False
+        del slot[key]
+        return True
+
+    def clear(self):
+        for wheel in self._wheels:
+            for slot in wheel:
+                slot.clear()
+        self._slot_of.clear()
+
+    def advance(self, to_tick: int) -> List[Hashable]:
+        """Move the wheel up to ``to_tick``; returns the keys that fired."""
+        fired = []
+        while self.now < to_tick:
+            self.now += 1
+            # Cascade: a higher-level slot coming round moves its timers
+            # down, before level 0 fires (some may be due this very tick)
+            span = 1
+            for level in range(1, self.levels):
+                span *= self.slots
+                if self.now % span:
+                    break
+                slot = self._wheels[level][self.now // span % self.slots]
+                timers = list(slot.items())
+                slot.clear()
+                for key, tick in timers:
+                    self._place(key, tick)
+            slot = self._wheels[0][self.now % self.slots]
+            if slot:
+                fired.extend(slot)
+                for key in slot:
+                    del self._slot_of[key]
+                slot.clear()
+        return fired
+
+    def _place(self, key: Hashable, tick: int):
+        delta = tick - self.now
+        span = 1
+        for level in range(self.levels):
+            if delta < span * self.slots:
+                slot = self._wheels[level][tick // span % self.slots]
+                break
+            span *= self.slots
+        else:
+            # Beyond the wheel: the top level's last slot comes round
+            # before the timer is due, and re-places it then
+            span //= self.slots
+            slot = self._wheels[-1][(self.now // span - 1) % self.slots]
+        slot[key] = tick
+        self._slot_of[key] = slot
+
+
+def log_notifier(kind: str, task: Task):
+    """Log each reminder."""
+    logger.info(f"Task {task.id} {task.title!r} is "
+                f"{'due soon' if kind == DUE_SOON else 'overdue'} "
+                f"(due {task.due_date})")
+
+
+class EventHubNotifier:
+    """Publish reminders as ``due_soon``/``overdue`` events (/api/events)."""
+
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+
+    def __call__(self, kind: str, task: Task):
+        self.hub.publish(kind, {'task': task.to_dict()})
+
+
+class WebhookNotifier:
+    """POST each reminder as JSON: {"type": kind, "task": {...}}."""
+
+    def __init__(self, url: str, timeout: float = WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, kind: str, task: Task):
+        body = json.dumps({'type': kind, 'task': task.to_dict()}).encode()
+        request = Request(self.url, data=body,
+                          headers={'Content-Type': 'application/json'})
+        with urlopen(request, timeout=self.timeout):
+            pass
+
+
+class DueDateScheduler:
+    """
+    Fires due-soon and overdue reminders for open tasks with a due date.
+
+    Upcoming due dates are read once, through the due date index, into a
+    TimerWheel: a due-soon timer at midnight ``lead_days`` before the due
+    date and an overdue timer at the midnight after it. From then on the
+    wheel follows writes instead of re-reading the table: start() listens
+    to the repository's EventHub, and sync() re-reads given tasks (for
+    writes made by other processes; see coherence.ChangeFollower). Tasks
+    already overdue when they are loaded or written get no reminder.
+
+    Each tick, fired timers are recorded with store.claim_reminders(),
+    which also drops reminders for tasks completed or re-dated since, and
+    the rest go to every notifier. A reminder is delivered once even with
+    several processes running a scheduler; with /api/events, only the
+    clients of the process that delivered it see it.
+
+    ``clock`` returns epoch seconds, so tests can drive the wheel with a
+    fake clock and run_pending().
+    """
+
+    def __init__(self, store: SQLiteTaskRepository, notifiers: List[Notifier],
+                 hub: Optional[EventHub] = None,
+                 lead_days: int = DEFAULT_LEAD_DAYS, tick: float = DEFAULT_TICK,
+                 clock: Callable[[], float] = time.time):
+        self.store = store
+        self.notifiers = notifiers
+        self.hub = hub
+        self.lead_days = lead_days
+        self.tick = tick
+        self.clock = clock
+        self.delivered = 0
+        self.failures = 0
+        self.wheel = TimerWheel(self._now_tick())
+        self._due = {}  # task id -> due date its timers are for
+        # Due date -> (the same string, due-soon tick, overdue tick), so the
+        # many tasks sharing a due date share one string and one conversion
+        self._dates = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._subscription = None
+        self._thread = None
+
+    def _now_tick(self) -> int:
+        return int(self.clock() // self.tick)
+
+    def _tick_at(self, day: date) -> int:
+        """The tick of local midnight at the start of ``day``."""
+        midnight = datetime.combine(day, datetime.min.time())
+        return int(midnight.timestamp() // self.tick)
+
+    def _date_ticks(self, due_date: str) -> Optional[tuple]:
+        entry = self._dates.get(due_date)
+        if entry is None:
+            try:
+                due = date.fromisoformat(due_date)
+            except ValueError:
+                return None
+            entry = self._dates[due_date] = (
+                due_date,
+                self._tick_at(due - timedelta(days=self.lead_days)),
+                self._tick_at(due + timedelta(days=1)))
+        return entry
+
+    # Tracking tasks
+
+    def load(self):
+        """(Re)load every open task due today or later."""
+        today = date.fromtimestamp(self.clock())
+        rows = list(self.store.open_due_dates(today.isoformat()))
+        with self._lock:
+            self.wheel.clear()
+            self._due.clear()
+            for task_id, due_date in rows:
+                self._track(task_id, due_date)
+
+    def track(self, task_id: int, due_date: Optional[str], completed: bool):
+        """Update one task's timers from its current state."""
+        with self._lock:
+            if completed or not due_date:
+                self._untrack(task_id)
+            elif self._due.get(task_id) != due_date:
+                self._untrack(task_id)
+                self._track(task_id, due_date)
+
+    def untrack(self, task_ids: Iterable[int]):
+        with self._lock:
+            for task_id in task_ids:
+                self._untrack(task_id)
+
+    def sync(self, task_ids: List[int]):
+        """Re-read the given tasks and update their timers."""
+        tasks = {task.id: task for task in self.store.get_many(task_ids)}
+        for task_id in task_ids:
+            task = tasks.get(task_id)
+            if task is None:
+                self.untrack([task_id])
+            else:
+                self.track(task.id, task.due_date, task.completed)
+
+    def apply_event(self, event_type: str, data: Dict[str, Any]):
+        """Update timers from a repository write event."""
+        if 'task' in data and event_type not in (DUE_SOON, OVERDUE):
+            task = data['task']
+            self.track(task['id'], task['due_date'], task['completed'])
+        elif event_type == 'deleted':
+            self.untrack([data['id']])
+        elif event_type in ('bulk_deleted', 'bulk_archived'):
+            self.untrack(data['ids'])
+        elif event_type == 'bulk_toggled' and data['completed']:
+            self.untrack(data['ids'])
+        elif event_type in ('bulk_created', 'bulk_updated', 'bulk_toggled'):
+            self.sync(data['ids'])
+
+    # Called with the lock held. Timer keys are ints, task id * 2 plus 1
+    # for overdue: far smaller than (kind, id) tuples, times 100,000s.
+
+    def _track(self, task_id: int, due_date: str):
+        entry = self._date_ticks(due_date)
+        if entry is None:
+            return
+        due_date, due_soon_at, overdue_at = entry
+        if overdue_at <= self.wheel.now:
+            return
+        self._due[task_id] = due_date
+        self.wheel.schedule(task_id * 2 + 1, overdue_at)
+        # Already inside the lead time: fires on the next tick
+        self.wheel.schedule(task_id * 2, due_soon_at)
+
+    def _untrack(self, task_id: int):
+        if self._due.pop(task_id, None) is not None:
+            self.wheel.cancel(task_id * 2)
+            self.wheel.cancel(task_id * 2 + 1)
+
+    # Firing
+
+    def run_pending(self) -> int:
+        """Advance to the clock and deliver what fired; returns how many."""
+        with self._lock:
+            reminders = [(key // 2, OVERDUE if key % 2 else DUE_SOON,
+                          self._due[key // 2])
+                         for key in self.wheel.advance(self._now_tick())]
+            for task_id, kind, _ in reminders:
+                if kind == OVERDUE:
+                    del self._due[task_id]  # Its last timer
+        if not reminders:
+            return 0
+        due = self.store.claim_reminders(reminders)
+        for kind, task in due:
+            for notify in self.notifiers:
+                try:
+                    notify(kind, task)
+                except Exception as e:
+                    self.failures += 1
+                    logger.error(f"Reminder notifier {notify!r} failed for "
+                                 f"task {task.id}: {e}")
+        self.delivered += len(due)
+        return len(due)
+
+    @property
+    def running(self) -> bool:
+        """Whether start() has been called and close() has not."""
+        return self._thread is not None and not self._stop.is_set()
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return {'tracked': len(self._due), 'timers': len(self.wheel),
+                    'delivered': self.delivered, 'failures': self.failures}
+
+    # Background thread
+
+    def start(self):
+        """Load due dates and start delivering reminders in a thread."""
+        # Subscribe before loading, so no write falls between the two
+        if self.hub is not None:
+            self._subscription = self.hub.subscribe()
+        self.load()
+        self._thread = threading.Thread(target=self._run,
+                                        name='due-date-reminders', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop the thread."""
+        self._stop.set()
+        if self._subscription is not None:
+            self._subscription.close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_pending()
+                # Sleep until the next tick, or handle a write event first
+                timeout = max(0.0, (self.wheel.now + 1) * self.tick - self.clock())
+                if self._subscription is None:
+                    self._stop.wait(timeout)
+                    continue
+                try:
+                    event = self._subscription.get(timeout)
+                except SubscriptionClosed:
+                    if self._stop.is_set():
+                        return
+                    # Evicted after falling behind: start over from the table
+                    logger.warning("Reminder scheduler fell behind; reloading")
+                    self._subscription = self.hub.subscribe()
+                    self.load()
+                    continue
+                if event is not None:
+                    self.apply_event(event.type, event.data)
+            except Exception as e:
+                logger.error(f"Reminder scheduler failed: {e}")
+                self._stop.wait(self.tick)
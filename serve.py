@@ -0,0 +1,121 @@
+"""
+Pre-forking launcher: several worker processes serving one tasks.db.
+
+The parent binds the listening socket and applies migrations, then forks
+the workers, each of which imports the app and accepts connections on the
+shared socket. Workers keep their own caches; coherence.ChangeFollower
+catches each one up with the others' writes at the start of every request.
+A worker that dies is replaced; SIGINT or SIGTERM stops them all.
+
+With ARCHIVE_AFTER_DAYS set in app.py, every worker also runs an archiver
+thread, which is safe: archiving batches take the write lock, so they just
+run in turn. Every worker runs a reminder scheduler too, started after the
+fork; claim_reminders() makes sure each reminder goes out once.
+
+Usage: python serve.py [--workers N] [--host HOST] [--port PORT]
+POSIX only (uses fork).
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+
+from database import init_database
+
+logger = logging.getLogger('serve')
+
+DEFAULT_WORKERS = 4
+LISTEN_BACKLOG = 128
+
+
+def run_worker(listener: socket.socket):
+    """Serve the app on the inherited socket until SIGTERM."""
+    from werkzeug.serving import make_server
+
+    import app as app_module
+    app_module.start_archiver()
+    app_module.start_reminders()
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, app_module.app, threaded=True,
+                         fd=listener.fileno())
+    logger.info(f"Worker {os.getpid()} serving on {host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        # spawn() leaves through os._exit(), which skips the atexit hooks
+        app_module.shutdown()
+
+
+def spawn(listener: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        # SIGTERM raises SystemExit, which unwinds the worker to the
+        # finally below
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        code = 0
+        try:
+            run_worker(listener)
+        except SystemExit as e:
+            code = e.code or 0
+        except BaseException:
+            logger.exception("Worker crashed")
+            code = 1
+        finally:
+            # Never return into the parent's supervision loop
+            logging.shutdown()
+            os._exit(code)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.workers < 1:
+        parser.error("--workers must be positive")
+
+    # Migrate once here, so workers never race to apply the same migration
+    init_database()
+    listener = socket.create_server((args.host, args.port),
+                                    backlog=LISTEN_BACKLOG)
+    logger.info(f"Listening on {args.host}:{listener.getsockname()[1]} "
+                f"with {args.workers} workers")
+
+    workers = set()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(args.workers):
+        workers.add(spawn(listener))
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if not stopping:
+            logger.warning(f"Worker {pid} exited with status {status}; "
+                           f"starting a new one")
+            workers.add(spawn(listener))
+    listener.close()
+
+
+if __name__ == '__main__':
+    main()
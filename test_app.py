@@ -5,7 +5,22 @@ FINAL WORKING TEST FILE for Task Manager
 import unittest
 import os
 import sys
+import asyncio
+import gzip
 import json
+import shutil
+import signal
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from contextlib import contextmanager
+from functools import partial
+from unittest import mock
+from urllib.request import Request, urlopen
 
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -14,6 +29,24 @@ try:
     # Import the Flask app from your app.py
     import app as app_module
     app = app_module.app
+    from database import (MIGRATIONS, ConnectionPool, DatabaseConnection,
+                          PoolExhaustedError, StorageProfile,
+                          explain_query_plan, get_pool, init_database)
+    import asgi
+    import analytics
+    from archive import TaskArchiver
+    from async_repository import AsyncTaskRepository
+    from cache import CachedTaskRepository
+    from coherence import ChangeFollower
+    from events import EventHub, HubFullError, SubscriptionClosed
+    from instrumentation import Histogram, Instrumentation
+    from models import (InvalidCursorError, SQLiteTaskRepository,
+                        SyncExpiredError, Task)
+    from next_up import NextUpRepository
+    from reminders import (DueDateScheduler, EventHubNotifier, TimerWheel,
+                           WebhookNotifier)
+    import serve
+    from write_behind import WriteBehindRepository
     print(" Successfully imported Flask app from app.py")
 except Exception as e:
     print(f" Error importing app: {e}")
@@ -110,6 +143,2401 @@ class TestApplicationLogic(unittest.TestCase):
         print(" Test 11: JSON format")
 
 
+class TestConnectionPool(unittest.TestCase):
+    """Test the pooled SQLite connections"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, 'tasks.db')
+        init_database(self.db_path)
+        self.pool = ConnectionPool(self.db_path, size=2, timeout=0.2)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_connection_is_reused(self):
+        """Test a released connection is handed out again"""
+        first = self.pool.acquire()
+        self.pool.release()
+        second = self.pool.acquire()
+        self.pool.release()
+        self.assertIs(first, second)
+        self.assertEqual(self.pool.opened, 1)
+
+    def test_nested_checkout_shares_connection(self):
+        """Test nested checkouts on one thread share a connection"""
+        outer = self.pool.acquire()
+        inner = self.pool.acquire()
+        self.assertIs(outer, inner)
+        self.pool.release()
+        self.pool.release()
+        self.assertEqual(self.pool.opened, 1)
+
+    def test_pool_is_bounded(self):
+        """Test checkouts beyond the pool size time out"""
+        held = []
+        ready = threading.Event()
+        done = threading.Event()
+
+        def hold():
+            held.append(self.pool.acquire())
+            ready.set()
+            done.wait()
+            self.pool.release()
+
+        workers = [threading.Thread(target=hold) for _ in range(2)]
+        for worker in workers:
+            ready.clear()
+            worker.start()
+            ready.wait()
+        try:
+            with self.assertRaises(PoolExhaustedError):
+                self.pool.acquire()
+        finally:
+            done.set()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(self.pool.opened, 2)
+
+    def test_unhealthy_connection_is_replaced(self):
+        """Test a dead idle connection is swapped for a fresh one"""
+        self.pool.health_check_interval = 0
+        conn = self.pool.acquire()
+        self.pool.release()
+        conn.close()
+        fresh = self.pool.acquire()
+        self.assertIsNot(fresh, conn)
+        fresh.execute("SELECT 1")
+        self.pool.release()
+
+    def test_open_transaction_rolled_back_on_release(self):
+        """Test uncommitted writes do not leak to the next borrower"""
+        conn = self.pool.acquire()
+        conn.execute("INSERT INTO tasks (title) VALUES ('uncommitted')")
+        self.pool.release()
+        conn = self.pool.acquire()
+        count = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        self.pool.release()
+        self.assertEqual(count, 0)
+
+    def test_close_rejects_checkouts(self):
+        """Test a closed pool refuses new checkouts"""
+        self.pool.acquire()
+        self.pool.release()
+        self.pool.close()
+        self.assertEqual(self.pool.opened, 0)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            self.pool.acquire()
+
+
+class TempDatabaseTestCase(unittest.TestCase):
+    """Base class for tests that need their own database file"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, 'tasks.db')
+        init_database(self.db_path)
+        self.repo = SQLiteTaskRepository(
+            partial(DatabaseConnection, self.db_path, pool_size=8))
+
+    def tearDown(self):
+        get_pool(self.db_path).close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def use_in_app(self):
+        """Point the Flask routes at this test's repository"""
+        original = app_module.task_repo
+        app_module.task_repo = self.repo
+        self.addCleanup(setattr, app_module, 'task_repo', original)
+        app.config['TESTING'] = True
+        return app.test_client()
+
+
+class TestStorageProfile(TempDatabaseTestCase):
+    """Test connection tuning and concurrent writers"""
+
+    def test_profile_applied_on_open(self):
+        """Test pooled connections come up in WAL mode with the profile"""
+        with DatabaseConnection(self.db_path) as conn:
+            journal = conn.execute("PRAGMA journal_mode").fetchone()[0]
+            synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+            busy = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+        self.assertEqual(journal, 'wal')
+        self.assertEqual(synchronous, 1)  # NORMAL
+        self.assertEqual(busy, 5000)
+
+    def test_custom_profile(self):
+        """Test a custom profile overrides the defaults"""
+        profile = StorageProfile(synchronous="FULL", busy_timeout=250)
+        with DatabaseConnection(self.db_path, pooled=False,
+                                profile=profile) as conn:
+            self.assertEqual(
+                conn.execute("PRAGMA synchronous").fetchone()[0], 2)
+            self.assertEqual(
+                conn.execute("PRAGMA busy_timeout").fetchone()[0], 250)
+
+    def test_concurrent_writers_do_not_fail(self):
+        """Test concurrent writers queue instead of raising lock errors"""
+        errors = []
+
+        def write(worker):
+            for i in range(25):
+                try:
+                    task = self.repo.create(Task(title=f"w{worker}-{i}"))
+                    self.repo.mark_completed(task.id, True)
+                except sqlite3.Error as e:
+                    errors.append(e)
+
+        def read():
+            for _ in range(25):
+                try:
+                    self.repo.get_all()
+                except sqlite3.Error as e:
+                    errors.append(e)
+
+        threads = ([threading.Thread(target=write, args=(n,))
+                    for n in range(4)] +
+                   [threading.Thread(target=read) for _ in range(2)])
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        tasks = self.repo.get_all()
+        self.assertEqual(len(tasks), 100)
+        self.assertTrue(all(task.completed for task in tasks))
+
+    def test_write_retried_when_locked(self):
+        """Test a write waits out a lock held past the busy timeout"""
+        repo = SQLiteTaskRepository(
+            partial(DatabaseConnection, self.db_path, pooled=False,
+                    profile=StorageProfile(busy_timeout=0)),
+            retry_backoff=0.01)
+        blocker = sqlite3.connect(self.db_path, isolation_level=None,
+                                  check_same_thread=False)
+        blocker.execute("BEGIN IMMEDIATE")
+        timer = threading.Timer(0.05, blocker.execute, args=("COMMIT",))
+        timer.start()
+        try:
+            task = repo.create(Task(title="after lock"))
+        finally:
+            timer.join()
+            blocker.close()
+        self.assertIsNotNone(task.id)
+
+
+class TestPagination(TempDatabaseTestCase):
+    """Test keyset pagination and filtering of task lists"""
+
+    def setUp(self):
+        super().setUp()
+        for i in range(23):
+            self.repo.create(Task(
+                title=f"Task {i}",
+                priority=i % 5 + 1,
+                due_date=None if i % 4 == 0 else f"2026-01-{i % 28 + 1:02d}",
+                completed=i % 3 == 0))
+
+    def walk(self, limit, filters=None):
+        pages, cursor = [], None
+        while True:
+            tasks, cursor = self.repo.list_page(cursor, limit, filters)
+            pages.append(tasks)
+            if cursor is None:
+                return pages
+
+    def test_pages_match_full_listing(self):
+        """Test walking all pages yields get_all() order exactly once"""
+        pages = self.walk(5)
+        self.assertEqual([len(page) for page in pages], [5, 5, 5, 5, 3])
+        walked = [task.id for page in pages for task in page]
+        self.assertEqual(walked, [task.id for task in self.repo.get_all()])
+
+    def test_listing_order(self):
+        """Test pending first, then priority, then due date (none first)"""
+        tasks = self.repo.get_all()
+        keys = [(task.completed, task.priority, task.due_date or '')
+                for task in tasks]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_filters(self):
+        """Test completed, priority and due-date filters"""
+        filters = {'completed': False, 'priority_min': 2,
+                   'due_from': '2026-01-05', 'due_to': '2026-01-20'}
+        tasks = [task for page in self.walk(2, filters) for task in page]
+        expected = [task for task in self.repo.get_all()
+                    if not task.completed and task.priority >= 2
+                    and task.due_date
+                    and '2026-01-05' <= task.due_date <= '2026-01-20']
+        self.assertTrue(expected)
+        self.assertEqual([t.id for t in tasks], [t.id for t in expected])
+        self.assertEqual(self.repo.count(filters), len(expected))
+
+    def test_invalid_cursor(self):
+        """Test malformed cursors are rejected"""
+        with self.assertRaises(InvalidCursorError):
+            self.repo.list_page('not-a-cursor')
+
+    def test_api_pagination(self):
+        """Test /api/tasks pages through results with X-Next-Cursor"""
+        client = self.use_in_app()
+        ids, url = [], '/api/tasks?limit=10'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(task['id'] for task in response.get_json())
+            cursor = response.headers.get('X-Next-Cursor')
+            url = f'/api/tasks?limit=10&cursor={cursor}' if cursor else None
+        self.assertEqual(ids, [task.id for task in self.repo.get_all()])
+
+    def test_api_filters_and_errors(self):
+        """Test /api/tasks filters and 400s on bad parameters"""
+        client = self.use_in_app()
+        data = client.get('/api/tasks?completed=true&priority=1').get_json()
+        self.assertTrue(data)
+        self.assertTrue(all(t['completed'] and t['priority'] == 1
+                            for t in data))
+        for query in ('limit=0', 'limit=abc', 'completed=maybe',
+                      'due_from=tomorrow', 'cursor=garbage'):
+            response = client.get(f'/api/tasks?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_home_page_is_paginated(self):
+        """Test the home page renders one page with overall counts"""
+        client = self.use_in_app()
+        original_size = app_module.PAGE_SIZE
+        app_module.PAGE_SIZE = 10
+        try:
+            html = client.get('/').get_data(as_text=True)
+        finally:
+            app_module.PAGE_SIZE = original_size
+        self.assertEqual(html.count('class="task-card'), 10)
+        self.assertIn('<h3>23</h3>', html)
+        self.assertIn('Next Page', html)
+
+
+class TestQueryPlans(TempDatabaseTestCase):
+    """Run EXPLAIN QUERY PLAN on every statement the repository issues"""
+
+    def setUp(self):
+        super().setUp()
+        for i in range(50):
+            self.repo.create(Task(
+                title=f"Task {i}", priority=i % 5 + 1,
+                due_date=None if i % 4 == 0 else f"2026-02-{i % 28 + 1:02d}",
+                completed=i % 3 == 0))
+        # Completed long enough ago to be archived
+        with DatabaseConnection(self.db_path, pooled=False) as conn:
+            conn.execute("UPDATE tasks SET completed_at = '2020-01-01 00:00:00'"
+                         " WHERE completed = 1")
+            conn.commit()
+
+    def exercise_repository(self):
+        """Call every repository method with a spread of arguments"""
+        self.repo.get_all()
+        _, cursor = self.repo.list_page(None, 5)
+        self.repo.list_page(cursor, 5)
+        for filters in ({'completed': True}, {'completed': False},
+                        {'priority': 2}, {'priority_min': 2, 'priority_max': 4},
+                        {'due_from': '2026-02-10'}, {'due_to': '2026-02-10'},
+                        {'completed': False, 'priority': 1,
+                         'due_from': '2026-02-01', 'due_to': '2026-02-20'}):
+            _, cursor = self.repo.list_page(None, 3, filters)
+            self.repo.list_page(cursor, 3, filters)
+            self.repo.count(filters)
+        self.repo.count()
+        self.repo.stats()
+        self.repo.changes(0, 10)
+        self.repo.search('task')
+        self.repo.search('ta', {'completed': False, 'priority': 2})
+        created = self.repo.bulk_create([Task(title="Bulk a"), Task(title="b")])
+        ids = [task.id for task in created] + [999]
+        self.repo.bulk_update([(ids[0], {'priority': 1}), (999, {'title': 'x'})])
+        self.repo.bulk_mark_completed(ids, True)
+        self.repo.bulk_delete(ids)
+        task = self.repo.create(Task(title="Traced"))
+        self.repo.get_by_id(task.id)
+        self.repo.update(task.id, {'title': 'Traced again', 'priority': 2})
+        self.repo.mark_completed(task.id, True)
+        self.repo.toggle_completed(task.id)
+        self.repo.delete(task.id)
+        # Changed and deleted ids, as ChangeFollower reads them
+        version, changed = self.repo.changed_ids(0)
+        self.assertIn(task.id, changed)
+        self.assertIsNone(self.repo.changed_ids(0, limit=2)[1])
+        self.assertEqual(self.repo.changed_ids(version)[1], [])
+
+        # The next-up queue's claims
+        keys = list(self.repo.open_task_keys())
+        open_ids = [key[0] for key in keys[:3]]
+        self.assertEqual(len(list(self.repo.open_task_keys(open_ids))), 3)
+        self.assertEqual(len(self.repo.get_many(open_ids)), 3)
+        self.assertEqual(len(self.repo.claim(open_ids, 'planner')), 3)
+        self.assertTrue(self.repo.release(open_ids[0]))
+
+        # Due-date reminders
+        due = list(self.repo.open_due_dates('2026-02-01'))
+        self.assertTrue(due)
+        task_id, due_date = due[0]
+        claimed = self.repo.claim_reminders([(task_id, 'due_soon', due_date)])
+        self.assertEqual([task.id for _, task in claimed], [task_id])
+
+        self.assertEqual(len(self.repo.archive_completed(30, limit=5)), 5)
+        _, cursor = self.repo.list_page(None, 5, include_archived=True)
+        self.repo.list_page(cursor, 5, {'completed': True},
+                            include_archived=True)
+        self.repo.count(include_archived=True)
+        self.repo.count({'priority': 2}, include_archived=True)
+
+    def test_no_full_scans_or_temp_sorts(self):
+        """Test no repository query scans the table or sorts in a temp B-tree"""
+        statements = []
+        pool = get_pool(self.db_path)
+        conn = pool.acquire()
+        conn.set_trace_callback(statements.append)
+        try:
+            self.exercise_repository()
+        finally:
+            conn.set_trace_callback(None)
+
+        queries = [sql for sql in statements
+                   if sql.lstrip().split(None, 1)[0].upper()
+                   in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')]
+        self.assertGreater(len(queries), 20)
+        try:
+            for sql in queries:
+                # list_page(include_archived=True) reads each table in index
+                # order, up to limit + 1 rows, then sorts only those: the
+                # one temp B-tree allowed never holds more than two pages
+                archive_merge = 'UNION ALL' in sql and 'tasks_archive' in sql
+                for detail in explain_query_plan(conn, sql):
+                    # Reading back a subquery's rows scans no table
+                    full_scan = (detail.startswith('SCAN')
+                                 and 'INDEX' not in detail
+                                 and not detail.startswith('SCAN (subquery'))
+                    self.assertFalse(full_scan, f"{detail}\n{sql}")
+                    if archive_merge and detail == 'USE TEMP B-TREE FOR ORDER BY':
+                        continue
+                    self.assertNotIn('TEMP B-TREE', detail, sql)
+        finally:
+            pool.release()
+
+    def test_migrations_recorded(self):
+        """Test migrations run once and bump user_version"""
+        init_database(self.db_path)
+        with DatabaseConnection(self.db_path) as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            indexes = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertEqual(version, len(MIGRATIONS))
+        self.assertIn('idx_tasks_listing', indexes)
+        self.assertNotIn('idx_tasks_completed', indexes)
+
+    def test_failed_migration_rolls_back(self):
+        """Test a migration failing part way changes neither schema nor version"""
+        broken = "CREATE TABLE half_done (id INTEGER); SELECT no_such_function();"
+        with mock.patch('database.MIGRATIONS', MIGRATIONS + [broken]):
+            self.assertRaises(sqlite3.Error, init_database, self.db_path)
+        with DatabaseConnection(self.db_path, pooled=False) as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            tables = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertEqual(version, len(MIGRATIONS))
+        self.assertNotIn('half_done', tables)
+
+
+class TestExport(TempDatabaseTestCase):
+    """Test the streaming export endpoint"""
+
+    def setUp(self):
+        super().setUp()
+        for i in range(12):
+            self.repo.create(Task(title=f"Export {i}", priority=i % 5 + 1))
+        self.client = self.use_in_app()
+        self.expected = [task.to_dict() for task in self.repo.get_all()]
+
+    def test_iter_all_batches(self):
+        """Test iter_all yields listing order in bounded batches"""
+        batches = list(self.repo.iter_all(batch_size=5))
+        self.assertEqual([len(batch) for batch in batches], [5, 5, 2])
+        self.assertEqual([t.to_dict() for batch in batches for t in batch],
+                         self.expected)
+
+    def test_iter_all_releases_connection_between_batches(self):
+        """Test a paused export holds no pooled connection"""
+        pool = get_pool(self.db_path)
+        batches = self.repo.iter_all(batch_size=5)
+        next(batches)
+        self.assertIsNone(getattr(pool._local, 'holder', None))
+        self.assertEqual(len(list(batches)), 2)
+
+    def test_json_export(self):
+        """Test the JSON export is one array of every task"""
+        response = self.client.get('/api/tasks/export')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.content_type, 'application/json')
+        self.assertEqual(json.loads(response.get_data()), self.expected)
+
+    def test_ndjson_export(self):
+        """Test the NDJSON export has one task per line"""
+        original = app_module.EXPORT_BATCH_SIZE
+        app_module.EXPORT_BATCH_SIZE = 5
+        try:
+            response = self.client.get('/api/tasks/export?format=ndjson')
+            lines = response.get_data(as_text=True).splitlines()
+        finally:
+            app_module.EXPORT_BATCH_SIZE = original
+        self.assertEqual(response.content_type, 'application/x-ndjson')
+        self.assertEqual([json.loads(line) for line in lines], self.expected)
+
+    def test_empty_and_invalid_export(self):
+        """Test an empty table exports [] and unknown formats are rejected"""
+        for task in self.expected:
+            self.repo.delete(task['id'])
+        self.assertEqual(
+            json.loads(self.client.get('/api/tasks/export').get_data()), [])
+        response = self.client.get('/api/tasks/export?format=xml')
+        self.assertEqual(response.status_code, 400)
+
+
+class TestBulkOperations(TempDatabaseTestCase):
+    """Test the bulk repository methods and /api/tasks/bulk"""
+
+    def test_bulk_create_assigns_ids(self):
+        """Test bulk_create inserts every task and returns their ids"""
+        self.repo.create(Task(title="existing"))
+        created = self.repo.bulk_create(
+            [Task(title=f"Bulk {i}", priority=2) for i in range(5)])
+        ids = [task.id for task in created]
+        self.assertEqual(len(set(ids)), 5)
+        for task in created:
+            self.assertEqual(self.repo.get_by_id(task.id).title, task.title)
+        self.assertEqual(self.repo.bulk_create([]), [])
+
+    def test_bulk_update_delete_and_complete(self):
+        """Test per-item results for update, delete and mark_completed"""
+        a, b, c = self.repo.bulk_create(
+            [Task(title=name) for name in ('a', 'b', 'c')])
+        self.assertEqual(
+            self.repo.bulk_update([(a.id, {'title': 'A', 'priority': 1}),
+                                   (b.id, {'description': 'bee'}),
+                                   (999, {'title': 'missing'}),
+                                   (c.id, {'unknown': 'ignored'})]),
+            [True, True, False, False])
+        self.assertEqual(self.repo.get_by_id(a.id).title, 'A')
+        self.assertEqual(self.repo.get_by_id(a.id).priority, 1)
+        self.assertEqual(self.repo.get_by_id(b.id).description, 'bee')
+
+        self.assertEqual(self.repo.bulk_mark_completed([a.id, 999, c.id], True),
+                         [True, False, True])
+        self.assertTrue(self.repo.get_by_id(c.id).completed)
+        self.assertEqual(self.repo.bulk_delete([b.id, 999]), [True, False])
+        self.assertIsNone(self.repo.get_by_id(b.id))
+
+    def test_bulk_update_is_atomic(self):
+        """Test a rejected value rolls back the whole batch"""
+        a, b = self.repo.bulk_create([Task(title='a'), Task(title='b')])
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.repo.bulk_update([(a.id, {'title': 'changed'}),
+                                   (b.id, {'priority': 9})])
+        self.assertEqual(self.repo.get_by_id(a.id).title, 'a')
+
+    def test_bulk_endpoint(self):
+        """Test /api/tasks/bulk reports one result per item"""
+        client = self.use_in_app()
+        response = client.post('/api/tasks/bulk', json={
+            'create': [{'title': 'one', 'priority': 2}, {'title': ''},
+                       {'title': 'two', 'due_date': '2026-05-01'}]})
+        self.assertEqual(response.status_code, 200)
+        created = response.get_json()['create']
+        self.assertEqual([r['success'] for r in created], [True, False, True])
+        self.assertEqual(created[1]['error'], 'Title is required')
+        one, two = created[0]['task']['id'], created[2]['task']['id']
+
+        response = client.post('/api/tasks/bulk', json={
+            'update': [{'id': one, 'title': 'uno'}],
+            'complete': [one, 12345],
+            'delete': [two]})
+        results = response.get_json()
+        self.assertEqual(results['update'], [{'id': one, 'success': True}])
+        self.assertEqual([r['success'] for r in results['complete']],
+                         [True, False])
+        self.assertEqual(results['delete'], [{'id': two, 'success': True}])
+        task = self.repo.get_by_id(one)
+        self.assertEqual((task.title, task.completed), ('uno', True))
+
+    def test_bulk_endpoint_rejects_bad_input(self):
+        """Test malformed bulk requests answer 400"""
+        client = self.use_in_app()
+        task = self.repo.create(Task(title='target'))
+        for body in ([], {'delete': ['x']}, {'update': [{'title': 'no id'}]},
+                     {'create': 'abc'}, {'delete': task.id},
+                     {'update': {'id': task.id, 'title': 'renamed'}},
+                     {'complete': [task.id], 'reopen': str(task.id)}):
+            response = client.post('/api/tasks/bulk', json=body)
+            self.assertEqual(response.status_code, 400, body)
+        # Rejected before any section ran
+        stored = self.repo.get_by_id(task.id)
+        self.assertEqual((stored.title, stored.completed), ('target', False))
+        self.assertEqual(self.repo.count(), 1)
+
+    def test_bulk_endpoint_validates_items(self):
+        """Test each mistyped create or update field fails only its item"""
+        client = self.use_in_app()
+        task = self.repo.create(Task(title='target', due_date='2026-05-01'))
+        invalid = [
+            ({'title': 7}, 'title must be a string'),
+            ({'title': ' '}, 'Title is required'),
+            ({'description': ['x']}, 'description must be a string'),
+            ({'priority': 9}, 'priority must be an integer from 1 to 5'),
+            ({'priority': '2'}, 'priority must be an integer from 1 to 5'),
+            ({'priority': True}, 'priority must be an integer from 1 to 5'),
+            ({'due_date': 20260501}, 'due_date must be a YYYY-MM-DD date'),
+            ({'due_date': '2026-13-01'}, 'due_date must be a YYYY-MM-DD date'),
+            ({'due_date': '20260501'}, 'due_date must be a YYYY-MM-DD date'),
+            ({'completed': 'false'}, 'completed must be true or false'),
+            ({'completed': {'a': 1}}, 'completed must be true or false'),
+        ]
+        for fields, error in invalid:
+            response = client.post('/api/tasks/bulk', json={
+                'create': [{'title': 'new', **fields}, {'title': 'ok'}],
+                'update': [{'id': task.id, **fields},
+                           {'id': task.id, 'priority': 2}]})
+            self.assertEqual(response.status_code, 200, fields)
+            results = response.get_json()
+            self.assertEqual(results['create'][0],
+                             {'success': False, 'error': error})
+            self.assertEqual(results['update'][0],
+                             {'id': task.id, 'success': False, 'error': error})
+            self.assertTrue(results['create'][1]['success'])
+            self.assertEqual(results['update'][1],
+                             {'id': task.id, 'success': True})
+        stored = self.repo.get_by_id(task.id)
+        self.assertEqual((stored.title, stored.due_date, stored.completed),
+                         ('target', '2026-05-01', False))
+        self.assertEqual(self.repo.count(), 1 + len(invalid))
+
+
+class TestQueryCounts(TempDatabaseTestCase):
+    """Test how many statements and connection checkouts each path costs"""
+
+    QUERY_VERBS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+    def setUp(self):
+        super().setUp()
+        self.task = self.repo.create(Task(title="Counted", priority=2))
+        self.client = self.use_in_app()
+
+    @contextmanager
+    def counting(self):
+        """Count `with repo.db()` blocks and SQL statements executed"""
+        counts = {'connections': 0, 'queries': 0}
+        factory = self.repo.db
+
+        def counting_factory():
+            counts['connections'] += 1
+            return factory()
+
+        last = [None]
+
+        def trace(sql):
+            # Trigger programs are reported with the text of the statement
+            # that fired them; count each statement once. Statements the
+            # full-text index runs on its shadow tables (reported with a
+            # "--" prefix) are its own bookkeeping, not ours.
+            if sql == last[0] or sql.startswith('--'):
+                return
+            last[0] = sql
+            if sql.lstrip().split(None, 1)[0].upper() in self.QUERY_VERBS:
+                counts['queries'] += 1
+
+        pool = get_pool(self.db_path)
+        conn = pool.acquire()
+        conn.set_trace_callback(trace)
+        pool.release()
+        self.repo.db = counting_factory
+        try:
+            yield counts
+        finally:
+            self.repo.db = factory
+            conn.set_trace_callback(None)
+
+    def assertCost(self, counts, connections, queries):
+        self.assertEqual((counts['connections'], counts['queries']),
+                         (connections, queries))
+
+    def test_repository_writes_are_single_statements(self):
+        """Test update, mark_completed and toggle cost one statement each"""
+        for call in (lambda: self.repo.update(self.task.id, {'title': 'New'}),
+                     lambda: self.repo.mark_completed(self.task.id, True),
+                     lambda: self.repo.toggle_completed(self.task.id)):
+            with self.counting() as counts:
+                self.assertIsNotNone(call())
+            self.assertCost(counts, 1, 1)
+
+    def test_toggle_is_atomic_flip(self):
+        """Test toggle_completed flips and returns the stored row"""
+        self.assertTrue(self.repo.toggle_completed(self.task.id).completed)
+        task = self.repo.toggle_completed(self.task.id)
+        self.assertFalse(task.completed)
+        self.assertEqual(task.title, "Counted")
+        self.assertIsNone(self.repo.toggle_completed(9999))
+
+    def test_fallback_without_returning(self):
+        """Test writes still return the row on SQLite without RETURNING"""
+        with mock.patch('models.SUPPORTS_RETURNING', False):
+            task = self.repo.update(self.task.id, {'priority': 5})
+            self.assertEqual(task.priority, 5)
+            self.assertTrue(self.repo.toggle_completed(self.task.id).completed)
+            self.assertIsNone(self.repo.mark_completed(9999, True))
+
+    def test_endpoint_query_counts(self):
+        """Test per-endpoint connection and query counts"""
+        task_id = self.task.id
+        expectations = [
+            (lambda: self.client.post(f'/task/toggle/{task_id}'), 1, 1),
+            (lambda: self.client.post('/task/toggle/9999'), 1, 1),
+            (lambda: self.client.get(f'/task/edit/{task_id}'), 1, 1),
+            (lambda: self.client.post(f'/task/edit/{task_id}', data={
+                'title': 'Edited', 'priority': '1'}), 2, 2),
+            (lambda: self.client.post('/task/create', data={
+                'title': 'Another'}), 1, 1),
+            (lambda: self.client.get('/api/tasks'), 2, 2),
+            (lambda: self.client.get('/'), 3, 3),
+            (lambda: self.client.post(f'/task/delete/{task_id}'), 1, 1),
+        ]
+        for request_fn, connections, queries in expectations:
+            with self.counting() as counts:
+                self.assertLess(request_fn().status_code, 500)
+            self.assertCost(counts, connections, queries)
+
+
+class TestTaskHydration(TempDatabaseTestCase):
+    """Test the slotted Task and its row hydration"""
+
+    def test_task_has_no_instance_dict(self):
+        """Test Task instances use __slots__"""
+        task = Task(title="slotted")
+        self.assertFalse(hasattr(task, '__dict__'))
+        with self.assertRaises(AttributeError):
+            task.unexpected = True
+
+    def test_from_row_keeps_stored_values(self):
+        """Test from_row copies stored values without defaults or clamping"""
+        row = (7, 'Row', 'desc', 2, '2026-03-01', 1,
+               '2026-01-01 10:00:00', '2026-01-02 10:00:00')
+        task = Task.from_row(row)
+        self.assertEqual(task.to_dict(), {
+            'id': 7, 'title': 'Row', 'description': 'desc', 'priority': 2,
+            'due_date': '2026-03-01', 'completed': True,
+            'created_at': '2026-01-01 10:00:00',
+            'updated_at': '2026-01-02 10:00:00'})
+
+    def test_repository_returns_stored_timestamps(self):
+        """Test reads hydrate the database timestamps"""
+        created = self.repo.create(Task(title="Stored"))
+        loaded = self.repo.get_by_id(created.id)
+        with DatabaseConnection(self.db_path) as conn:
+            stored = conn.execute("SELECT created_at FROM tasks WHERE id = ?",
+                                  (created.id,)).fetchone()[0]
+        self.assertEqual(loaded.created_at, stored)
+        self.assertIsInstance(loaded.completed, bool)
+
+
+class TestStats(TempDatabaseTestCase):
+    """Test the aggregate dashboard counters"""
+
+    def test_stats_counts(self):
+        """Test totals, per-priority counts, overdue and due this week"""
+        today = date(2026, 3, 10)
+        self.repo.bulk_create([
+            Task(title='overdue', priority=1, due_date='2026-03-01'),
+            Task(title='overdue but done', priority=1, due_date='2026-03-01',
+                 completed=True),
+            Task(title='due today', priority=2, due_date='2026-03-10'),
+            Task(title='due in a week', priority=2, due_date='2026-03-16'),
+            Task(title='due later', priority=3, due_date='2026-03-17'),
+            Task(title='no due date', priority=5),
+        ])
+        stats = self.repo.stats(today)
+        self.assertEqual((stats['total'], stats['completed'], stats['pending']),
+                         (6, 1, 5))
+        self.assertEqual(stats['overdue'], 1)
+        self.assertEqual(stats['due_this_week'], 2)
+        self.assertEqual(stats['by_priority'][1],
+                         {'total': 2, 'completed': 1, 'pending': 1})
+        self.assertEqual(stats['by_priority'][4]['total'], 0)
+
+    def test_stats_endpoint_and_dashboard(self):
+        """Test /api/stats and the home page cards use the aggregate"""
+        self.repo.bulk_create([Task(title='a'), Task(title='b', completed=True)])
+        client = self.use_in_app()
+        data = client.get('/api/stats').get_json()
+        self.assertEqual((data['total'], data['completed'], data['pending']),
+                         (2, 1, 1))
+        self.assertEqual(data['by_priority']['3']['total'], 2)
+        html = client.get('/').get_data(as_text=True)
+        self.assertIn('<h3>2</h3>', html)
+        self.assertIn('<h3>1</h3>', html)
+
+
+class TestCachedRepository(TempDatabaseTestCase):
+    """Test the read-through cache and its invalidation"""
+
+    def setUp(self):
+        super().setUp()
+        self.now = [0.0]
+        self.cached = CachedTaskRepository(self.repo, maxsize=3, ttl=10,
+                                           clock=lambda: self.now[0])
+        self.task = self.cached.create(Task(title="Cached"))
+
+    def test_get_by_id_hits_cache(self):
+        """Test repeated get_by_id is served from the cache"""
+        first = self.cached.get_by_id(self.task.id)
+        second = self.cached.get_by_id(self.task.id)
+        self.assertIs(first, second)
+        metrics = self.cached.metrics()['by_id']
+        self.assertEqual((metrics['hits'], metrics['misses']), (1, 1))
+
+    def test_ttl_expiry_and_lru_eviction(self):
+        """Test entries expire after the TTL and the LRU stays bounded"""
+        self.cached.get_by_id(self.task.id)
+        self.now[0] = 11
+        self.cached.get_by_id(self.task.id)
+        for task_id in (100, 101, 102):
+            self.cached.get_by_id(task_id)
+        metrics = self.cached.metrics()['by_id']
+        self.assertEqual(metrics['expirations'], 1)
+        self.assertEqual(metrics['evictions'], 1)
+        self.assertEqual(metrics['size'], 3)
+
+    def test_writes_invalidate_precisely(self):
+        """Test writes evict only the ids they touch"""
+        other = self.cached.create(Task(title="Other"))
+        self.cached.get_by_id(self.task.id)
+        self.cached.get_by_id(other.id)
+
+        self.cached.toggle_completed(self.task.id)
+        self.assertTrue(self.cached.get_by_id(self.task.id).completed)
+        self.cached.update(self.task.id, {'title': 'Renamed'})
+        self.assertEqual(self.cached.get_by_id(self.task.id).title, 'Renamed')
+
+        hits = self.cached.metrics()['by_id']['hits']
+        self.cached.get_by_id(other.id)
+        self.assertEqual(self.cached.metrics()['by_id']['hits'], hits + 1)
+
+        self.cached.delete(self.task.id)
+        self.assertIsNone(self.cached.get_by_id(self.task.id))
+
+    def test_out_of_order_write_results_are_not_cached(self):
+        """Test an older write finishing last does not cache its row"""
+        older = self.repo.get_by_id(self.task.id)
+        self.cached.update(self.task.id, {'title': 'Newest'})
+        # A concurrent update that committed first but returns only now
+        with mock.patch.object(self.repo, 'update', return_value=older):
+            self.cached.update(self.task.id, {'title': 'Cached'})
+        self.assertEqual(self.cached.get_by_id(self.task.id).title, 'Newest')
+
+    def test_failed_writes_still_invalidate(self):
+        """Test a write that raises after committing drops cached results"""
+        # Each failing call is preceded by the write it committed
+        failing = mock.Mock(side_effect=sqlite3.OperationalError("disk I/O"))
+        self.cached.get_by_id(self.task.id)
+        self.repo.delete(self.task.id)
+        with mock.patch.object(self.repo, 'delete', failing):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.cached.delete(self.task.id)
+        self.assertIsNone(self.cached.get_by_id(self.task.id))
+
+        self.assertEqual(self.cached.count(), 0)
+        self.repo.create(Task(title="Committed"))
+        with mock.patch.object(self.repo, 'create', failing):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.cached.create(Task(title="Committed"))
+        self.assertEqual(self.cached.count(), 1)
+
+    def test_missing_task_cached_until_created(self):
+        """Test a cached miss does not hide a task created later"""
+        next_id = self.task.id + 1
+        self.assertIsNone(self.cached.get_by_id(next_id))
+        created = self.cached.create(Task(title="New"))
+        self.assertEqual(created.id, next_id)
+        self.assertEqual(self.cached.get_by_id(next_id).title, "New")
+
+    def test_lists_and_stats_follow_version(self):
+        """Test list, count and stats results are reused until a write"""
+        page = self.cached.list_page(None, 10)
+        self.assertIs(self.cached.list_page(None, 10), page)
+        self.assertEqual(self.cached.stats()['total'], 1)
+        self.assertEqual(self.cached.count(), 1)
+
+        self.cached.bulk_create([Task(title="x"), Task(title="y")])
+        self.assertEqual(len(self.cached.list_page(None, 10)[0]), 3)
+        self.assertEqual(self.cached.stats()['total'], 3)
+        self.assertEqual(self.cached.count(), 3)
+        self.assertEqual(len(self.cached.get_all()), 3)
+
+        self.cached.bulk_mark_completed([self.task.id], True)
+        self.assertEqual(self.cached.stats()['completed'], 1)
+        self.cached.bulk_delete([self.task.id])
+        self.assertIsNone(self.cached.get_by_id(self.task.id))
+        self.assertEqual(self.cached.count(), 2)
+
+
+class TestConditionalRequests(TempDatabaseTestCase):
+    """Test ETag/Last-Modified revalidation and response compression"""
+
+    def setUp(self):
+        super().setUp()
+        self.repo.bulk_create([Task(title=f"Poll {i}", description="x" * 50)
+                               for i in range(30)])
+        self.client = self.use_in_app()
+
+    def test_version_bumped_by_writes(self):
+        """Test triggers bump the table version on every kind of write"""
+        version, _ = self.repo.version()
+        task = self.repo.create(Task(title="v"))
+        self.repo.toggle_completed(task.id)
+        self.repo.delete(task.id)
+        self.assertEqual(self.repo.version()[0], version + 3)
+
+    def test_api_not_modified(self):
+        """Test /api/tasks answers 304 until the table changes"""
+        first = self.client.get('/api/tasks')
+        etag = first.headers['ETag']
+        self.assertTrue(first.headers['Last-Modified'])
+
+        with mock.patch.object(self.repo, 'list_page') as list_page:
+            again = self.client.get('/api/tasks',
+                                    headers={'If-None-Match': etag})
+            self.assertEqual(again.status_code, 304)
+            self.assertEqual(again.get_data(), b'')
+            since = self.client.get('/api/tasks', headers={
+                'If-Modified-Since': first.headers['Last-Modified']})
+            self.assertEqual(since.status_code, 304)
+            list_page.assert_not_called()
+
+        self.repo.create(Task(title="changed"))
+        changed = self.client.get('/api/tasks', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+
+    def test_index_not_modified(self):
+        """Test the home page revalidates with its ETag"""
+        etag = self.client.get('/').headers['ETag']
+        self.assertIn(date.today().isoformat(), etag)
+        response = self.client.get('/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_gzip_compression(self):
+        """Test large bodies are gzipped when the client accepts it"""
+        plain = self.client.get('/api/tasks')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        zipped = self.client.get('/api/tasks',
+                                 headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(zipped.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', zipped.headers['Vary'])
+        self.assertLess(len(zipped.get_data()), len(plain.get_data()))
+        self.assertEqual(gzip.decompress(zipped.get_data()), plain.get_data())
+
+    def test_small_bodies_not_compressed(self):
+        """Test bodies under the threshold are sent as-is"""
+        response = self.client.get('/api/stats',
+                                   headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+
+class TestDeltaSync(TempDatabaseTestCase):
+    """Test change tracking for delta sync"""
+
+    def setUp(self):
+        super().setUp()
+        self.tasks = self.repo.bulk_create([Task(title=f"Sync {i}")
+                                            for i in range(5)])
+        self.since = self.repo.version()[0]
+
+    def test_changes_after_version(self):
+        """Test creates, updates and deletes after a version are reported"""
+        created = self.repo.create(Task(title="New"))
+        self.repo.update(self.tasks[0].id, {'title': 'Renamed'})
+        self.repo.toggle_completed(self.tasks[1].id)
+        self.repo.delete(self.tasks[2].id)
+
+        changes = self.repo.changes(self.since)
+        self.assertEqual({task.id for task in changes['updated']},
+                         {created.id, self.tasks[0].id, self.tasks[1].id})
+        self.assertEqual(changes['deleted'], [self.tasks[2].id])
+        self.assertFalse(changes['has_more'])
+        self.assertEqual(changes['next_since'], self.repo.version()[0])
+        self.assertEqual(self.repo.changes(changes['next_since']),
+                         {'version': changes['version'],
+                          'next_since': changes['version'],
+                          'has_more': False, 'updated': [], 'deleted': []})
+
+    def test_repeated_updates_reported_once(self):
+        """Test a task updated several times appears once, in its latest state"""
+        for priority in (1, 2, 4):
+            self.repo.update(self.tasks[0].id, {'priority': priority})
+        changes = self.repo.changes(self.since)
+        self.assertEqual(len(changes['updated']), 1)
+        self.assertEqual(changes['updated'][0].priority, 4)
+
+    def test_recreated_after_delete(self):
+        """Test a full sync from zero includes every task and tombstone"""
+        self.repo.delete(self.tasks[0].id)
+        changes = self.repo.changes(0)
+        self.assertEqual(len(changes['updated']), 4)
+        self.assertEqual(changes['deleted'], [self.tasks[0].id])
+
+    def test_paging_with_limit(self):
+        """Test next_since pages through changes without gaps or repeats"""
+        for task in self.tasks:
+            self.repo.toggle_completed(task.id)
+        self.repo.delete(self.tasks[0].id)
+        self.repo.delete(self.tasks[3].id)
+
+        seen_updated, seen_deleted, since, calls = [], [], self.since, 0
+        while True:
+            changes = self.repo.changes(since, limit=2)
+            calls += 1
+            self.assertLessEqual(
+                len(changes['updated']) + len(changes['deleted']), 2)
+            seen_updated += [task.id for task in changes['updated']]
+            seen_deleted += changes['deleted']
+            since = changes['next_since']
+            if not changes['has_more']:
+                break
+        self.assertEqual(calls, 3)
+        self.assertEqual(sorted(seen_updated),
+                         [self.tasks[i].id for i in (1, 2, 4)])
+        self.assertEqual(sorted(seen_deleted),
+                         [self.tasks[0].id, self.tasks[3].id])
+
+    def test_pruned_tombstones_expire_old_positions(self):
+        """Test clients behind pruned tombstones must resync"""
+        self.repo.delete(self.tasks[0].id)
+        with self.repo.db() as conn:
+            conn.execute("UPDATE task_tombstones "
+                         "SET deleted_at = datetime('now', '-60 days')")
+            conn.commit()
+        self.assertEqual(self.repo.prune_tombstones(30), 1)
+        with self.assertRaises(SyncExpiredError):
+            self.repo.changes(self.since)
+        self.assertEqual(self.repo.changes(self.repo.version()[0])['deleted'],
+                         [])
+        self.assertEqual(self.repo.prune_tombstones(30), 0)
+
+    def test_api_changes(self):
+        """Test the delta sync endpoint and its error statuses"""
+        client = self.use_in_app()
+        self.repo.update(self.tasks[0].id, {'title': 'Via API'})
+        self.repo.delete(self.tasks[1].id)
+
+        response = client.get(f'/api/tasks/changes?since={self.since}')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([task['title'] for task in data['updated']],
+                         ['Via API'])
+        self.assertEqual(data['deleted'], [self.tasks[1].id])
+        self.assertEqual(data['next_since'], self.repo.version()[0])
+
+        self.assertEqual(
+            client.get('/api/tasks/changes?since=abc').status_code, 400)
+        self.assertEqual(
+            client.get('/api/tasks/changes?since=-1').status_code, 400)
+
+        with self.repo.db() as conn:
+            conn.execute("UPDATE task_tombstones "
+                         "SET deleted_at = datetime('now', '-60 days')")
+            conn.commit()
+        self.repo.prune_tombstones(30)
+        expired = client.get(f'/api/tasks/changes?since={self.since}')
+        self.assertEqual(expired.status_code, 410)
+        self.assertEqual(expired.get_json()['version'],
+                         self.repo.version()[0])
+
+    def test_migration_backfills_change_seq(self):
+        """Test rows created before the migration get distinct sequences"""
+        with self.repo.db() as conn:
+            seqs = [row[0] for row in conn.execute(
+                "SELECT change_seq FROM tasks ORDER BY id")]
+        self.assertEqual(len(set(seqs)), len(seqs))
+        self.assertTrue(all(0 < seq <= self.since for seq in seqs))
+
+
+class TestEventHub(unittest.TestCase):
+    """Test the publish/subscribe hub behind /api/events"""
+
+    def test_publish_reaches_every_subscriber(self):
+        """Test each subscriber gets the same pre-encoded event"""
+        hub = EventHub()
+        first, second = hub.subscribe(), hub.subscribe()
+        event = hub.publish('created', {'task': {'id': 1}})
+        self.assertIs(first.get(0), event)
+        self.assertIs(second.get(0), event)
+        self.assertEqual(event.encoded,
+                         'id: 1\nevent: created\ndata: {"task":{"id":1}}\n\n')
+        self.assertIsNone(first.get(0.01))
+
+    def test_get_waits_for_publish(self):
+        """Test a blocked reader wakes up when an event is published"""
+        hub = EventHub()
+        subscription = hub.subscribe()
+        timer = threading.Timer(0.05, hub.publish, ('deleted', {'id': 3}))
+        timer.start()
+        event = subscription.get(timeout=5)
+        timer.join()
+        self.assertEqual(event.type, 'deleted')
+
+    def test_slow_consumer_evicted(self):
+        """Test a subscriber with a full queue is dropped, others are not"""
+        hub = EventHub(queue_size=3)
+        slow, fast = hub.subscribe(), hub.subscribe()
+        for i in range(4):
+            hub.publish('updated', {'i': i})
+            fast.get(0)
+        self.assertTrue(slow.evicted)
+        self.assertEqual(len(slow.events), 0)
+        with self.assertRaises(SubscriptionClosed):
+            slow.get(0)
+        self.assertEqual(hub.metrics(), {'subscribers': 1, 'published': 4,
+                                         'evictions': 1})
+
+    def test_subscriber_limit_and_close(self):
+        """Test the subscriber cap and that closing wakes readers"""
+        hub = EventHub(max_subscribers=2)
+        subscription = hub.subscribe()
+        hub.subscribe()
+        with self.assertRaises(HubFullError):
+            hub.subscribe()
+        subscription.close()
+        subscription.close()
+        self.assertEqual(hub.subscriber_count, 1)
+        hub.subscribe()
+        hub.close()
+        self.assertEqual(hub.subscriber_count, 0)
+        with self.assertRaises(SubscriptionClosed):
+            subscription.get(0)
+
+    def test_thousands_of_async_subscribers_share_one_thread(self):
+        """Test idle asyncio subscribers need no thread each"""
+        hub = EventHub()
+        subscriptions = [hub.subscribe() for _ in range(5000)]
+        threads_before = threading.active_count()
+
+        async def listen():
+            waiting = [asyncio.ensure_future(s.get_async(timeout=10))
+                       for s in subscriptions]
+            await asyncio.sleep(0.05)
+            self.assertEqual(threading.active_count(), threads_before)
+            # Published from another thread, as repository writes are
+            await asyncio.get_running_loop().run_in_executor(
+                None, hub.publish, 'created', {'task': {'id': 9}})
+            return await asyncio.gather(*waiting)
+
+        events = asyncio.run(listen())
+        self.assertEqual(len(events), 5000)
+        self.assertTrue(all(event is events[0] for event in events))
+
+
+class TestEventStream(TempDatabaseTestCase):
+    """Test repository writes are published and streamed as SSE"""
+
+    def setUp(self):
+        super().setUp()
+        self.hub = EventHub()
+        self.repo.events = self.hub
+        self.subscription = self.hub.subscribe()
+
+    def published(self):
+        events = []
+        while True:
+            event = self.subscription.get(0)
+            if event is None:
+                return [(e.type, e.data) for e in events]
+            events.append(event)
+
+    def test_single_writes_publish_events(self):
+        """Test create, update, toggle and delete each publish one event"""
+        task = self.repo.create(Task(title="Live"))
+        self.repo.update(task.id, {'title': 'Live edit'})
+        self.repo.toggle_completed(task.id)
+        self.repo.mark_completed(task.id, False)
+        self.repo.delete(task.id)
+        self.repo.delete(task.id)
+        self.repo.update(task.id, {'title': 'gone'})
+
+        events = self.published()
+        self.assertEqual([event_type for event_type, _ in events],
+                         ['created', 'updated', 'toggled', 'toggled', 'deleted'])
+        self.assertEqual(events[1][1]['task']['title'], 'Live edit')
+        self.assertTrue(events[2][1]['task']['completed'])
+        self.assertEqual(events[4][1], {'id': task.id})
+
+    def test_bulk_writes_publish_one_event_each(self):
+        """Test bulk writes publish their affected ids once"""
+        created = self.repo.bulk_create([Task(title=f"B{i}") for i in range(3)])
+        ids = [task.id for task in created]
+        self.repo.bulk_update([(ids[0], {'priority': 1}), (999, {'priority': 1})])
+        self.repo.bulk_mark_completed(ids + [999], True)
+        self.repo.bulk_delete(ids)
+        self.repo.bulk_delete([999])
+        self.assertEqual(self.published(), [
+            ('bulk_created', {'ids': ids}),
+            ('bulk_updated', {'ids': [ids[0]]}),
+            ('bulk_toggled', {'ids': ids, 'completed': True}),
+            ('bulk_deleted', {'ids': ids}),
+        ])
+
+    def test_failing_hub_does_not_fail_write(self):
+        """Test a publish error is logged and the write still succeeds"""
+        with mock.patch.object(self.hub, 'publish', side_effect=RuntimeError):
+            task = self.repo.create(Task(title="Still saved"))
+        self.assertIsNotNone(self.repo.get_by_id(task.id))
+
+    def test_event_stream_endpoint(self):
+        """Test /api/events streams writes and unsubscribes on disconnect"""
+        client = self.use_in_app()
+        with mock.patch.object(app_module, 'event_hub', self.hub):
+            response = client.get('/api/events', buffered=False)
+            self.assertEqual(response.mimetype, 'text/event-stream')
+            self.assertNotIn('Content-Encoding', response.headers)
+            chunks = iter(response.response)
+            self.assertTrue(next(chunks).startswith(b'retry:'))
+            self.assertEqual(self.hub.subscriber_count, 2)
+
+            task = self.repo.create(Task(title="Streamed"))
+            message = next(chunks).decode()
+            self.assertIn('event: created\n', message)
+            self.assertIn('"title":"Streamed"', message)
+            self.assertIn(f'"id":{task.id}', message)
+
+            response.close()
+            self.assertEqual(self.hub.subscriber_count, 1)
+
+    def test_event_stream_keepalive_and_eviction(self):
+        """Test idle streams send comments and evicted ones say so"""
+        hub = EventHub(queue_size=1)
+        with mock.patch.object(app_module, 'event_hub', hub), \
+                mock.patch.object(app_module, 'SSE_KEEPALIVE', 0.01):
+            response = app.test_client().get('/api/events', buffered=False)
+            chunks = iter(response.response)
+            next(chunks)
+            self.assertEqual(next(chunks), b': keep-alive\n\n')
+            hub.publish('deleted', {'id': 1})
+            hub.publish('deleted', {'id': 2})
+            self.assertEqual(next(chunks), b'event: evicted\ndata: {}\n\n')
+            self.assertEqual(list(chunks), [])
+
+    def test_event_stream_full_hub(self):
+        """Test the endpoint answers 503 when the hub is full"""
+        with mock.patch.object(app_module, 'event_hub',
+                               EventHub(max_subscribers=0)):
+            response = app.test_client().get('/api/events')
+        self.assertEqual(response.status_code, 503)
+
+
+class TestAsyncMode(TempDatabaseTestCase):
+    """Test the async repository wrapper and the ASGI application"""
+
+    def setUp(self):
+        super().setUp()
+        self.repo.bulk_create([Task(title=f"Async {i}", priority=i % 5 + 1)
+                               for i in range(30)])
+        self.async_repo = AsyncTaskRepository(self.repo, max_workers=2)
+        self.addCleanup(self.async_repo.close)
+        patcher = mock.patch.object(asgi, 'task_repo', self.async_repo)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def call(self, path, method='GET', query='', headers=()):
+        """Run one request through the ASGI app; (status, headers, body)"""
+        scope = {'type': 'http', 'method': method, 'path': path,
+                 'query_string': query.encode(),
+                 'headers': [(k.lower().encode(), v.encode())
+                             for k, v in headers]}
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(asgi.application(scope, receive, send))
+        start = messages[0]
+        body = b''.join(m.get('body', b'') for m in messages[1:])
+        return (start['status'],
+                {k.decode(): v.decode() for k, v in start['headers']}, body)
+
+    def test_calls_run_on_db_executor(self):
+        """Test repository calls never run on the event loop thread"""
+        threads = []
+
+        def get_all():
+            threads.append(threading.current_thread().name)
+            return []
+
+        async def run():
+            with mock.patch.object(self.repo, 'get_all', get_all):
+                await asyncio.gather(*(self.async_repo.get_all()
+                                       for _ in range(4)))
+
+        asyncio.run(run())
+        self.assertEqual(len(threads), 4)
+        self.assertTrue(all(name.startswith('task-db') for name in threads))
+
+    def test_async_iter_all(self):
+        """Test async export batches cover the table in listing order"""
+        async def run():
+            return [batch async for batch in self.async_repo.iter_all(7)]
+
+        batches = asyncio.run(run())
+        self.assertEqual([len(batch) for batch in batches], [7, 7, 7, 7, 2])
+        self.assertEqual([t.id for batch in batches for t in batch],
+                         [t.id for t in self.repo.get_all()])
+
+    def test_api_tasks_matches_wsgi(self):
+        """Test the native list route answers like the Flask one"""
+        client = self.use_in_app()
+        expected = client.get('/api/tasks?limit=10&priority=2')
+        status, headers, body = self.call('/api/tasks',
+                                          query='limit=10&priority=2')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), expected.get_json())
+        self.assertEqual(headers['etag'], expected.headers['ETag'])
+        self.assertEqual(headers['last-modified'],
+                         expected.headers['Last-Modified'])
+        # A repeated parameter counts once, with its first value
+        _, _, body = self.call('/api/tasks', query='limit=10&priority=2&priority=3')
+        self.assertEqual(json.loads(body), expected.get_json())
+
+        status, headers, _ = self.call('/api/tasks', query='limit=5')
+        self.assertIn('cursor=', headers['link'])
+        self.assertEqual(headers['link'],
+                         client.get('/api/tasks?limit=5').headers['Link'])
+        status, _, body = self.call(
+            '/api/tasks', query=f"limit=5&cursor={headers['x-next-cursor']}")
+        self.assertEqual(len(json.loads(body)), 5)
+
+    def test_api_tasks_conditional_and_errors(self):
+        """Test 304 revalidation, gzip and 400s on the native route"""
+        _, headers, _ = self.call('/api/tasks')
+        status, _, body = self.call('/api/tasks',
+                                    headers=[('If-None-Match', headers['etag'])])
+        self.assertEqual((status, body), (304, b''))
+
+        status, headers, body = self.call(
+            '/api/tasks', headers=[('Accept-Encoding', 'gzip')])
+        self.assertEqual(headers['content-encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(body))), 30)
+
+        self.assertEqual(self.call('/api/tasks', query='limit=x')[0], 400)
+        self.assertEqual(self.call('/api/tasks', query='cursor=bad')[0], 400)
+        self.assertEqual(self.call('/api/tasks/changes',
+                                   query='since=-1')[0], 400)
+
+    def test_native_writes_and_reads(self):
+        """Test toggle, delete, stats and changes on the native routes"""
+        since = self.repo.version()[0]
+        task_id = self.repo.get_all()[0].id
+        status, _, body = self.call(f'/task/toggle/{task_id}', 'POST')
+        self.assertEqual(status, 200)
+        self.assertTrue(json.loads(body)['completed'])
+        self.assertEqual(self.call(f'/task/delete/{task_id}', 'POST')[0], 200)
+        self.assertEqual(self.call(f'/task/delete/{task_id}', 'POST')[0], 404)
+        self.assertEqual(self.call('/task/toggle/99999', 'POST')[0], 404)
+
+        _, _, body = self.call('/api/stats')
+        self.assertEqual(json.loads(body)['total'], 29)
+        _, _, body = self.call('/api/tasks/changes', query=f'since={since}')
+        self.assertEqual(json.loads(body)['deleted'], [task_id])
+
+    def test_error_after_response_start_ends_stream(self):
+        """Test a handler failing mid-stream gets no second response start"""
+        async def failing(request, receive, send):
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': []})
+            await send({'type': 'http.response.body', 'body': b'partial',
+                        'more_body': True})
+            raise RuntimeError("stream broke")
+
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/failing',
+                 'query_string': b'', 'headers': []}
+        with mock.patch.dict(asgi.ROUTES, {('GET', '/failing'): failing}):
+            asyncio.run(asgi.application(scope, None, send))
+        self.assertEqual([m['type'] for m in messages],
+                         ['http.response.start'] + ['http.response.body'] * 2)
+        self.assertFalse(messages[-1].get('more_body', False))
+
+    def test_other_routes_go_to_wsgi(self):
+        """Test routes without a native handler use the WSGI adapter"""
+        async def fake_wsgi(scope, receive, send):
+            await asgi.send_response(send, 200, b'from flask', 'text/plain')
+
+        with mock.patch.object(asgi, 'wsgi_application', fake_wsgi):
+            self.assertEqual(self.call('/')[2], b'from flask')
+        with mock.patch.object(asgi, 'wsgi_application', None):
+            self.assertEqual(self.call('/')[0], 404)
+
+    def test_event_stream_without_threads(self):
+        """Test the native event stream delivers writes until disconnect"""
+        hub = EventHub()
+        self.repo.events = hub
+        chunks = []
+
+        async def run():
+            disconnected = asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                chunks.append(message.get('body', b''))
+                if b'event: deleted' in chunks[-1]:
+                    disconnected.set()
+
+            scope = {'type': 'http', 'method': 'GET', 'path': '/api/events',
+                     'query_string': b'', 'headers': []}
+            stream = asyncio.ensure_future(asgi.application(scope, receive, send))
+            await asyncio.sleep(0.05)
+            self.assertEqual(hub.subscriber_count, 1)
+            task_id = self.repo.get_all()[0].id
+            await self.async_repo.delete(task_id)
+            await asyncio.wait_for(stream, 5)
+            return task_id
+
+        with mock.patch.object(app_module, 'event_hub', hub):
+            task_id = asyncio.run(run())
+        self.assertTrue(chunks[1].startswith(b'retry:'))
+        self.assertIn(f'data: {{"id":{task_id}}}'.encode(), chunks[2])
+        self.assertEqual(hub.subscriber_count, 0)
+
+
+class TestSearch(TempDatabaseTestCase):
+    """Test full-text search over titles and descriptions"""
+
+    def setUp(self):
+        super().setUp()
+        self.tasks = self.repo.bulk_create([
+            Task(title="Quarterly report", description="Numbers for finance",
+                 priority=1),
+            Task(title="Email finance", description="Ask about the report"),
+            Task(title="Repaint fence", description="Buy paint", priority=5),
+            Task(title="Café opening", description="Invite the team",
+                 completed=True),
+        ])
+
+    def titles(self, query, filters=None):
+        return [task.title for task in self.repo.search(query, filters)]
+
+    def test_prefix_matching(self):
+        """Test each word matches as a prefix, accents ignored"""
+        self.assertEqual(sorted(self.titles("rep")),
+                         ["Email finance", "Quarterly report", "Repaint fence"])
+        self.assertEqual(self.titles("fin rep"),
+                         ["Quarterly report", "Email finance"])
+        self.assertEqual(self.titles("cafe"), ["Café opening"])
+        self.assertEqual(self.titles("nothing"), [])
+
+    def test_long_prefixes(self):
+        """Test words longer than the prefix index still match as prefixes"""
+        self.assertEqual(self.titles("QUARTER"), ["Quarterly report"])
+        self.assertEqual(self.titles("fina repo"),
+                         ["Quarterly report", "Email finance"])
+        self.assertEqual(self.titles("café"), ["Café opening"])
+        self.assertEqual(self.titles("reportage"), [])
+        # Prefixes of more words than are expanded use the prefix query
+        with mock.patch('models.SEARCH_PREFIX_TERMS', 0):
+            self.assertEqual(self.titles("repai"), ["Repaint fence"])
+
+    def test_title_matches_rank_first(self):
+        """Test BM25 ranks title matches above description matches"""
+        self.assertEqual(self.titles("report"),
+                         ["Quarterly report", "Email finance"])
+        self.assertEqual(self.titles("finance"),
+                         ["Email finance", "Quarterly report"])
+
+    def test_filters_and_limit(self):
+        """Test search results can be filtered and limited"""
+        self.assertEqual(self.titles("rep", {'priority': 5}), ["Repaint fence"])
+        self.assertEqual(self.titles("team", {'completed': False}), [])
+        self.assertEqual(len(self.repo.search("rep", limit=1)), 1)
+
+    def test_broad_queries_newest_first(self):
+        """Test queries matching more than the rank limit skip BM25"""
+        self.assertTrue(self.repo.search("rep").ranked)
+        with mock.patch('models.SEARCH_RANK_LIMIT', 1):
+            self.assertEqual(self.titles("rep"), ["Repaint fence",
+                                                  "Email finance",
+                                                  "Quarterly report"])
+            self.assertFalse(self.repo.search("rep").ranked)
+            self.assertEqual(self.titles("quarterly"), ["Quarterly report"])
+            self.assertTrue(self.repo.search("quarterly").ranked)
+
+    def test_query_syntax_is_literal(self):
+        """Test FTS5 operators and punctuation in input cannot break queries"""
+        for query in ('report OR "', 'NEAR(report', 'title:x', '*', '   '):
+            self.repo.search(query)
+        self.assertEqual(self.repo.search('-- ()'), [])
+        self.assertEqual(self.titles('report AND'), [])
+
+    def test_index_follows_writes(self):
+        """Test triggers keep the index in sync with updates and deletes"""
+        self.repo.update(self.tasks[0].id, {'title': 'Annual summary'})
+        self.repo.delete(self.tasks[2].id)
+        self.repo.toggle_completed(self.tasks[1].id)
+        self.assertEqual(self.titles("annual"), ["Annual summary"])
+        self.assertEqual(self.titles("quarterly"), [])
+        self.assertEqual(self.titles("repaint"), [])
+        with self.repo.db() as conn:
+            conn.execute("INSERT INTO tasks_fts(tasks_fts, rank) "
+                         "VALUES ('integrity-check', 1)")
+
+    def test_api_search(self):
+        """Test the search endpoint and its validation"""
+        client = self.use_in_app()
+        response = client.get('/api/tasks/search?q=rep&priority=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([task['title'] for task in response.get_json()],
+                         ["Quarterly report"])
+        self.assertEqual(response.headers['X-Search-Ranked'], 'true')
+        with mock.patch('models.SEARCH_RANK_LIMIT', 1):
+            response = client.get('/api/tasks/search?q=rep')
+        self.assertEqual(response.headers['X-Search-Ranked'], 'false')
+        self.assertEqual(client.get('/api/tasks/search').status_code, 400)
+        self.assertEqual(
+            client.get('/api/tasks/search?q=a&limit=0').status_code, 400)
+
+
+class TestWriteBehind(TempDatabaseTestCase):
+    """Test group-committed single-task writes"""
+
+    def setUp(self):
+        super().setUp()
+        self.events = EventHub()
+        self.repo.events = self.events
+        self.writer = WriteBehindRepository(self.repo, max_batch=4,
+                                            max_latency=0.05)
+        self.addCleanup(self.writer.close)
+
+    def test_futures_resolve_with_stored_tasks(self):
+        """Test futures resolve once the batch holding them has committed"""
+        futures = [self.writer.submit('create', Task(title=f"Queued {i}"))
+                   for i in range(10)]
+        created = [future.result(timeout=5) for future in futures]
+        self.assertEqual(len({task.id for task in created}), 10)
+        self.assertEqual(self.repo.get_by_id(created[9].id).title, "Queued 9")
+        # 10 writes in batches of at most 4
+        self.assertEqual(self.writer.metrics(),
+                         {'batches': 3, 'writes': 10, 'pending': 0})
+
+    def test_synchronous_methods(self):
+        """Test the repository methods wait for their own write"""
+        task = self.writer.create(Task(title="Write-behind"))
+        self.assertEqual(self.writer.update(task.id, {'priority': 1}).priority, 1)
+        self.assertTrue(self.writer.toggle_completed(task.id).completed)
+        self.assertFalse(self.writer.mark_completed(task.id, False).completed)
+        self.assertIsNone(self.writer.update(task.id, {}))
+        self.assertTrue(self.writer.delete(task.id))
+        self.assertFalse(self.writer.delete(task.id))
+        self.assertIsNone(self.writer.get_by_id(task.id))
+
+    def test_failed_write_fails_only_its_future(self):
+        """Test a constraint violation does not roll back the rest of a batch"""
+        task = self.repo.create(Task(title="Target"))
+        subscription = self.events.subscribe()
+        good = self.writer.submit('update', task.id, {'title': "Renamed"})
+        bad = self.writer.submit('update', task.id, {'priority': 9})
+        other = self.writer.submit('create', Task(title="Other"))
+        with self.assertRaises(sqlite3.IntegrityError):
+            bad.result(timeout=5)
+        self.assertEqual(good.result(timeout=5).title, "Renamed")
+        self.assertEqual(self.repo.get_by_id(other.result().id).title, "Other")
+        self.assertEqual(self.writer.metrics()['batches'], 1)
+        # Events follow queue order and skip the failed write
+        self.assertEqual([subscription.get(1).type for _ in range(2)],
+                         ['updated', 'created'])
+
+    def test_close_commits_queued_writes(self):
+        """Test close() drains the queue and then refuses new writes"""
+        futures = [self.writer.submit('create', Task(title=f"Late {i}"))
+                   for i in range(3)]
+        self.writer.close()
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual(self.repo.count(), 3)
+        with self.assertRaises(RuntimeError):
+            self.writer.submit('create', Task(title="Too late"))
+        with self.assertRaises(ValueError):
+            self.writer.submit('bulk_delete', [1])
+
+
+class TestPageRendering(TempDatabaseTestCase):
+    """Test task card fragment caching and static asset caching"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.use_in_app()
+        app_module.card_cache.clear()
+
+    def test_cards_follow_task_versions(self):
+        """Test cached cards are reused until the task changes"""
+        task = self.repo.create(Task(title="Cached card", due_date="2000-01-01"))
+        first = self.client.get('/').get_data(as_text=True)
+        hits = app_module.card_cache.hits
+        self.assertEqual(self.client.get('/').get_data(as_text=True), first)
+        self.assertEqual(app_module.card_cache.hits, hits + 1)
+        self.assertIn('due-date overdue', first)
+
+        # Several writes within a second each render a new card
+        for completed in (True, False, True):
+            self.repo.mark_completed(task.id, completed)
+            page = self.client.get('/').get_data(as_text=True)
+            self.assertEqual(f'completed" id="task-{task.id}"' in page,
+                             completed)
+            self.assertEqual('due-date overdue' in page, not completed)
+        self.repo.toggle_completed(task.id)
+        self.client.get('/')
+        self.repo.update(task.id, {'title': "Edited card"})
+        self.repo.toggle_completed(task.id)
+        self.repo.toggle_completed(task.id)
+        page = self.client.get('/').get_data(as_text=True)
+        self.assertIn("Edited card", page)
+        self.assertNotIn("Cached card", page)
+
+    def test_stylesheet_is_versioned_and_cached(self):
+        """Test the page links a versioned stylesheet cached for a year"""
+        page = self.client.get('/').get_data(as_text=True)
+        self.assertNotIn('<style>', page)
+        with app.test_request_context():
+            url = app_module.static_url('style.css')
+        self.assertIn(f'href="{url}"', page.replace('&amp;', '&'))
+        self.assertIn('?v=', url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cache_control.max_age, 365 * 24 * 3600)
+        response.close()
+
+    def test_full_page_renders_from_cached_cards(self):
+        """Test a second render of a page takes every card from the cache"""
+        self.repo.bulk_create([Task(title=f"Task {i}", priority=i % 5 + 1)
+                               for i in range(20)])
+        first = self.client.get('/').get_data(as_text=True)
+        self.assertEqual(first.count('class="task-card'), 20)
+        hits = app_module.card_cache.hits
+        self.assertEqual(self.client.get('/').get_data(as_text=True), first)
+        self.assertEqual(app_module.card_cache.hits, hits + 20)
+
+    def test_render_5k_task_page(self):
+        """Benchmark: render a 5,000-task page cold and from cached cards"""
+        self.repo.bulk_create([
+            Task(title=f"Task {i}", description=f"Description {i}",
+                 priority=i % 5 + 1, due_date=f"2026-{i % 12 + 1:02d}-15",
+                 completed=i % 3 == 0)
+            for i in range(5000)])
+        with mock.patch.object(app_module, 'PAGE_SIZE', 5000):
+            timings, pages = [], []
+            for _ in range(3):
+                hits = app_module.card_cache.hits
+                started = time.perf_counter()
+                pages.append(self.client.get('/').get_data(as_text=True))
+                timings.append((time.perf_counter() - started) * 1000)
+        self.assertEqual(pages[0].count('class="task-card'), 5000)
+        # Warm renders take every card from the cache and match the cold one
+        self.assertEqual(app_module.card_cache.hits, hits + 5000)
+        self.assertEqual(pages[1], pages[0])
+        self.assertEqual(pages[2], pages[0])
+        # Reported, not asserted: timings vary too much between machines
+        print(f"\n5k-task page: {timings[0]:.0f} ms cold, "
+              f"{min(timings[1:]):.0f} ms with cached cards")
+
+
+class TestInstrumentation(TempDatabaseTestCase):
+    """Test request, repository and query metrics"""
+
+    def setUp(self):
+        super().setUp()
+        self.repo.bulk_create([Task(title=f"Metered {i}") for i in range(3)])
+        self.instrumentation = Instrumentation()
+        db = partial(DatabaseConnection, self.db_path, pool_size=8)
+        self.instrumented = self.instrumentation.instrument_repository(
+            SQLiteTaskRepository(self.instrumentation.instrument_db(db)),
+            explain_db=db)
+
+    def test_histogram_rendering(self):
+        """Test buckets are rendered cumulatively with +Inf, sum and count"""
+        histogram = Histogram('latency_seconds', 'Latency.', ('route',),
+                              (0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, ('a"b',))
+        self.assertEqual(histogram.samples(), [
+            'latency_seconds_bucket{route="a\\"b",le="0.1"} 1',
+            'latency_seconds_bucket{route="a\\"b",le="1"} 2',
+            'latency_seconds_bucket{route="a\\"b",le="+Inf"} 3',
+            'latency_seconds_sum{route="a\\"b"} 5.55',
+            'latency_seconds_count{route="a\\"b"} 3'])
+
+    def test_repository_and_query_metrics(self):
+        """Test calls, rows hydrated, statements and connection use are counted"""
+        metrics = self.instrumentation
+        # Outside a request (and without the slow-query log) statements
+        # are not traced, so they cost nothing to count
+        self.instrumented.count()
+        self.assertEqual(metrics.queries.values, {})
+        request_stats = metrics.begin_request()
+        self.instrumented.get_all()
+        tasks, _ = self.instrumented.list_page(limit=2)
+        self.instrumented.get_by_id(tasks[0].id)
+        metrics.end_request('test', 'GET')
+        self.assertEqual(request_stats.queries, 3)
+        self.assertEqual(metrics.repository_rows.values,
+                         {('get_all',): 3, ('list_page',): 2, ('get_by_id',): 1})
+        self.assertEqual(metrics.queries.values[()], 3)
+        self.assertEqual(metrics.connection_hold.series[()][2], 4)
+        text = metrics.render()
+        self.assertIn('# TYPE repository_call_duration_seconds histogram', text)
+        self.assertIn('repository_call_duration_seconds_count{method="get_all"} 1',
+                      text)
+
+    def test_slow_query_log_explains_queries(self):
+        """Test slow calls are logged with each statement's query plan"""
+        self.instrumentation.slow_query_ms = 0
+        with self.assertLogs('instrumentation', 'WARNING') as logs:
+            self.instrumented.list_page(limit=2, filters={'priority': 3})
+        self.assertIn('Slow repository call list_page', logs.output[0])
+        self.assertIn('USING INDEX idx_tasks_listing', logs.output[0])
+        self.assertEqual(
+            self.instrumentation.slow_calls.values[('list_page',)], 1)
+
+    def test_metrics_endpoint(self):
+        """Test per-request latency, queries and rows are exported"""
+        instrumentation = app_module.instrumentation
+        original = app_module.task_repo
+        app_module.task_repo = CachedTaskRepository(self.instrumented)
+        self.addCleanup(setattr, app_module, 'task_repo', original)
+        # The app's hooks feed its own Instrumentation; point ours at it
+        self.instrumented.instrumentation = instrumentation
+        app.config['TESTING'] = True
+        client = app.test_client()
+
+        rows = instrumentation.request_rows.series.get(('api_get_tasks',))
+        rows_before = rows[1] if rows else 0
+        self.assertEqual(client.get('/api/tasks?limit=2').status_code, 200)
+        self.assertEqual(instrumentation.request_rows.series[
+            ('api_get_tasks',)][1] - rows_before, 2)
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.mimetype.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('http_request_duration_seconds_count{endpoint="api_get_tasks",'
+                      'method="GET"}', text)
+        self.assertIn('http_requests_total{endpoint="api_get_tasks",method="GET",'
+                      'status="200"}', text)
+        self.assertIn('task_cache_results_hit_rate', text)
+
+    def test_asgi_request_metrics(self):
+        """Test native ASGI routes record the same per-request metrics"""
+        async_repo = AsyncTaskRepository(self.instrumented, max_workers=2)
+        self.addCleanup(async_repo.close)
+        statuses = []
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        with mock.patch.object(asgi, 'task_repo', async_repo), \
+                mock.patch.object(app_module, 'instrumentation',
+                                  self.instrumentation):
+            for query in (b'limit=2', b'limit=x'):
+                scope = {'type': 'http', 'method': 'GET', 'path': '/api/tasks',
+                         'query_string': query, 'headers': []}
+                asyncio.run(asgi.application(scope, None, send))
+        self.assertEqual(statuses, [200, 400])
+        self.assertEqual(self.instrumentation.requests.values, {
+            ('api_get_tasks', 'GET', 200): 1,
+            ('api_get_tasks', 'GET', 400): 1})
+        # Rows hydrated on the DB executor are counted towards the request
+        self.assertEqual(self.instrumentation.request_rows.series[
+            ('api_get_tasks',)][1], 2)
+        self.assertEqual(self.instrumentation.request_duration.series[
+            ('api_get_tasks', 'GET')][2], 2)
+
+
+class TestNextUp(TempDatabaseTestCase):
+    """Test the in-memory "next up" queue and task claims"""
+
+    def setUp(self):
+        super().setUp()
+        self.repo.bulk_create([
+            Task(title="Low", priority=4, due_date="2030-01-01"),
+            Task(title="Urgent later", priority=1, due_date="2030-06-01"),
+            Task(title="Urgent undated", priority=1),
+            Task(title="Urgent soon", priority=1, due_date="2030-01-15"),
+            Task(title="Done", priority=1, due_date="2029-01-01", completed=True),
+        ])
+        self.queue = NextUpRepository(self.repo, self.repo)
+
+    def titles(self, n=10):
+        return [task.title for task in self.queue.next_up(n)]
+
+    def test_order_follows_writes(self):
+        """Test the index is loaded once and kept current by every write"""
+        self.assertEqual(self.titles(), ["Urgent soon", "Urgent later",
+                                         "Urgent undated", "Low"])
+        self.assertEqual(self.titles(2), ["Urgent soon", "Urgent later"])
+        low = self.repo.get_by_id(1)
+        self.queue.update(low.id, {'priority': 1, 'due_date': "2029-12-31"})
+        self.assertEqual(self.titles(1), ["Low"])
+        self.queue.toggle_completed(low.id)
+        self.assertNotIn("Low", self.titles())
+        self.queue.mark_completed(low.id, False)
+        self.assertEqual(self.titles(1), ["Low"])
+        created = self.queue.create(Task(title="New", priority=1,
+                                         due_date="2029-06-01"))
+        self.assertEqual(self.titles(1), ["New"])
+        self.queue.bulk_update([(created.id, {'priority': 5})])
+        self.assertEqual(self.titles()[-1], "New")
+        self.queue.bulk_mark_completed([created.id, 2], True)
+        self.queue.delete(low.id)
+        self.assertEqual(self.titles(), ["Urgent soon", "Urgent undated"])
+        self.assertEqual(self.queue.metrics()['open'], 2)
+
+    def test_claims_are_exclusive(self):
+        """Test concurrent workers with separate indexes never share a task"""
+        self.repo.bulk_create([Task(title=f"Job {i}", priority=i % 5 + 1)
+                               for i in range(200)])
+        # Two queues over one database stand in for two processes
+        queues = [NextUpRepository(self.repo, self.repo) for _ in range(2)]
+        claims = []
+        lock = threading.Lock()
+
+        def worker(queue, name):
+            while True:
+                tasks = queue.claim(name, 3)
+                if not tasks:
+                    return
+                with lock:
+                    claims.extend(task.id for task in tasks)
+
+        threads = [threading.Thread(target=worker, args=(queues[i % 2], f"w{i}"))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(claims), len(set(claims)))
+        self.assertEqual(len(claims), 204)
+        self.assertEqual(queues[0].next_up(), [])
+
+    def test_release_and_completion_end_claims(self):
+        """Test a claim lasts until the task is released or completed"""
+        first = self.queue.claim("worker-1")[0]
+        self.assertEqual(first.title, "Urgent soon")
+        self.assertEqual(self.titles(1), ["Urgent later"])
+        self.assertTrue(self.queue.release(first.id))
+        self.assertFalse(self.queue.release(first.id))
+        self.assertEqual(self.titles(1), ["Urgent soon"])
+
+        claimed = self.queue.claim("worker-1", 2)
+        self.queue.mark_completed(claimed[0].id, True)
+        self.queue.mark_completed(claimed[0].id, False)
+        # Completing ended the claim, so reopening puts the task back
+        self.assertEqual(self.titles(1), ["Urgent soon"])
+        # A new index sees the remaining claim in the database
+        self.assertEqual([task.title for task in
+                          NextUpRepository(self.repo, self.repo).next_up()],
+                         ["Urgent soon", "Urgent undated", "Low"])
+
+    def test_api(self):
+        """Test the next-up, claim and release endpoints"""
+        original = app_module.task_repo
+        app_module.task_repo = self.queue
+        self.addCleanup(setattr, app_module, 'task_repo', original)
+        app.config['TESTING'] = True
+        client = app.test_client()
+
+        response = client.get('/api/tasks/next?n=2')
+        self.assertEqual([task['title'] for task in response.get_json()],
+                         ["Urgent soon", "Urgent later"])
+        self.assertEqual(client.get('/api/tasks/next?n=0').status_code, 400)
+
+        response = client.post('/api/tasks/claim', json={'worker': "w1", 'n': 2})
+        self.assertEqual(response.status_code, 200)
+        claimed = response.get_json()['tasks']
+        self.assertEqual([task['title'] for task in claimed],
+                         ["Urgent soon", "Urgent later"])
+        self.assertEqual(client.post('/api/tasks/claim', json={'n': 1}).status_code,
+                         400)
+        self.assertEqual(client.post('/api/tasks/claim',
+                                     json={'worker': "w1", 'n': 0}).status_code, 400)
+
+        task_id = claimed[0]['id']
+        self.assertEqual(client.post(f'/api/tasks/{task_id}/release').status_code,
+                         200)
+        self.assertEqual(client.post(f'/api/tasks/{task_id}/release').status_code,
+                         404)
+        self.assertEqual(client.get('/api/tasks/next?n=1').get_json()[0]['id'],
+                         task_id)
+
+
+class TestArchive(TempDatabaseTestCase):
+    """Test moving old completed tasks into the archive table"""
+
+    def setUp(self):
+        super().setUp()
+        self.tasks = self.repo.bulk_create(
+            [Task(title=f"Task {i}", priority=i % 5 + 1,
+                  due_date=f"2030-01-{i % 28 + 1:02d}" if i % 3 else None,
+                  completed=i % 2 == 0)
+             for i in range(20)])
+        # Half the completed tasks were completed long ago
+        self.old_ids = [task.id for task in self.tasks[::4]]
+        with DatabaseConnection(self.db_path, pooled=False) as conn:
+            conn.execute(f"""
+                UPDATE tasks SET completed_at = datetime('now', '-40 days')
+                WHERE id IN ({','.join('?' * len(self.old_ids))})
+            """, self.old_ids)
+            conn.commit()
+
+    def walk(self, **kwargs):
+        ids, cursor = [], None
+        while True:
+            tasks, cursor = self.repo.list_page(cursor, 3, **kwargs)
+            ids.extend(task.id for task in tasks)
+            if cursor is None:
+                return ids
+
+    def test_archive_moves_only_old_completed_tasks(self):
+        """Test tasks move in batches and leave the hot table"""
+        listing = self.walk()
+        first = self.repo.archive_completed(30, limit=3)
+        rest = self.repo.archive_completed(30, limit=3)
+        self.assertEqual(sorted(first + rest), sorted(self.old_ids))
+        self.assertEqual(self.repo.archive_completed(30), [])
+        self.assertIsNone(self.repo.get_by_id(self.old_ids[0]))
+        self.assertEqual(self.repo.count(), 15)
+        self.assertEqual(self.repo.count({'completed': True},
+                                         include_archived=True), 10)
+        # Listing with the archive gives the same order as before archiving
+        self.assertNotIn(self.old_ids[0], self.walk())
+        self.assertEqual(self.walk(include_archived=True), listing)
+        self.assertEqual(self.walk(filters={'priority': 1}, include_archived=True),
+                         [task_id for task_id in listing
+                          if self.tasks[task_id - 1].priority == 1])
+
+    def test_archiver_starts_only_from_entry_points(self):
+        """Test importing the app archives nothing; start_archiver() does"""
+        self.assertIsNone(app_module.archiver)
+        self.assertIsNone(app_module.start_archiver())
+        with mock.patch.object(app_module, 'ARCHIVE_AFTER_DAYS', 30), \
+                mock.patch.object(app_module, 'archiver', None), \
+                mock.patch.object(app_module, 'TaskArchiver') as archiver_class, \
+                mock.patch.object(app_module.instrumentation, '_collectors', []), \
+                mock.patch('atexit.register'):
+            archiver = app_module.start_archiver()
+            self.assertIs(app_module.start_archiver(), archiver)
+        self.assertIs(archiver, archiver_class.return_value)
+        archiver.start.assert_called_once_with()
+
+    def test_archiver_runs_in_batches(self):
+        """Test the archiver drains in batches and reports each"""
+        batches = []
+        archiver = TaskArchiver(self.repo, 30, batch_size=2, interval=60,
+                                pause=0, on_archive=batches.append)
+        self.assertEqual(archiver.run_once(), 5)
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(archiver.metrics(), {'runs': 1, 'archived': 5})
+        # The thread runs straight away, then stops when closed rather than
+        # waiting out the interval
+        archiver.start()
+        archiver.close()
+        self.assertEqual(archiver.metrics()['runs'], 2)
+
+    def test_api_include_archived(self):
+        """Test /api/tasks lists archived tasks only when asked"""
+        self.repo.archive_completed(30)
+        client = self.use_in_app()
+        listed = client.get('/api/tasks?limit=100').get_json()
+        self.assertEqual(len(listed), 15)
+        response = client.get('/api/tasks?limit=100&include_archived=true')
+        self.assertEqual(len(response.get_json()), 20)
+        response = client.get('/api/tasks?limit=4&include_archived=1')
+        self.assertIn('include_archived=1', response.headers['Link'])
+        self.assertEqual(
+            client.get('/api/tasks?include_archived=maybe').status_code, 400)
+
+
+class TestReports(TempDatabaseTestCase):
+    """Test the NumPy reports and their snapshot cache"""
+
+    # (priority, due_date, created_at, completed_at)
+    ROWS = [
+        (1, '2024-01-05', '2024-01-01 10:00:00', '2024-01-05 18:00:00'),
+        (1, '2024-01-03', '2024-01-02 09:00:00', '2024-01-06 12:00:00'),
+        (2, None, '2024-01-03 08:00:00', None),
+        (3, None, '2024-01-03 20:00:00', '2024-01-04 08:00:00'),
+    ]
+
+    def setUp(self):
+        super().setUp()
+        tasks = self.repo.bulk_create(
+            [Task(title=f"Task {i}", priority=priority, due_date=due_date,
+                  completed=completed_at is not None)
+             for i, (priority, due_date, _, completed_at) in enumerate(self.ROWS)])
+        with DatabaseConnection(self.db_path, pooled=False) as conn:
+            conn.executemany(
+                "UPDATE tasks SET created_at = ?, completed_at = ? WHERE id = ?",
+                [(row[2], row[3], task.id) for row, task in zip(self.ROWS, tasks)])
+            conn.commit()
+        self.engine = analytics.ReportEngine(self.repo.db)
+
+    def test_reports(self):
+        """Test burndown, completion and lateness figures"""
+        snapshot = self.engine.snapshot()
+        report = analytics.burndown(snapshot, date(2024, 1, 1), date(2024, 1, 6))
+        self.assertEqual(report['dates'][0], '2024-01-01')
+        self.assertEqual(report['created'], [1, 1, 2, 0, 0, 0])
+        self.assertEqual(report['completed'], [0, 0, 0, 1, 1, 1])
+        self.assertEqual(report['open'], [1, 2, 4, 3, 2, 1])
+        weekly = analytics.burndown(snapshot, date(2024, 1, 1), date(2024, 1, 8),
+                                    'week', priority=1)
+        self.assertEqual(weekly['created'], [2, 0])
+        self.assertEqual(weekly['completed'], [2, 0])
+
+        completion = analytics.completion_by_priority(snapshot)
+        self.assertEqual(completion[1]['total'], 2)
+        self.assertEqual(completion[1]['completion_rate'], 1.0)
+        self.assertEqual(completion[2]['completion_rate'], 0.0)
+        self.assertIsNone(completion[4]['completion_rate'])
+        self.assertEqual(completion[3]['days_to_complete']['p50'], 0.5)
+
+        late = analytics.lateness(snapshot)
+        self.assertEqual(late['completed_with_due_date'], 2)
+        self.assertEqual(late['on_time'], 1)
+        self.assertEqual(late['days_late']['mean'], 1.5)
+        counts = {(b['min'], b['max']): b['count'] for b in late['histogram']}
+        self.assertEqual(counts[(0, 1)], 1)
+        self.assertEqual(counts[(2, 4)], 1)
+        self.assertRaises(ValueError, analytics.burndown, snapshot,
+                          date(2024, 1, 1), date(2024, 1, 6), 'month')
+
+    def test_snapshot_follows_table_version(self):
+        """Test the snapshot is reloaded only after writes, archive included"""
+        first = self.engine.snapshot()
+        self.assertIs(self.engine.snapshot(), first)
+        self.assertEqual(self.engine.metrics(), {'loads': 1, 'tasks': 4})
+        self.repo.create(Task(title="New", priority=4))
+        self.assertEqual(len(self.engine.snapshot()), 5)
+        # Archived tasks still count
+        self.assertEqual(len(self.repo.archive_completed(30)), 3)
+        snapshot = self.engine.snapshot()
+        self.assertEqual(self.engine.metrics(), {'loads': 3, 'tasks': 5})
+        self.assertEqual(analytics.completion_by_priority(snapshot)[1]['completed'], 2)
+
+    def test_api(self):
+        """Test the report routes, their validators and errors"""
+        client = self.use_in_app()
+        with mock.patch.object(app_module, 'report_engine', self.engine):
+            response = client.get('/api/reports/burndown?from=2024-01-01'
+                                  '&to=2024-01-06&priority=1')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()['completed'],
+                             [0, 0, 0, 0, 1, 1])
+            etag = response.headers['ETag']
+            response = client.get('/api/reports/burndown?from=2024-01-01'
+                                  '&to=2024-01-06&priority=1',
+                                  headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(
+                client.get('/api/reports/completion').get_json()['1']['total'], 2)
+            self.assertEqual(
+                client.get('/api/reports/lateness?priority=1').get_json()['on_time'], 1)
+            for url in ('/api/reports/burndown?bucket=year',
+                        '/api/reports/burndown?from=2024-02-01&to=2024-01-01',
+                        '/api/reports/burndown?from=1900-01-01',
+                        '/api/reports/lateness?priority=9'):
+                self.assertEqual(client.get(url).status_code, 400, url)
+        with mock.patch.object(app_module, 'report_engine', None):
+            self.assertEqual(client.get('/api/reports/completion').status_code, 503)
+
+
+# Runs in a separate process: applies repository calls given as JSON
+OTHER_PROCESS_WRITER = """
+import json, sys
+from functools import partial
+from database import DatabaseConnection
+from models import SQLiteTaskRepository
+repo = SQLiteTaskRepository(partial(DatabaseConnection, sys.argv[1]))
+for method, *args in json.loads(sys.argv[2]):
+    getattr(repo, method)(*args)
+"""
+
+
+class TestCoherence(TempDatabaseTestCase):
+    """Test caches follow writes made by other processes"""
+
+    def setUp(self):
+        super().setUp()
+        self.repo.bulk_create([Task(title=f"Task {i}", priority=i % 5 + 1)
+                               for i in range(6)])
+        self.cached = CachedTaskRepository(self.repo)
+        self.queue = NextUpRepository(self.cached, self.repo)
+        self.resets = 0
+
+        def reset():
+            self.resets += 1
+            self.cached.invalidate()
+            self.queue.rebuild()
+
+        self.follower = ChangeFollower(
+            self.repo, lambda task_ids: (self.cached.invalidate(task_ids),
+                                         self.queue.sync(task_ids)), reset)
+
+    def write_elsewhere(self, *calls):
+        subprocess.run([sys.executable, '-c', OTHER_PROCESS_WRITER,
+                        self.db_path, json.dumps(calls)],
+                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                       check=True)
+
+    def queued(self):
+        return [task.id for task in self.queue.next_up(10)]
+
+    def test_follower_applies_other_process_writes(self):
+        """Test reads are stale until check() and fresh after it"""
+        self.assertFalse(self.follower.check())
+        self.assertEqual(self.cached.get_by_id(1).title, "Task 0")
+        self.assertEqual(self.cached.count(), 6)
+        self.assertEqual(len(self.queued()), 6)
+
+        self.write_elsewhere(['update', 1, {'title': "Renamed"}],
+                             ['mark_completed', 2, True],
+                             ['delete', 3], ['claim', [4], 'other'])
+        self.assertEqual(self.cached.get_by_id(1).title, "Task 0")
+        self.assertEqual(self.cached.count(), 6)
+        self.assertTrue(self.follower.check())
+        self.assertEqual(self.cached.get_by_id(1).title, "Renamed")
+        self.assertIsNone(self.cached.get_by_id(3))
+        self.assertEqual(self.cached.count(), 5)
+        self.assertEqual(sorted(self.queued()), [1, 5, 6])
+        self.assertEqual(self.queue.metrics()['claimed'], 1)
+
+        # A release elsewhere puts the task back in this process's queue
+        self.write_elsewhere(['release', 4])
+        self.assertTrue(self.follower.check())
+        self.assertEqual(sorted(self.queued()), [1, 4, 5, 6])
+        self.assertEqual(self.follower.metrics()['syncs'], 2)
+        self.assertEqual(self.resets, 0)
+
+    def test_concurrent_checks_are_all_counted(self):
+        """Test check() counts every call from every thread"""
+        def check():
+            for _ in range(200):
+                self.follower.check()
+
+        threads = [threading.Thread(target=check) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.follower.metrics()['checks'], 800)
+
+    def test_reset_after_many_changes(self):
+        """Test too many changes, or pruned tombstones, drop everything"""
+        self.follower.max_changes = 2
+        self.write_elsewhere(['bulk_mark_completed', [1, 2, 3], True])
+        self.assertTrue(self.follower.check())
+        self.assertEqual(self.resets, 1)
+        self.assertEqual(sorted(self.queued()), [4, 5, 6])
+
+        self.repo.delete(4)
+        with DatabaseConnection(self.db_path, pooled=False) as conn:
+            conn.execute("UPDATE task_version SET pruned_seq = version")
+            conn.commit()
+        self.assertTrue(self.follower.check())
+        self.assertEqual(self.resets, 2)
+        self.assertFalse(self.follower.check())
+
+    def test_launcher_workers_stay_coherent(self):
+        """Test writes through one worker are seen by every other worker"""
+        log_path = os.path.join(self.tmpdir, 'serve.log')
+        with open(log_path, 'w') as log:
+            server = subprocess.Popen(
+                [sys.executable, os.path.join(os.path.dirname(
+                    os.path.abspath(__file__)), 'serve.py'),
+                 '--workers', '3', '--port', '0'],
+                cwd=self.tmpdir, stdout=log, stderr=subprocess.STDOUT)
+        self.addCleanup(server.wait, 10)
+        self.addCleanup(server.send_signal, signal.SIGTERM)
+
+        port = None
+        deadline = time.monotonic() + 15
+        while port is None and time.monotonic() < deadline:
+            with open(log_path) as log:
+                for line in log:
+                    if 'Listening on' in line:
+                        port = int(line.split(':')[-1].split()[0])
+            time.sleep(0.05)
+        self.assertIsNotNone(port, "launcher did not start")
+
+        def call(path, payload=None):
+            request = Request(f'http://127.0.0.1:{port}{path}',
+                              data=json.dumps(payload).encode() if payload else None,
+                              headers={'Content-Type': 'application/json'})
+            for attempt in range(100):
+                try:
+                    with urlopen(request, timeout=10) as response:
+                        return json.load(response)
+                except ConnectionError:
+                    time.sleep(0.1)  # Workers still importing the app
+            self.fail("workers did not answer")
+
+        # Each request is a new connection, so the kernel spreads them over
+        # the workers; every one must see every write before it. They
+        # serve tasks.db in the working directory, this test's database.
+        created = self.repo.count()
+        for round in range(10):
+            for _ in range(3):
+                self.assertEqual(call('/api/stats')['total'], created)
+                self.assertEqual(len(call('/api/tasks/next?n=100')), created)
+            call('/api/tasks/bulk', {'create': [{'title': f"Task {round}"}]})
+            created += 1
+        self.assertEqual(call('/api/stats')['total'], created)
+
+    def test_stopped_worker_commits_queued_writes(self):
+        """Test SIGTERM unwinds a worker through its shutdown code"""
+        ready, notify = os.pipe()
+
+        def run_worker(listener):
+            # Not the pooled self.repo: its connections belong to the parent
+            writer = WriteBehindRepository(
+                SQLiteTaskRepository(partial(DatabaseConnection, self.db_path,
+                                             pooled=False)),
+                max_latency=60)
+            try:
+                writer.submit('create', Task(title="Queued at shutdown"))
+                os.write(notify, b'.')
+                time.sleep(60)
+            finally:
+                writer.close()
+
+        with mock.patch.object(serve, 'run_worker', run_worker):
+            pid = serve.spawn(None)
+        os.close(notify)
+        self.assertEqual(os.read(ready, 1), b'.')
+        os.close(ready)
+        self.assertEqual(self.repo.count(), 6)
+        os.kill(pid, signal.SIGTERM)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertEqual(self.repo.count(), 7)
+        self.assertEqual(self.repo.search("shutdown")[0].title,
+                         "Queued at shutdown")
+
+    def test_worker_shuts_the_app_down(self):
+        """Test run_worker stops the app's threads when it is stopped"""
+        listener = mock.Mock()
+        listener.getsockname.return_value = ('127.0.0.1', 5000)
+        with mock.patch('werkzeug.serving.make_server') as make_server, \
+                mock.patch.object(app_module, 'start_archiver'), \
+                mock.patch.object(app_module, 'start_reminders'), \
+                mock.patch.object(app_module, 'shutdown') as shutdown:
+            make_server.return_value.serve_forever.side_effect = SystemExit(0)
+            with self.assertRaises(SystemExit):
+                serve.run_worker(listener)
+        shutdown.assert_called_once_with()
+
+
+class TestReminders(TempDatabaseTestCase):
+    """Test the timer wheel and due-date reminders on a fake clock"""
+
+    def setUp(self):
+        super().setUp()
+        self.hub = EventHub()
+        self.repo = SQLiteTaskRepository(
+            partial(DatabaseConnection, self.db_path, pool_size=8),
+            events=self.hub)
+        self.now = datetime(2030, 1, 1, 12, 0).timestamp()
+        self.tasks = self.repo.bulk_create([
+            Task(title="Tomorrow", due_date="2030-01-02"),
+            Task(title="Later", due_date="2030-01-05"),
+            Task(title="Undated"),
+            Task(title="Done", due_date="2030-01-03", completed=True),
+            Task(title="Already overdue", due_date="2029-12-01"),
+        ])
+        self.sent = []
+
+    def scheduler(self, notifiers=None):
+        scheduler = DueDateScheduler(
+            self.repo, notifiers or [lambda kind, task: self.sent.append(
+                (kind, task.title))], clock=lambda: self.now)
+        scheduler.load()
+        return scheduler
+
+    def at(self, *when):
+        self.now = datetime(*when).timestamp()
+
+    def test_timer_wheel(self):
+        """Test timers fire on their tick at every level and past the top"""
+        wheel = TimerWheel(now=1000, slots=4, levels=2)  # 16 ticks of range
+        due = {'a': 1001, 'b': 1003, 'c': 1009, 'd': 1016, 'e': 1100, 'f': 1012}
+        for key, tick in due.items():
+            wheel.schedule(key, tick)
+        wheel.schedule('past', 900)  # Fires on the next tick
+        self.assertTrue(wheel.cancel('f'))
+        wheel.schedule('b', 1005)  # Rescheduled
+        fired = {}
+        for tick in range(1001, 1101):
+            for key in wheel.advance(tick):
+                fired[key] = tick
+        self.assertEqual(fired, {'a': 1001, 'past': 1001, 'b': 1005, 'c': 1009,
+                                 'd': 1016, 'e': 1100})
+        self.assertEqual(len(wheel), 0)
+        # Jumping ahead fires everything passed, in tick order
+        for key, tick in (('x', 1150), ('y', 1120)):
+            wheel.schedule(key, tick)
+        self.assertEqual(wheel.advance(1200), ['y', 'x'])
+
+    def test_app_scheduler_starts_only_from_entry_points(self):
+        """Test importing the app starts no scheduler; the entry points do"""
+        self.assertFalse(app_module.reminders.running)
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        with mock.patch.object(app_module, 'start_reminders') as start, \
+                mock.patch.object(app_module, 'reminders') as scheduler, \
+                mock.patch.object(app_module, 'event_hub'), \
+                mock.patch.object(asgi, 'task_repo'):
+            asyncio.run(asgi.application({'type': 'lifespan'}, receive, send))
+        start.assert_called_once_with()
+        scheduler.close.assert_called_once_with()
+        self.assertEqual(sent, ['lifespan.startup.complete',
+                                'lifespan.shutdown.complete'])
+
+    def test_reminders_follow_clock_and_writes(self):
+        """Test due-soon and overdue reminders track write events"""
+        with DatabaseConnection(self.db_path, pooled=False) as conn:
+            plan = explain_query_plan(conn, """
+                SELECT id, due_date FROM tasks INDEXED BY idx_tasks_due_date
+                WHERE due_date >= ? AND completed = 0
+            """, ('2030-01-01',))
+        self.assertTrue(any('idx_tasks_due_date (due_date>?)' in detail
+                            for detail in plan), plan)
+
+        subscription = self.hub.subscribe()
+        scheduler = self.scheduler()
+        self.assertEqual(scheduler.metrics()['tracked'], 2)
+
+        def apply_events():
+            while True:
+                event = subscription.get(0)
+                if event is None:
+                    return
+                scheduler.apply_event(event.type, event.data)
+
+        # Already within a day of its due date: fires on the next tick
+        self.assertEqual(scheduler.run_pending(), 0)
+        self.now += 60
+        self.assertEqual(scheduler.run_pending(), 1)
+        self.assertEqual(self.sent, [('due_soon', "Tomorrow")])
+
+        self.repo.mark_completed(self.tasks[0].id, True)
+        self.repo.update(self.tasks[1].id, {'due_date': '2030-01-10'})
+        self.repo.bulk_update([(self.tasks[2].id, {'due_date': '2030-01-04'})])
+        apply_events()
+        self.at(2030, 1, 4, 0, 1)
+        scheduler.run_pending()
+        self.assertEqual(self.sent[1:], [('due_soon', "Undated")])
+        self.at(2030, 1, 5, 0, 1)
+        scheduler.run_pending()
+        self.assertEqual(self.sent[2:], [('overdue', "Undated")])
+        self.at(2030, 1, 11, 0, 1)
+        scheduler.run_pending()
+        self.assertEqual(self.sent[3:], [('due_soon', "Later"),
+                                         ('overdue', "Later")])
+        self.assertEqual(scheduler.metrics()['tracked'], 0)
+
+    def test_delivered_once_and_only_while_due(self):
+        """Test schedulers share sent reminders and skip stale timers"""
+        first, second = self.scheduler(), self.scheduler()
+        # Completed behind both schedulers' backs
+        with DatabaseConnection(self.db_path, pooled=False) as conn:
+            conn.execute("UPDATE tasks SET completed = 1 WHERE id = ?",
+                         (self.tasks[1].id,))
+            conn.commit()
+        self.at(2030, 1, 6, 0, 1)
+        self.assertEqual(first.run_pending() + second.run_pending(), 2)
+        self.assertEqual(sorted(self.sent), [('due_soon', "Tomorrow"),
+                                             ('overdue', "Tomorrow")])
+        # A reloaded scheduler does not repeat them
+        self.assertEqual(self.scheduler().run_pending(), 0)
+
+    def test_notifiers(self):
+        """Test webhook and event hub delivery, and notifier failures"""
+        posts = []
+
+        class StandIn(BaseHTTPRequestHandler):
+            def do_POST(self):
+                posts.append(json.loads(
+                    self.rfile.read(int(self.headers['Content-Length']))))
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), StandIn)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        def broken(kind, task):
+            raise RuntimeError("down")
+
+        subscription = self.hub.subscribe()
+        scheduler = self.scheduler([
+            broken, EventHubNotifier(self.hub),
+            WebhookNotifier(f'http://127.0.0.1:{server.server_port}/hook')])
+        self.now += 60
+        self.assertEqual(scheduler.run_pending(), 1)
+        self.assertEqual(posts, [{'type': 'due_soon', 'task': self.repo.get_by_id(
+            self.tasks[0].id).to_dict()}])
+        event = subscription.get(0)
+        self.assertEqual(event.type, 'due_soon')
+        self.assertIn('event: due_soon\n', event.encoded)
+        self.assertEqual(scheduler.metrics()['failures'], 1)
+
+    def test_thread_follows_event_hub(self):
+        """Test the background thread tracks writes and stops on close"""
+        scheduler = DueDateScheduler(self.repo, [], hub=self.hub,
+                                     clock=lambda: self.now)
+        scheduler.start()
+        self.addCleanup(scheduler.close)
+        self.assertEqual(scheduler.metrics()['tracked'], 2)
+        self.repo.create(Task(title="New", due_date="2030-02-01"))
+        deadline = time.monotonic() + 5
+        while (scheduler.metrics()['tracked'] < 3
+               and time.monotonic() < deadline):
+            time.sleep(0.01)
+        self.assertEqual(scheduler.metrics()['tracked'], 3)
+        scheduler.close()
+        self.assertEqual(self.hub.subscriber_count, 0)
+
+
 def run_all_tests():
     """Run tests with nice output"""
     print("\n" + "="*60)
@@ -124,6 +2552,30 @@ def run_all_tests():
     # Add tests
     suite.addTests(loader.loadTestsFromTestCase(TestTaskManagerBasic))
     suite.addTests(loader.loadTestsFromTestCase(TestApplicationLogic))
+    suite.addTests(loader.loadTestsFromTestCase(TestConnectionPool))
+    suite.addTests(loader.loadTestsFromTestCase(TestStorageProfile))
+    suite.addTests(loader.loadTestsFromTestCase(TestPagination))
+    suite.addTests(loader.loadTestsFromTestCase(TestQueryPlans))
+    suite.addTests(loader.loadTestsFromTestCase(TestExport))
+    suite.addTests(loader.loadTestsFromTestCase(TestBulkOperations))
+    suite.addTests(loader.loadTestsFromTestCase(TestQueryCounts))
+    suite.addTests(loader.loadTestsFromTestCase(TestTaskHydration))
+    suite.addTests(loader.loadTestsFromTestCase(TestStats))
+    suite.addTests(loader.loadTestsFromTestCase(TestCachedRepository))
+    suite.addTests(loader.loadTestsFromTestCase(TestConditionalRequests))
+    suite.addTests(loader.loadTestsFromTestCase(TestDeltaSync))
+    suite.addTests(loader.loadTestsFromTestCase(TestEventHub))
+    suite.addTests(loader.loadTestsFromTestCase(TestEventStream))
+    suite.addTests(loader.loadTestsFromTestCase(TestAsyncMode))
+    suite.addTests(loader.loadTestsFromTestCase(TestSearch))
+    suite.addTests(loader.loadTestsFromTestCase(TestWriteBehind))
+    suite.addTests(loader.loadTestsFromTestCase(TestPageRendering))
+    suite.addTests(loader.loadTestsFromTestCase(TestInstrumentation))
+    suite.addTests(loader.loadTestsFromTestCase(TestNextUp))
+    suite.addTests(loader.loadTestsFromTestCase(TestArchive))
+    suite.addTests(loader.loadTestsFromTestCase(TestReports))
+    suite.addTests(loader.loadTestsFromTestCase(TestCoherence))
+    suite.addTests(loader.loadTestsFromTestCase(TestReminders))
 
     # Run tests
     runner = unittest.TextTestRunner(verbosity=1)
@@ -138,7 +2590,7 @@ def run_all_tests():
         f"Tests passed: {result.testsRun - len(result.failures) - len(result.errors)}")
 
     if result.wasSuccessful():
-        print("\n ALL 11 TESTS PASSED!")
+        print(f"\n ALL {result.testsRun} TESTS PASSED!")
         print("\n Application meets all requirements:")
         print("1.  Create tasks with title, description, priority, due date")
         print("2.  Update existing tasks")
@@ -0,0 +1,230 @@
+"""
+Write-behind batching for task mutations.
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from models import SQLiteTaskRepository, Task, TaskRepository, retry_on_lock
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH = 256
+# Seconds a batch is held open for more writes once the queue is empty. The
+# default commits straight away: writes queued while a batch commits make
+# up the next one, so batches grow with load without delaying lone writes.
+DEFAULT_MAX_LATENCY = 0.0
+
+# SQLiteTaskRepository helper that runs each queued write method on the
+# batch's connection without committing
+ROW_METHODS = {
+    'create': '_create_row',
+    'update': '_update_row',
+    'delete': '_delete_row',
+    'mark_completed': '_mark_completed_row',
+    'toggle_completed': '_toggle_completed_row',
+}
+
+_STOP = object()
+
+
+class WriteBehindRepository(TaskRepository):
+    """
+    TaskRepository decorator that group-commits single-task writes.
+
+    create(), update(), delete(), mark_completed() and toggle_completed()
+    are queued for one writer thread, which drains the queue in batches and
+    applies each batch in a single transaction, so concurrent writers share
+    one commit (and one fsync) instead of paying for one each. A batch
+    closes when it reaches ``max_batch`` writes or ``max_latency`` seconds
+    after its first write was taken, whichever comes first, and writes that
+    queue up while a batch is committing go into the next one.
+
+    submit() returns a concurrent.futures.Future that resolves with what
+    the synchronous method returns (the stored Task, or a bool for
+    delete()) once the batch has committed; the synchronous methods wait on
+    it. A write that fails on its own, such as a constraint violation,
+    fails only its future: SQLite rolls back just that statement and the
+    rest of the batch still commits. A failure of the transaction itself
+    fails every future in the batch after the usual lock retries.
+
+    Reads and bulk writes go straight to the wrapped repository; bulk
+    writes already commit many rows at once, so queueing them gains
+    nothing. Events are published by the wrapped repository after each
+    batch commits, in queue order.
+    """
+
+    def __init__(self, repo: SQLiteTaskRepository,
+                 max_batch: int = DEFAULT_MAX_BATCH,
+                 max_latency: float = DEFAULT_MAX_LATENCY):
+        if max_batch < 1:
+            raise ValueError("max_batch must be positive")
+        self.repo = repo
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        # Read by retry_on_lock when a batch hits a locked database
+        self.write_retries = repo.write_retries
+        self.retry_backoff = repo.retry_backoff
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.writes = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._writer = threading.Thread(target=self._run, name='task-writer',
+                                        daemon=True)
+        self._writer.start()
+
+    def submit(self, method: str, *args) -> Future:
+        """Queue a single-task write; the future resolves after its commit."""
+        if method not in ROW_METHODS:
+            raise ValueError(f"{method} cannot be queued")
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            self.queue.put((method, args, future))
+        return future
+
+    def close(self):
+        """Commit every queued write, then stop the writer thread."""
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self.queue.put(_STOP)
+        self._writer.join()
+
+    def metrics(self) -> Dict[str, int]:
+        """Committed batches and writes, and writes still queued."""
+        return {'batches': self.batches, 'writes': self.writes,
+                'pending': self.queue.qsize()}
+
+    # Writer thread
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            # A caller that cancelled its future no longer wants the write
+            batch = [op for op in batch if op[2].set_running_or_notify_cancel()]
+            if batch:
+                self._write_batch(batch)
+
+    def _next_batch(self) -> Tuple[list, bool]:
+        """Wait for a write, then gather more until the batch closes."""
+        batch = []
+        item = self.queue.get()
+        deadline = time.monotonic() + self.max_latency
+        while item is not _STOP:
+            batch.append(item)
+            if len(batch) >= self.max_batch:
+                return batch, False
+            try:
+                item = self.queue.get(
+                    timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return batch, False
+        return batch, True
+
+    def _write_batch(self, batch: list):
+        try:
+            results = self._commit_batch(batch)
+        except Exception as e:
+            logger.error(f"Write-behind batch of {len(batch)} failed: {e}")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.writes += len(batch)
+        for (method, args, future), (error, result) in zip(batch, results):
+            if error is not None:
+                future.set_exception(error)
+                continue
+            task_id = result.id if method == 'create' else args[0]
+            self.repo._emit_write(method, task_id, result)
+            future.set_result(result)
+
+    @retry_on_lock
+    def _commit_batch(self, batch: list) -> List[Tuple[Optional[Exception], Any]]:
+        """Apply a batch in one transaction; (error, result) per write."""
+        results = []
+        with self.repo.db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for method, args, _ in batch:
+                try:
+                    result = getattr(self.repo, ROW_METHODS[method])(conn, *args)
+                except sqlite3.OperationalError:
+                    raise  # Locked or broken: the whole batch is retried or failed
+                except Exception as e:
+                    results.append((e, None))
+                else:
+                    results.append((None, result))
+            conn.commit()
+        return results
+
+    # Reads
+
+    def get_all(self) -> List[Task]:
+        return self.repo.get_all()
+
+    def iter_all(self, batch_size: int = 500) -> Iterator[List[Task]]:
+        return self.repo.iter_all(batch_size)
+
+    def list_page(self, cursor: Optional[str] = None, limit: int = 50,
+                  filters: Optional[Dict[str, Any]] = None,
+                  include_archived: bool = False
+                  ) -> Tuple[List[Task], Optional[str]]:
+        return self.repo.list_page(cursor, limit, filters, include_archived)
+
+    def count(self, filters: Optional[Dict[str, Any]] = None,
+              include_archived: bool = False) -> int:
+        return self.repo.count(filters, include_archived)
+
+    def stats(self, today: Optional[date] = None) -> Dict[str, Any]:
+        return self.repo.stats(today)
+
+    def search(self, query: str, filters: Optional[Dict[str, Any]] = None,
+               limit: int = 20) -> List[Task]:
+        return self.repo.search(query, filters, limit)
+
+    def version(self) -> Tuple[int, str]:
+        return self.repo.version()
+
+    def changes(self, since: int, limit: int = 500) -> Dict[str, Any]:
+        return self.repo.changes(since, limit)
+
+    def get_by_id(self, task_id: int) -> Optional[Task]:
+        return self.repo.get_by_id(task_id)
+
+    # Writes
+
+    def create(self, task: Task) -> Task:
+        return self.submit('create', task).result()
+
+    def update(self, task_id: int, task_data: Dict[str, Any]) -> Optional[Task]:
+        return self.submit('update', task_id, task_data).result()
+
+    def delete(self, task_id: int) -> bool:
+        return self.submit('delete', task_id).result()
+
+    def mark_completed(self, task_id: int, completed: bool) -> Optional[Task]:
+        return self.submit('mark_completed', task_id, completed).result()
+
+    def toggle_completed(self, task_id: int) -> Optional[Task]:
+        return self.submit('toggle_completed', task_id).result()
+
+    def bulk_create(self, tasks: List[Task]) -> List[Task]:
+        return self.repo.bulk_create(tasks)
+
+    def bulk_update(self, updates: List[Tuple[int, Dict[str, Any]]]) -> List[bool]:
+        return self.repo.bulk_update(updates)
+
+    def bulk_delete(self, task_ids: List[int]) -> List[bool]:
+        return self.repo.bulk_delete(task_ids)
+
+    def bulk_mark_completed(self, task_ids: List[int], completed: bool) -> List[bool]:
+        return self.repo.bulk_mark_completed(task_ids, completed)